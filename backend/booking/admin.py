@@ -1,36 +1,160 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import User, Room, Guest, Booking, Building, AuditLog
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import User, Room, Guest, Booking, Building, AuditLog, Job, OutboxMessage, SlowQuery, digits_only
+from .search import MIN_DIGITS, search_guests_by_digits, search_guests_by_name
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
-from datetime import date
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: без фильтров в PostgreSQL берёт число строк
+    из статистики планировщика (pg_class.reltuples) вместо COUNT(*) по всей таблице.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        # Без фильтров сверх условия менеджера по умолчанию (is_deleted = false у мягко удаляемых моделей)
+        unfiltered = queryset.query.where == queryset.model._default_manager.all().query.where
+        if connection.vendor == 'postgresql' and unfiltered:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+                return row[0]
+        return super().count
+
+
+def guest_search(queryset, term):
+    """Поиск гостей как в /api/guests/search/: цифры — по индексам телефона/ИНН, иначе по ФИО"""
+    digits = digits_only(term)
+    if len(digits) >= MIN_DIGITS and not any(ch.isalpha() for ch in term):
+        return search_guests_by_digits(queryset, digits)
+    return search_guests_by_name(queryset, term)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Не считать COUNT(*) всей таблицы дополнительно к отфильтрованному
+    show_full_result_count = False
+
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
     list_display = ('number', 'building', 'capacity', 'room_type', 'status', 'description')
+    list_select_related = ('building',)
+    search_fields = ('number', 'building__name')
 
 @admin.register(Guest)
-class GuestAdmin(admin.ModelAdmin):
+class GuestAdmin(LargeTableAdmin):
     list_display = ('full_name', 'phone', 'inn', 'people_count')
     search_fields = ('full_name', 'phone', 'inn')
+    date_hierarchy = 'updated_at'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(pk__in=guest_search(Guest.objects.all(), term).order_by().values('pk')), False
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ('room', 'guest', 'check_in', 'check_out', 'status_colored')
     list_filter = ('room__building', 'check_in', 'check_out', 'status')
+    # room__building — для Room.__str__
+    list_select_related = ('room__building', 'guest')
+    autocomplete_fields = ('guest', 'room', 'created_by')
+    date_hierarchy = 'check_in'
     search_fields = ('guest__full_name', 'room__number')
+    search_help_text = 'ID бронирования, номер комнаты, телефон/ИНН или ФИО гостя'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        guests = guest_search(Guest.objects.all(), term).order_by().values('pk')
+        condition = Q(guest__in=guests) | Q(room__number=term)
+        if term.isdigit():
+            condition |= Q(pk=int(term))
+        return queryset.filter(condition), False
 
     def status_colored(self, obj):
-        today = date.today()
-        if obj.check_in <= today <= obj.check_out:
+        now = timezone.now()
+        if obj.status == 'active' and obj.check_in <= now < obj.check_out:
             color = 'red'
             status = 'Занято'
         else:
             color = 'green'
             status = 'Свободно'
-        return f'<span style="color: {color};">{status}</span>'
+        return format_html('<span style="color: {};">{}</span>', color, status)
     status_colored.short_description = 'Статус'
-    status_colored.allow_tags = True
 
-admin.site.register(User)
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'first_name', 'last_name', 'role', 'is_active')
+    search_fields = ('username', 'first_name', 'last_name')
+
 admin.site.register(Building)
-admin.site.register(AuditLog)
+
+@admin.register(AuditLog)
+class AuditLogAdmin(LargeTableAdmin):
+    list_display = ('timestamp', 'user', 'action', 'object_type', 'object_id', 'details')
+    list_filter = ('object_type', 'action')
+    list_select_related = ('user',)
+    date_hierarchy = 'timestamp'
+    # Точное совпадение по индексу (object_id, object_type) вместо LIKE по тексту
+    search_fields = ('=object_id',)
+    search_help_text = 'ID объекта'
+    readonly_fields = [field.name for field in AuditLog._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('short_sql', 'caller', 'endpoint', 'count', 'p95_ms', 'max_ms', 'total_ms', 'last_seen')
+    list_filter = ('endpoint',)
+    search_fields = ('sql', 'caller', 'endpoint')
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+    ordering = ('-total_ms',)
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    short_sql.short_description = 'SQL'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_by')
+    list_filter = ('status', 'channel')
+    search_fields = ('recipient', 'body')
+    readonly_fields = [field.name for field in OutboxMessage._meta.fields]
+    list_select_related = ('created_by',)
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'processed', 'total', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = [field.name for field in Job._meta.fields]
+    list_select_related = ('created_by',)
+
+    def has_add_permission(self, request):
+        return False
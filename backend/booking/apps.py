@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking'
+
+    def ready(self):
+        # Регистрирует execute_wrapper для наблюдателей SQL (метрики, профайлер, журнал медленных запросов)
+        from . import query_observers  # noqa: F401
+        # Справочник номеров грузим в начале первого запроса: обращаться к БД в ready() нельзя
+        request_started.connect(self.warm_catalogue, dispatch_uid='booking.warm_catalogue')
+
+    def warm_catalogue(self, **kwargs):
+        from .catalogue import catalogue
+        request_started.disconnect(dispatch_uid='booking.warm_catalogue')
+        catalogue.warm()
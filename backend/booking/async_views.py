@@ -0,0 +1,197 @@
+import asyncio
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .catalogue import catalogue
+from .db_routing import allow_replica_reads, arecently_wrote
+from .events import authenticate_stream
+from .exports import EXPORT_WRITERS, aiter_report_rows, astream_csv
+from .models import Booking, BookingReportRow, Guest, Room
+from .reports import filter_report_rows, parse_occupancy_params, parse_report_date
+from .rollups import aoccupancy_report
+from .streaming import aiter_representations, astream_json_array, astream_ndjson
+from .views import BookingViewSet, BuildingViewSet, GuestViewSet, RoomViewSet
+
+# Ресурсы /api/async/<resource>/ — те же queryset и сериализаторы, что у ViewSet
+RESOURCES = {
+    'rooms': RoomViewSet,
+    'guests': GuestViewSet,
+    'bookings': BookingViewSet,
+    'buildings': BuildingViewSet,
+}
+
+# Самый длинный период календаря за один запрос
+CALENDAR_MAX_DAYS = 366
+
+
+def resource_queryset(resource):
+    return RESOURCES[resource].queryset.order_by('id')
+
+
+def json_response(data, status=200):
+    # JSONEncoder DRF — чтобы Decimal и даты кодировались так же, как в синхронном API
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def async_api(view):
+    """
+    Аутентификация async view по JWT (заголовок или ?token=).
+
+    Все эндпоинты только читают, поэтому чтение идёт с реплики, если пользователь
+    не писал в БД в пределах REPLICA_LAG_SECONDS.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return json_response({'error': 'Метод не поддерживается'}, status=405)
+        user = await authenticate_stream(request)
+        if user is None or not user.is_active:
+            return json_response({'error': 'Требуется авторизация'}, status=401)
+        request.user = user
+        if not await arecently_wrote(user):
+            allow_replica_reads()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_api
+async def resource_list(request, resource):
+    """
+    Потоковый список: /api/async/rooms|guests|bookings|buildings/
+
+    JSON-массив по частям или NDJSON (?format=ndjson). Строки читаются
+    через aiterator порциями STREAMING_CHUNK_SIZE.
+    """
+    if resource not in RESOURCES:
+        return json_response({'error': 'Неизвестный ресурс'}, status=404)
+    queryset = resource_queryset(resource)
+    # БД выбираем сейчас: поток читается уже после выхода из view и сброса маршрутизации
+    queryset = queryset.using(queryset.db)
+    chunk_size = settings.STREAMING_CHUNK_SIZE
+    serializer = RESOURCES[resource].serializer_class(context=await catalogue_context())
+    items = aiter_representations(queryset, serializer, chunk_size, prepare=cover_rooms)
+    if request.GET.get('format') == 'ndjson':
+        return StreamingHttpResponse(astream_ndjson(items, chunk_size), content_type='application/x-ndjson; charset=utf-8')
+    return StreamingHttpResponse(astream_json_array(items, chunk_size), content_type='application/json; charset=utf-8')
+
+
+async def catalogue_context():
+    # Снимок справочника номеров берём заранее: при сериализации в async-коде обращаться к БД нельзя
+    return {'catalogue': await catalogue.asnapshot(check=True)}
+
+
+async def cover_rooms(objects, context):
+    """Дочитывает в снимок номера бронирований, созданные после него (в async-коде к БД лениво не обратиться)"""
+    if 'catalogue' in context:
+        room_ids = [obj.room_id for obj in objects if hasattr(obj, 'room_id')]
+        context['catalogue'] = await catalogue.acovering(context['catalogue'], room_ids)
+
+
+async def serialize(queryset, serializer_class, context=None):
+    objects = [obj async for obj in queryset]
+    context = dict(context or {})
+    await cover_rooms(objects, context)
+    return serializer_class(objects, many=True, context=context).data
+
+
+@async_api
+async def dashboard(request):
+    """Сводка главной страницы одним запросом вместо полных списков номеров, гостей и бронирований"""
+    today = timezone.localdate()
+    bookings = Booking.objects.all()
+    check_in_today = bookings.filter(check_in__date=today)
+    context = await catalogue_context()
+    (rooms_by_status, total_bookings, today_checkouts, pending_payments,
+     total_guests, today_sums, recent_bookings, recent_guests) = await asyncio.gather(
+        _rooms_by_status(),
+        bookings.acount(),
+        bookings.filter(check_out__date=today).acount(),
+        bookings.exclude(payment_status='paid').acount(),
+        Guest.objects.acount(),
+        check_in_today.aaggregate(
+            revenue=Sum('total_amount'),
+            paid=Sum('total_amount', filter=Q(payment_status='paid')),
+        ),
+        serialize(BookingViewSet.queryset.order_by('-check_in')[:5], BookingViewSet.serializer_class, context),
+        serialize(GuestViewSet.queryset.order_by('-registration_date', '-id')[:5], GuestViewSet.serializer_class),
+    )
+    return json_response({
+        'rooms': rooms_by_status,
+        'total_rooms': sum(rooms_by_status.values()),
+        'total_bookings': total_bookings,
+        'today_checkouts': today_checkouts,
+        'pending_payments': pending_payments,
+        'total_guests': total_guests,
+        'revenue_today': today_sums['revenue'] or Decimal('0'),
+        'paid_today': today_sums['paid'] or Decimal('0'),
+        'recent_bookings': recent_bookings,
+        'recent_guests': recent_guests,
+    })
+
+
+async def _rooms_by_status():
+    counts = {value: 0 for value, _ in Room._meta.get_field('status').choices}
+    rows = Room.objects.values('status').annotate(total=Count('id')).order_by()
+    async for row in rows:
+        counts[row['status']] = row['total']
+    return counts
+
+
+@async_api
+async def calendar(request):
+    """Бронирования, пересекающие период ?start=&end=, вместе с номерами и корпусами"""
+    try:
+        start = parse_report_date(request.GET.get('start'))
+        end = parse_report_date(request.GET.get('end'), end_of_day=True)
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    start = start or timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    end = end or start + timedelta(days=31)
+    if end <= start:
+        return json_response({'error': 'end должна быть позже start'}, status=400)
+    if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        return json_response({'error': f'Период не больше {CALENDAR_MAX_DAYS} дней'}, status=400)
+
+    context = await catalogue_context()
+    snapshot = context['catalogue']
+    # Номера — из БД: в них текущее проживание с гостем; корпуса — из справочника в памяти
+    bookings, rooms = await asyncio.gather(
+        serialize(BookingViewSet.queryset.filter(check_in__lt=end, check_out__gt=start).order_by('check_in'),
+                  BookingViewSet.serializer_class, context),
+        serialize(resource_queryset('rooms'), RoomViewSet.serializer_class),
+    )
+    buildings = BuildingViewSet.serializer_class(snapshot.live_buildings(), many=True).data
+    return json_response({'start': start, 'end': end, 'bookings': bookings, 'rooms': rooms, 'buildings': buildings})
+
+
+@async_api
+async def occupancy(request):
+    """Асинхронный вариант /api/reports/occupancy/ с теми же параметрами"""
+    try:
+        date_from, date_to, building = parse_occupancy_params(request.GET)
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    return json_response(await aoccupancy_report(date_from, date_to, building))
+
+
+@async_api
+async def report_export(request):
+    """Потоковый CSV-экспорт отчёта с фильтрами /api/reports/export/ (XLSX — только синхронный)"""
+    queryset = BookingReportRow.objects.order_by('booking_id')
+    try:
+        queryset = filter_report_rows(queryset, request.GET)
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    queryset = queryset.using(queryset.db)
+    _, content_type = EXPORT_WRITERS['csv']
+    response = StreamingHttpResponse(astream_csv(aiter_report_rows(queryset)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="report_{timezone.localdate().isoformat()}.csv"'
+    return response
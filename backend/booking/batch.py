@@ -0,0 +1,119 @@
+import json
+import logging
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .db_routing import _read_from_replica, _wrote
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = '/api/batch/'
+
+
+def build_subrequest(request, path, query):
+    """GET-подзапрос, который наследует уже выполненную аутентификацию основного запроса"""
+    parent = request._request
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {
+        key: value for key, value in parent.META.items()
+        if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE', 'wsgi.input')
+    }
+    sub.META.update({'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query})
+    sub.GET = QueryDict(query)
+    sub.COOKIES = parent.COOKIES
+    sub.user = request.user
+    # DRF примет пользователя без повторной проверки JWT
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def error_result(code, message):
+    return {'status': code, 'body': {'error': message}}
+
+
+def execute_subrequest(request, url):
+    parts = urlsplit(url)
+    path = parts.path
+    if parts.scheme or parts.netloc or not path.startswith('/api/') or path.startswith(BATCH_PATH):
+        return error_result(status.HTTP_400_BAD_REQUEST, 'Допустимы только пути /api/ (кроме /api/batch/)')
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return error_result(status.HTTP_404_NOT_FOUND, 'Не найдено')
+    if iscoroutinefunction(match.func):
+        return error_result(status.HTTP_400_BAD_REQUEST, 'Асинхронные эндпоинты не поддерживаются')
+
+    sub = build_subrequest(request, path, parts.query)
+    sub.resolver_match = match
+    # Разрешение читать с реплики действует только внутри своего подзапроса;
+    # запись, сделанная раньше в этом же запросе, по-прежнему держит чтения на основной БД
+    read_token = _read_from_replica.set(False)
+    wrote_token = _wrote.set(_wrote.get())
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception as e:
+        logger.error(f"Ошибка подзапроса {url}: {str(e)}")
+        return error_result(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error')
+    finally:
+        sub_wrote = _wrote.get()
+        _read_from_replica.reset(read_token)
+        _wrote.reset(wrote_token)
+        # Запись подзапроса видна ReplicaRoutingMiddleware основного запроса
+        if sub_wrote:
+            _wrote.set(True)
+
+    if response.streaming:
+        return error_result(status.HTTP_400_BAD_REQUEST, 'Потоковые ответы не поддерживаются в пакетном запросе')
+    if hasattr(response, 'data'):
+        body = response.data
+    else:
+        try:
+            body = json.loads(response.content or b'null')
+        except ValueError:
+            body = response.content.decode(response.charset or 'utf-8', errors='replace')
+    return {'status': response.status_code, 'body': body}
+
+
+class BatchView(APIView):
+    """
+    Несколько GET-запросов за один HTTP-запрос.
+
+    POST /api/batch/ {"requests": [{"id": "bookings", "url": "/api/bookings/"}, ...]}
+    → {"responses": {"bookings": {"status": 200, "body": [...]}, ...}}
+
+    Подзапросы выполняются в том же потоке и на том же соединении с БД,
+    аутентификация проверяется один раз.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Необходим непустой список requests'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {'error': f'Не больше {settings.BATCH_MAX_REQUESTS} подзапросов за раз'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        responses = {}
+        for index, item in enumerate(items):
+            if isinstance(item, str):
+                item = {'url': item}
+            if not isinstance(item, dict) or not isinstance(item.get('url'), str):
+                return Response({'error': f'Подзапрос #{index}: необходим url'}, status=status.HTTP_400_BAD_REQUEST)
+            key = str(item.get('id', index))
+            if key in responses:
+                return Response({'error': f'Повторяющийся id подзапроса: {key}'}, status=status.HTTP_400_BAD_REQUEST)
+            responses[key] = execute_subrequest(request, item['url'])
+        return Response({'responses': responses})
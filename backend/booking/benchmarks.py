@@ -0,0 +1,222 @@
+import contextvars
+import statistics
+import time
+from collections import namedtuple
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .catalogue import catalogue
+from .metrics import QueryTimer
+from .models import AuditLog, Booking, Building, Guest, Job, Room, User
+from .query_observers import observe_queries
+from .serializers import BookingSerializer, GuestSerializer, RoomSerializer
+from .slow_queries import percentile
+
+# budget — максимум SQL-запросов на один вызов; он не должен зависеть от числа строк,
+# поэтому превышение почти всегда означает N+1.
+# args — части URL перед pk, data — тело POST (пакетный запрос),
+# chunks — сколько частей потокового ответа читать (None — до конца)
+Endpoint = namedtuple('Endpoint', 'url_name model params budget args data chunks', defaults=((), None, None))
+SerializerCase = namedtuple('SerializerCase', 'name serializer_class get_queryset budget')
+
+ENDPOINTS = [
+    Endpoint('user-list', None, {}, 1),
+    Endpoint('user-detail', User, {}, 1),
+    Endpoint('user-me', None, {}, 0),
+    Endpoint('building-list', None, {}, 1),
+    Endpoint('building-detail', Building, {}, 1),
+    Endpoint('room-list', None, {}, 1),
+    Endpoint('room-detail', Room, {}, 1),
+    Endpoint('guest-list', None, {}, 1),
+    Endpoint('guest-detail', Guest, {}, 1),
+    Endpoint('guest-search', None, {'q': 'Ив'}, 2),
+    Endpoint('booking-list', None, {}, 2),
+    Endpoint('booking-detail', Booking, {}, 2),
+    Endpoint('auditlog-list', None, {}, 1),
+    Endpoint('auditlog-detail', AuditLog, {}, 1),
+    Endpoint('report-occupancy', None, {}, 3),
+    Endpoint('report-forecast', None, {}, 3),
+    Endpoint('report-export', None, {'format': 'csv'}, 1),
+    Endpoint('job-list', None, {}, 1),
+    Endpoint('job-detail', Job, {}, 1),
+    Endpoint('job-download', Job, {}, 1),
+    Endpoint('trash-list', None, {}, 1, args=('guests',)),
+    Endpoint('trash-list', None, {}, 1, args=('rooms',)),
+    Endpoint('trash-list', None, {}, 2, args=('bookings',)),
+    Endpoint('trash-list', None, {}, 1, args=('buildings',)),
+    Endpoint('batch', None, {}, 4, data={'requests': [
+        {'id': 'bookings', 'url': '/api/bookings/'},
+        {'id': 'rooms', 'url': '/api/rooms/'},
+        {'id': 'buildings', 'url': '/api/buildings/'},
+    ]}),
+    # Лента бесконечна: читаем подсказку retry и первую порцию событий
+    Endpoint('change-feed', None, {'since': '0'}, 3, chunks=2),
+    # Async view сами проверяют JWT: на каждый вызов ещё один запрос пользователя
+    Endpoint('async-dashboard', None, {}, 11),
+    Endpoint('async-calendar', None, {}, 5),
+    Endpoint('async-report-occupancy', None, {}, 4),
+    Endpoint('async-report-export', None, {}, 2),
+    # Списки читаются порциями STREAMING_CHUNK_SIZE: замеряем '[' и первую порцию,
+    # на каждую следующую уходят те же запросы
+    Endpoint('async-resource-list', None, {}, 3, args=('rooms',), chunks=2),
+    Endpoint('async-resource-list', None, {}, 3, args=('guests',), chunks=2),
+    Endpoint('async-resource-list', None, {}, 4, args=('bookings',), chunks=2),
+    Endpoint('async-resource-list', None, {}, 3, args=('buildings',), chunks=2),
+]
+
+# GET-маршруты /api/ без бюджета: не читают рабочие таблицы (корень API, схема,
+# документация, метрики и профили процесса) или только пишут (trash-action)
+UNBUDGETED = {
+    'api-root', 'openapi-schema', 'schema-swagger-ui', 'metrics',
+    'profile-list', 'profile-detail', 'trash-action',
+}
+
+
+def booking_queryset():
+    from .views import BookingViewSet
+    return BookingViewSet.queryset.all()
+
+
+def guest_queryset():
+    from .views import GuestViewSet
+    return GuestViewSet.queryset.all()
+
+
+def room_queryset():
+    from .views import RoomViewSet
+    return RoomViewSet.queryset.all()
+
+
+SERIALIZERS = [
+    SerializerCase('BookingSerializer', BookingSerializer, booking_queryset, 0),
+    SerializerCase('GuestSerializer', GuestSerializer, guest_queryset, 0),
+    SerializerCase('RoomSerializer', RoomSerializer, room_queryset, 0),
+]
+
+
+def measure(func, repeat):
+    """Время каждого прогона и максимум SQL-запросов по всем соединениям"""
+    # Справочник номеров прогрет, как в работающем процессе после первого запроса
+    catalogue.snapshot(check=True)
+    timings = []
+    queries = 0
+    result = None
+    for _ in range(repeat):
+        timer = QueryTimer()
+        with observe_queries(timer):
+            started = time.perf_counter()
+            # Отдельный контекст, чтобы флаги маршрутизации реплики не переживали вызов
+            result = contextvars.copy_context().run(func)
+            timings.append(time.perf_counter() - started)
+        queries = max(queries, timer.count)
+    return result, timings, queries
+
+
+def summarize(name, timings, queries, budget, status=None):
+    return {
+        'name': name,
+        'status': status,
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'queries': queries,
+        'budget': budget,
+        'over_budget': queries > budget,
+    }
+
+
+def endpoint_path(endpoint):
+    if endpoint.model is None:
+        return reverse(endpoint.url_name, args=endpoint.args)
+    pk = endpoint.model._default_manager.order_by('pk').values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return reverse(endpoint.url_name, args=[*endpoint.args, pk])
+
+
+def endpoint_name(endpoint):
+    return ' '.join([endpoint.url_name, *endpoint.args])
+
+
+def api_url_names(patterns=None, prefix=''):
+    """Имена маршрутов /api/, которые отвечают на GET"""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            names |= api_url_names(pattern.url_patterns, route)
+        elif route.startswith('api/') and pattern.name and answers_get(pattern.callback):
+            names.add(pattern.name)
+    return names
+
+
+def answers_get(view):
+    actions = getattr(view, 'actions', None)
+    if actions is not None:
+        return 'get' in actions
+    view_class = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    # Функции-view (async, SSE) метод проверяют сами
+    return view_class is None or hasattr(view_class, 'get')
+
+
+def drain(chunks, limit):
+    for number, _ in enumerate(chunks, start=1):
+        if number == limit:
+            break
+
+
+async def adrain(chunks, limit):
+    number = 0
+    async for _ in chunks:
+        number += 1
+        if number == limit:
+            break
+    await chunks.aclose()
+
+
+def call_endpoint(path, params, user, data=None, chunks=None):
+    """Вызывает view напрямую, минуя middleware, и полностью рендерит ответ"""
+    factory = APIRequestFactory()
+    # Async view и SSE проверяют JWT сами, DRF-view берут пользователя из force_authenticate
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+    if data is None:
+        request = factory.get(path, params, **headers)
+    else:
+        request = factory.post(path, data, format='json', **headers)
+    force_authenticate(request, user=user)
+    match = resolve(path)
+    if iscoroutinefunction(match.func):
+        response = async_to_sync(match.func)(request, *match.args, **match.kwargs)
+    else:
+        response = match.func(request, *match.args, **match.kwargs)
+    if response.streaming and response.is_async:
+        async_to_sync(adrain)(response.streaming_content, chunks)
+    elif response.streaming:
+        drain(response.streaming_content, chunks)
+    elif hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def benchmark_endpoint(endpoint, user, repeat=5):
+    path = endpoint_path(endpoint)
+    if path is None:
+        return None
+    response, timings, queries = measure(
+        lambda: call_endpoint(path, endpoint.params, user, endpoint.data, endpoint.chunks), repeat)
+    return summarize(endpoint_name(endpoint), timings, queries, endpoint.budget, response.status_code)
+
+
+def benchmark_serializer(case, limit=200, repeat=5):
+    # Сам queryset выполняется до замера: считаем только запросы из сериализатора
+    objects = list(case.get_queryset()[:limit])
+    _, timings, queries = measure(lambda: case.serializer_class(objects, many=True).data, repeat)
+    return summarize(f'{case.name} ×{len(objects)}', timings, queries, case.budget)
+
+
+def run_benchmarks(user, repeat=5):
+    results = [benchmark_endpoint(endpoint, user, repeat) for endpoint in ENDPOINTS]
+    results += [benchmark_serializer(case, repeat=repeat) for case in SERIALIZERS]
+    return [result for result in results if result is not None]
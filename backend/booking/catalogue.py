@@ -0,0 +1,141 @@
+import copy
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from .models import Building, ChangeEvent, Room
+
+logger = logging.getLogger(__name__)
+
+# Модели справочника: их изменения (сигналы и record_changes) пишутся в ChangeEvent
+CATALOGUE_MODELS = ('Room', 'Building')
+
+
+def room_summary(room):
+    """Краткое описание номера для вложения в бронирование"""
+    return {
+        'id': room.id,
+        'number': room.number,
+        'building': {'id': room.building.id, 'name': room.building.name},
+        'room_class': {'value': room.room_class, 'label': room.get_room_class_display()},
+        'capacity': room.capacity,
+        'room_type': room.room_type,
+        'price_per_night': room.price_per_night,
+    }
+
+
+def current_version():
+    """Версия справочника — id последнего события Room/Building в ленте изменений (кроме занятости)"""
+    return ChangeEvent.objects.using(DEFAULT_DB_ALIAS).filter(
+        model__in=CATALOGUE_MODELS, occupancy_only=False
+    ).order_by('-id').values_list('id', flat=True).first()
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок справочника; номера и корпуса — включая удалённые.
+
+    Поля занятости номеров (Room.OCCUPANCY_FIELDS) меняются при каждом заезде
+    и выезде, поэтому в снимок не загружаются (при обращении читаются из БД).
+    """
+
+    def __init__(self, version, buildings, rooms):
+        self.version = version
+        self.buildings = buildings
+        self.rooms = rooms
+        self.summaries = {pk: room_summary(room) for pk, room in rooms.items()}
+
+    @classmethod
+    def load(cls, version):
+        buildings = {building.pk: building for building in Building.all_objects.using(DEFAULT_DB_ALIAS)}
+        rooms = {}
+        for room in Room.all_objects.using(DEFAULT_DB_ALIAS).defer(*Room.OCCUPANCY_FIELDS).order_by('building_id', 'number'):
+            room.building = buildings[room.building_id]
+            rooms[room.pk] = room
+        return cls(version, buildings, rooms)
+
+    def live_buildings(self):
+        return sorted((building for building in self.buildings.values() if not building.is_deleted), key=lambda building: building.pk)
+
+    def room(self, pk):
+        """Копия номера: вызывающий код может менять и сохранять её, не трогая снимок"""
+        room = self.rooms.get(pk)
+        return copy.copy(room) if room is not None else None
+
+
+class Catalogue:
+    """
+    Справочник номеров и корпусов в памяти процесса.
+
+    Сигналы Room/Building сбрасывают снимок в этом процессе сразу. Изменения
+    из других процессов видны по версии: не чаще раза в CATALOGUE_CHECK_SECONDS
+    снимок сверяется с последним событием Room/Building в ChangeEvent.
+    """
+
+    def __init__(self, check_seconds=None, clock=time.monotonic):
+        self.check_seconds = check_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = None
+
+    def snapshot(self, check=False):
+        """Текущий снимок; check=True — сверить версию, не дожидаясь интервала"""
+        check_seconds = self.check_seconds if self.check_seconds is not None else settings.CATALOGUE_CHECK_SECONDS
+        with self._lock:
+            now = self.clock()
+            snapshot = self._snapshot
+            if snapshot is not None and not check and now - self._checked_at < check_seconds:
+                return snapshot
+            version = current_version()
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._snapshot = Snapshot.load(version)
+            self._checked_at = now
+            return snapshot
+
+    async def asnapshot(self, check=False):
+        return await sync_to_async(self.snapshot)(check)
+
+    def refresh(self):
+        """Перечитывает справочник независимо от версии (номер, записанный мимо сигналов)"""
+        with self._lock:
+            self._snapshot = Snapshot.load(current_version())
+            self._checked_at = self.clock()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def room(self, pk):
+        """Номер по id (копия) или None"""
+        room = self.snapshot().room(pk)
+        if room is None:
+            room = self.refresh().room(pk)
+        return room
+
+    def room_summary(self, pk, snapshot=None):
+        summary = (snapshot or self.snapshot()).summaries.get(pk)
+        if summary is None and snapshot is None:
+            summary = self.refresh().summaries.get(pk)
+        return summary
+
+    async def acovering(self, snapshot, room_ids):
+        """Снимок, в котором есть все room_ids: номер, созданный после снимка, — повод перечитать справочник"""
+        if all(pk in snapshot.summaries for pk in room_ids):
+            return snapshot
+        return await sync_to_async(self.refresh)()
+
+    def warm(self):
+        try:
+            self.snapshot()
+        except DatabaseError as e:
+            # Например, до применения миграций — справочник загрузится при первом обращении
+            logger.warning(f"Справочник номеров не прогрет: {str(e)}")
+
+
+catalogue = Catalogue()
@@ -0,0 +1,131 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_DB_ALIAS = 'default'
+
+# Чтение с реплики разрешено для текущего запроса (ставит ReplicaReadMixin)
+_read_from_replica = ContextVar('read_from_replica', default=False)
+# В текущем запросе уже была запись — дальше читаем только с основной БД
+_wrote = ContextVar('wrote_in_request', default=False)
+
+
+def replica_alias():
+    """Алиас реплики, если она настроена в DATABASES"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def lag_cache_key(user_id):
+    return f'replica-lag:{user_id}'
+
+
+def recently_wrote(user):
+    """Пользователь писал в БД в пределах окна отставания реплики"""
+    return bool(user and user.is_authenticated and cache.get(lag_cache_key(user.pk)))
+
+
+async def arecently_wrote(user):
+    return bool(user and user.is_authenticated and await cache.aget(lag_cache_key(user.pk)))
+
+
+def remember_write(user):
+    if user and user.is_authenticated:
+        cache.set(lag_cache_key(user.pk), True, settings.REPLICA_LAG_SECONDS)
+
+
+async def aremember_write(user):
+    if user and user.is_authenticated:
+        await cache.aset(lag_cache_key(user.pk), True, settings.REPLICA_LAG_SECONDS)
+
+
+def allow_replica_reads():
+    """Разрешает чтение с реплики до конца текущего запроса (для async view без ReplicaReadMixin)"""
+    _read_from_replica.set(True)
+
+
+class ReplicaRouter:
+    """
+    Отправляет разрешённые чтения на реплику, всё остальное — на основную БД.
+
+    Чтение идёт на реплику, только если запрос помечен ReplicaReadMixin
+    и в этом же запросе ещё не было записи.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Связанные объекты читаем из той же БД, что и исходный объект
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        alias = replica_alias()
+        if alias and _read_from_replica.get() and not _wrote.get():
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной БД, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    """Сбрасывает состояние маршрутизации на каждый запрос и запоминает записи пользователя"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        read_token = _read_from_replica.set(False)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            # DRF переносит пользователя из JWT в request.user исходного запроса
+            if _wrote.get():
+                remember_write(getattr(request, 'user', None))
+            return response
+        finally:
+            _read_from_replica.reset(read_token)
+            _wrote.reset(wrote_token)
+
+    async def __acall__(self, request):
+        read_token = _read_from_replica.set(False)
+        wrote_token = _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            if _wrote.get():
+                await aremember_write(getattr(request, 'user', None))
+            return response
+        finally:
+            _read_from_replica.reset(read_token)
+            _wrote.reset(wrote_token)
+
+
+class ReplicaReadMixin:
+    """
+    Разрешает чтение с реплики для действий из replica_actions.
+
+    Для ViewSet это имена действий ('list', 'retrieve'), для APIView — HTTP-методы ('get').
+    Сразу после записи пользователя (REPLICA_LAG_SECONDS) он читает с основной БД.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None) or request.method.lower()
+        if action in self.replica_actions and not recently_wrote(request.user):
+            _read_from_replica.set(True)
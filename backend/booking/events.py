@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .catalogue import CATALOGUE_MODELS, catalogue
+from .models import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    Внутрипроцессный брокер: будит открытые SSE-потоки сразу после коммита.
+
+    Сами события читаются из ChangeEvent, поэтому брокер передаёт только сигнал
+    «есть новое». Потоки других воркеров узнают об изменениях при опросе БД
+    раз в CHANGE_FEED_POLL_SECONDS — это и есть запасной путь для нескольких процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.add(waiter)
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._subscribers.discard(waiter)
+
+    def publish(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт — поток отключился
+                self.unsubscribe((loop, event))
+
+
+broker = LocalBroker()
+
+
+def record_change(instance, op, occupancy_only=False):
+    """Записывает событие изменения и будит подписчиков после коммита"""
+    ChangeEvent.objects.create(model=instance.__class__.__name__, object_id=instance.pk, op=op, occupancy_only=occupancy_only)
+    transaction.on_commit(broker.publish)
+
+
+def record_changes(model_name, object_ids, op='update', occupancy_only=False):
+    """
+    То же для массового UPDATE, мимо сигналов: одна вставка на все объекты.
+
+    occupancy_only — изменились только поля занятости номеров: справочник не сбрасывается.
+    """
+    ChangeEvent.objects.bulk_create(
+        ChangeEvent(model=model_name, object_id=object_id, op=op, occupancy_only=occupancy_only)
+        for object_id in object_ids
+    )
+    transaction.on_commit(broker.publish)
+    if model_name in CATALOGUE_MODELS and not occupancy_only:
+        # Сигналы не сработали — сбрасываем справочник номеров этого процесса сами
+        catalogue.invalidate()
+        transaction.on_commit(catalogue.invalidate)
+
+
+def format_event(event, with_id=True):
+    # Запоздавшее событие — без id: иначе Last-Event-ID браузера откатится назад
+    data = json.dumps(event.as_message(), separators=(',', ':'))
+    return (f'id: {event.id}\n' if with_id else '') + f'event: change\ndata: {data}\n\n'
+
+
+def overlap_start():
+    """С какого момента перечитывать события с id не выше курсора"""
+    return timezone.now() - timedelta(seconds=settings.CHANGE_FEED_OVERLAP_SECONDS)
+
+
+async def authenticate_stream(request):
+    """JWT из заголовка Authorization или ?token= (EventSource не умеет слать заголовки)"""
+    auth = JWTAuthentication()
+    raw_token = request.GET.get('token')
+    if not raw_token:
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        validated = auth.get_validated_token(raw_token)
+        return await sync_to_async(auth.get_user)(validated)
+    except (InvalidToken, TokenError):
+        return None
+
+
+async def fetch_events(last_id, models, limit, delivered=()):
+    """
+    Запоздавшие и новые события: (late, fresh).
+
+    fresh — после курсора last_id. late — с id не выше курсора, созданные в окне
+    CHANGE_FEED_OVERLAP_SECONDS и ещё не отданные (delivered — id, уже отданные потоком):
+    их транзакция зафиксировалась после события с большим id.
+    """
+    queryset = ChangeEvent.objects.order_by('id')
+    if models:
+        queryset = queryset.filter(model__in=models)
+    recent = queryset.filter(id__lte=last_id, created_at__gte=overlap_start()).values_list('id', flat=True)
+    late_ids = [pk async for pk in recent if pk not in delivered]
+    late = [event async for event in queryset.filter(id__in=late_ids)] if late_ids else []
+    fresh = [event async for event in queryset.filter(id__gt=last_id)[:limit]]
+    return late, fresh
+
+
+async def latest_event_id():
+    event = await ChangeEvent.objects.order_by('-id').only('id').afirst()
+    return event.id if event else 0
+
+
+async def event_stream(last_id, models):
+    poll_seconds = settings.CHANGE_FEED_POLL_SECONDS
+    deadline = time.monotonic() + settings.CHANGE_FEED_MAX_SECONDS
+    batch_size = settings.CHANGE_FEED_BATCH_SIZE
+    waiter = broker.subscribe()
+    _, wakeup = waiter
+    try:
+        # Подсказка клиенту, через сколько переподключаться
+        yield 'retry: 3000\n\n'
+        # id → created_at событий, отданных в окне перекрытия
+        delivered = {}
+        while time.monotonic() < deadline:
+            wakeup.clear()
+            late, fresh = await fetch_events(last_id, models, batch_size, delivered)
+            if late or fresh:
+                cutoff = overlap_start()
+                delivered = {pk: at for pk, at in delivered.items() if at >= cutoff}
+                delivered.update((event.id, event.created_at) for event in late + fresh)
+                if fresh:
+                    last_id = fresh[-1].id
+                yield (''.join(format_event(event, with_id=False) for event in late)
+                       + ''.join(format_event(event) for event in fresh))
+                if len(fresh) == batch_size:
+                    continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(waiter)
+
+
+async def change_feed(request):
+    """
+    SSE-лента изменений: /api/events/?token=&models=Booking,Room
+
+    Каждое событие — {model, id, op, version}. После переподключения браузер
+    присылает Last-Event-ID, и поток продолжает с этой версии. События последних
+    CHANGE_FEED_OVERLAP_SECONDS перечитываются, поэтому после переподключения
+    часть из них может прийти повторно — клиент отбрасывает уже виденные version.
+    Требует ASGI.
+    """
+    user = await authenticate_stream(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if since is not None and not str(since).isdigit():
+        return JsonResponse({'error': 'Неверная версия'}, status=400)
+    last_id = int(since) if since is not None else await latest_event_id()
+    models = [name for name in request.GET.get('models', '').split(',') if name]
+
+    response = StreamingHttpResponse(event_stream(last_id, models), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,259 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .models import Room
+
+# Колонки совпадают с таблицей на странице отчётов
+REPORT_COLUMNS = [
+    'ID', 'Номер', 'Здание', 'Класс', 'Статус', 'Гость', 'ИНН', 'Телефон',
+    'Заезд', 'Выезд', 'Гости', 'Оплачено', 'Цена',
+]
+
+# Подписи статусов как в отчёте на фронтенде
+BOOKING_STATUS_LABELS = {
+    'active': 'Активный',
+    'completed': 'Завершён',
+    'cancelled': 'Отменён',
+}
+
+PAYMENT_STATUS_LABELS = {
+    'paid': 'Оплачено',
+    'unpaid': 'Не оплачено',
+    'pending': 'В ожидании',
+}
+
+
+def tabular(data):
+    """
+    Ответ API как таблица (заголовок, строки) — для рендереров CSV/XLSX.
+
+    Словарь (например, {'error': ...}) — пары «поле, значение», список словарей —
+    строки с ключами первого элемента в заголовке.
+    """
+    if data is None:
+        return [], []
+    if isinstance(data, dict):
+        return ['Поле', 'Значение'], [[key, '' if value is None else value] for key, value in data.items()]
+    rows = list(data)
+    if rows and isinstance(rows[0], dict):
+        header = list(rows[0])
+        return header, [['' if row.get(key) is None else row.get(key) for key in header] for row in rows]
+    return ['Значение'], [[row] for row in rows]
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    ?format=csv. Экспорт отчёта отдаётся потоком мимо рендерера;
+    через рендерер проходят только обычные ответы (например, ошибки).
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        header, rows = tabular(data)
+        return ''.join(stream_csv(rows, header)).encode(self.charset) if header else b''
+
+
+class XLSXRenderer(CSVRenderer):
+    media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    format = 'xlsx'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        header, rows = tabular(data)
+        return b''.join(stream_xlsx(rows, header)) if header else b''
+
+
+def format_report_date(value):
+    if not value:
+        return ''
+    return timezone.localtime(value).strftime('%d.%m.%Y')
+
+
+ROOM_CLASS_LABELS = dict(Room._meta.get_field('room_class').choices)
+
+
+def report_row(row):
+    """Строка файла из денормализованной строки отчёта (BookingReportRow)"""
+    return [
+        row.booking_id,
+        row.room_number,
+        row.building_name,
+        ROOM_CLASS_LABELS.get(row.room_class, row.room_class),
+        BOOKING_STATUS_LABELS.get(row.status, row.status),
+        row.guest_name,
+        row.guest_inn,
+        row.guest_phone,
+        format_report_date(row.check_in),
+        format_report_date(row.check_out),
+        row.people_count,
+        PAYMENT_STATUS_LABELS.get(row.payment_status, row.payment_status),
+        row.total_amount,
+    ]
+
+
+def iter_report_rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield report_row(row)
+
+
+async def aiter_report_rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        yield report_row(row)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, header=REPORT_COLUMNS):
+    writer = csv.writer(_Echo())
+    # BOM, чтобы Excel правильно открывал кириллицу
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def astream_csv(rows, header=REPORT_COLUMNS):
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(header)
+    async for row in rows:
+        yield writer.writerow(row)
+
+
+class _ChunkBuffer:
+    """Несбрасываемый (non-seekable) буфер для zipfile: накапливает байты до выгрузки"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _xlsx_cell(value, style=''):
+    if isinstance(value, bool):
+        value = 'Да' if value else 'Нет'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c{style}><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values, style=''):
+    return '<row>' + ''.join(_xlsx_cell(value, style) for value in values) + '</row>'
+
+
+def stream_xlsx(rows, header=REPORT_COLUMNS, sheet_name='Отчёт', flush_rows=None):
+    """
+    Потоковая запись XLSX без сторонних библиотек.
+
+    Лист пишется в zip-поток построчно (inline-строки, без sharedStrings),
+    сжатые данные выгружаются каждые flush_rows строк — память не зависит от размера отчёта.
+    """
+    flush_rows = flush_rows or settings.STREAMING_CHUNK_SIZE
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name)))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _STYLES)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(header, ' s="1"')
+            ).encode('utf-8'))
+            pending = []
+            for row in rows:
+                pending.append(_xlsx_row(row))
+                if len(pending) >= flush_rows:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    yield buffer.drain()
+            if pending:
+                sheet.write(''.join(pending).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+EXPORT_WRITERS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_xlsx, XLSXRenderer.media_type),
+}
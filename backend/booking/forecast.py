@@ -0,0 +1,167 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Building, Room
+from .rollups import _ratio, counted_bookings, day_bounds
+
+# Тот же момент прошлого года (STLY) — 52 недели назад, чтобы совпадали дни недели
+LAST_YEAR = timedelta(weeks=52)
+
+
+class BookingIntervals:
+    """
+    Бронирования в виде массивов NumPy: ночи [start, end), дата создания и корпус.
+
+    Грузятся одним запросом; дальше загрузка по дням считается разностными
+    массивами (+1 в день заезда, −1 в день выезда, накопленная сумма) —
+    без циклов по бронированиям и дням.
+    """
+
+    def __init__(self, start, end, created, building):
+        self.start = start
+        # Как в stay_dates: бронирование короче суток занимает одну ночь
+        self.end = np.maximum(end, start + 1)
+        self.created = created
+        self.building = building
+
+    @classmethod
+    def load(cls, date_from, date_to, building_id=None):
+        """Бронирования с ночами в [date_from, date_to] (отменённые не входят)"""
+        start, end = day_bounds(date_from, date_to)
+        bookings = counted_bookings().filter(check_in__lt=end, check_out__gt=start)
+        if building_id:
+            bookings = bookings.filter(room__building_id=building_id)
+        rows = list(bookings.values_list('check_in__date', 'check_out__date', 'created_at__date', 'room__building_id'))
+        check_in, check_out, created, building = zip(*rows) if rows else ((), (), (), ())
+        return cls(
+            np.array(check_in, dtype='datetime64[D]'),
+            np.array(check_out, dtype='datetime64[D]'),
+            np.array(created, dtype='datetime64[D]'),
+            np.array(building, dtype=np.int64),
+        )
+
+    def _clip(self, date_from, days, as_of=None):
+        """Номера дней первой и последней+1 ночи внутри окна и маска попавших в окно"""
+        origin = np.datetime64(date_from, 'D')
+        first = np.clip((self.start - origin).astype(np.int64), 0, days)
+        last = np.clip((self.end - origin).astype(np.int64), 0, days)
+        mask = first < last
+        if as_of is not None:
+            mask &= self.created <= np.datetime64(as_of, 'D')
+        return first, last, mask
+
+    def nights(self, date_from, days, buildings, as_of=None):
+        """
+        Занятые номеро-ночи: массив (корпуса × дни) начиная с date_from.
+
+        buildings — отсортированный массив id корпусов, строки результата идут
+        в том же порядке. as_of — учитывать только бронирования, созданные не
+        позже этой даты (None — все).
+        """
+        first, last, mask = self._clip(date_from, days, as_of)
+        rows = np.searchsorted(buildings, self.building[mask])
+        width = days + 1
+        size = len(buildings) * width
+        diff = (np.bincount(rows * width + first[mask], minlength=size)
+                - np.bincount(rows * width + last[mask], minlength=size))
+        return diff.reshape(len(buildings), width).cumsum(axis=1)[:, :days]
+
+    def pickup(self, date_from, days, as_of, lookback):
+        """
+        Кривая набора: номеро-ночи окна, известные на as_of − k дней, k = 0..lookback.
+
+        Каждое бронирование добавляет свои ночи в окне в день создания, поэтому
+        кривая — итог на as_of минус накопленная сумма ночей по дням создания.
+        """
+        first, last, mask = self._clip(date_from, days)
+        lead = (np.datetime64(as_of, 'D') - self.created[mask]).astype(np.int64)
+        nights = (last - first)[mask]
+        booked = lead >= 0
+        total = nights[booked].sum()
+        recent = lead[booked] <= lookback
+        by_lead = np.bincount(lead[booked][recent], weights=nights[booked][recent], minlength=lookback + 1)
+        return total - np.concatenate(([0], np.cumsum(by_lead)[:-1])).astype(np.int64)
+
+
+def room_capacity(building_id=None):
+    rooms = Room.objects.filter(is_active=True, building__is_deleted=False)
+    if building_id:
+        rooms = rooms.filter(building_id=building_id)
+    return list(rooms.values('building_id', 'building__name').annotate(total=Count('id')))
+
+
+def _totals(nights, rooms, days):
+    nights = int(nights)
+    return {'nights': nights, 'occupancy_rate': _ratio(nights * 100, rooms * days)}
+
+
+def forecast_report(date_from, days, building_id=None, as_of=None, lookback=30):
+    """
+    Темп продаж и прогноз загрузки на days дней вперёд от date_from.
+
+    on_the_books — ночи, забронированные на as_of (по умолчанию сегодня);
+    stly — то же на тот же момент прошлого года для того же периода годом раньше;
+    ly_actual — итог прошлого года; forecast — on_the_books плюс добор, который
+    прошлый год получил после stly (аддитивный метод), не больше числа номеров.
+    Уже прошедшие дни периода не добираются. Бронирования читаются одним запросом.
+    """
+    as_of = as_of or timezone.localdate()
+    date_to = date_from + timedelta(days=days - 1)
+    ly_from, ly_as_of = date_from - LAST_YEAR, as_of - LAST_YEAR
+    intervals = BookingIntervals.load(ly_from, date_to, building_id)
+    capacity = room_capacity(building_id)
+    names = {row['building_id']: row['building__name'] for row in capacity}
+    buildings = np.union1d(np.array(list(names), dtype=np.int64), intervals.building)
+    missing = set(buildings.tolist()) - set(names)
+    if missing:
+        names.update(Building.all_objects.filter(pk__in=missing).values_list('pk', 'name'))
+    room_counts = {row['building_id']: row['total'] for row in capacity}
+    rooms = np.array([room_counts.get(pk, 0) for pk in buildings.tolist()], dtype=np.int64)
+
+    on_the_books = intervals.nights(date_from, days, buildings, as_of)
+    stly = intervals.nights(ly_from, days, buildings, ly_as_of)
+    ly_actual = intervals.nights(ly_from, days, buildings)
+    remaining = np.maximum(ly_actual - stly, 0)
+    remaining[:, :max((as_of - date_from).days, 0)] = 0
+    forecast = np.maximum(np.minimum(on_the_books + remaining, rooms[:, None]), on_the_books)
+
+    series = {'on_the_books': on_the_books, 'stly': stly, 'ly_actual': ly_actual, 'forecast': forecast}
+    rooms_total = int(rooms.sum())
+    daily_totals = {key: values.sum(axis=0) for key, values in series.items()}
+    daily = [
+        {
+            'date': date_from + timedelta(days=i),
+            **{key: int(values[i]) for key, values in daily_totals.items()},
+            'occupancy_rate': _ratio(int(daily_totals['on_the_books'][i]) * 100, rooms_total),
+            'forecast_rate': _ratio(int(daily_totals['forecast'][i]) * 100, rooms_total),
+        }
+        for i in range(days)
+    ]
+    per_building = [
+        {
+            'building': {'id': pk, 'name': names.get(pk, '')},
+            'rooms': int(rooms[index]),
+            **{key: _totals(values[index].sum(), int(rooms[index]), days) for key, values in series.items()},
+        }
+        for index, pk in enumerate(buildings.tolist())
+    ]
+    current = intervals.pickup(date_from, days, as_of, lookback)
+    last_year = intervals.pickup(ly_from, days, ly_as_of, lookback)
+    pickup = [
+        {'days_before': k, 'date': as_of - timedelta(days=k), 'on_the_books': int(current[k]), 'stly': int(last_year[k])}
+        for k in range(lookback + 1)
+    ]
+    return {
+        'as_of': as_of,
+        'stly_as_of': ly_as_of,
+        'date_from': date_from,
+        'date_to': date_to,
+        'rooms': rooms_total,
+        **{key: _totals(values.sum(), rooms_total, days) for key, values in series.items()},
+        'buildings': per_building,
+        'daily': daily,
+        'pickup': pickup,
+    }
@@ -0,0 +1,199 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .exports import EXPORT_WRITERS, iter_report_rows
+from .models import BookingReportRow, Job
+from .reports import filter_report_rows
+from .rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Обработчики по Job.kind: handler(job, progress)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def result_dir():
+    path = Path(settings.JOBS_RESULT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def result_path(job):
+    return Path(settings.JOBS_RESULT_DIR) / job.result_file
+
+
+class JobProgress:
+    """
+    Прогресс и признак жизни задачи.
+
+    Счётчики копятся в памяти, а в БД их раз в interval секунд пишет отдельный поток
+    со своим соединением: запись фиксируется сразу, даже если обработчик держит долгую
+    транзакцию (пересборка срезов), и другой воркер не примет задачу за брошенную.
+    """
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self.processed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._beat_forever, name=f'job-{self.job.pk}-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def set_total(self, total):
+        self.job.total = total
+
+    def advance(self, count=1):
+        self.processed += count
+
+    def track(self, items):
+        for item in items:
+            yield item
+            self.advance()
+
+    def beat(self):
+        Job.objects.filter(pk=self.job.pk).update(
+            total=self.job.total, processed=self.processed, heartbeat_at=timezone.now(),
+        )
+
+    def _beat_forever(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.beat()
+                except DatabaseError as e:
+                    logger.warning(f"Задача #{self.job.pk}: не удалось записать прогресс: {str(e)}")
+        finally:
+            # Соединения этого потока
+            connections.close_all()
+
+
+def write_result(job, chunks, name):
+    """Пишет поток str/bytes во временный файл и переименовывает его по готовности"""
+    filename = f'{job.pk}-{secrets.token_hex(8)}{Path(name).suffix}'
+    path = result_dir() / filename
+    partial = path.with_suffix(path.suffix + '.part')
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    job.result_file = filename
+    job.result_name = name
+
+
+def report_export_queryset(params):
+    """Строки отчёта по фильтрам задачи; ValueError при неверных фильтрах"""
+    return filter_report_rows(BookingReportRow.objects.order_by('booking_id'), params.get('filters') or {})
+
+
+@job_handler('report_export')
+def export_report(job, progress):
+    export_format = job.params.get('format', 'csv')
+    writer, _ = EXPORT_WRITERS[export_format]
+    queryset = report_export_queryset(job.params)
+    progress.set_total(queryset.count())
+    rows = progress.track(iter_report_rows(queryset))
+    write_result(job, writer(rows), f'report_{timezone.localdate().isoformat()}.{export_format}')
+
+
+@job_handler('rebuild_rollups')
+def rebuild_rollups_job(job, progress):
+    rooms_count, buildings_count = rebuild_rollups(progress=progress)
+    job.result = {'room_days': rooms_count, 'building_days': buildings_count}
+
+
+def claim_job(now=None):
+    """Берёт следующую задачу из очереди (или брошенную упавшим воркером)"""
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    with transaction.atomic():
+        candidates = Job.objects.filter(Q(status='pending') | Q(status='running', heartbeat_at__lt=stale)).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        job = candidates.first()
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = now
+        job.processed = 0
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'processed'])
+    return job
+
+
+def run_job(job):
+    try:
+        with JobProgress(job) as progress:
+            JOB_HANDLERS[job.kind](job, progress)
+    except Exception as e:
+        logger.error(f"Задача #{job.pk} ({job.kind}) завершилась ошибкой: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'done'
+        if job.result_file:
+            job.expires_at = timezone.now() + timedelta(hours=settings.JOBS_RESULT_TTL_HOURS)
+    job.processed = progress.processed
+    job.finished_at = job.heartbeat_at = timezone.now()
+    job.save()
+    return job
+
+
+def purge_expired_results(now=None):
+    """Удаляет файлы результатов с истёкшим сроком хранения"""
+    now = now or timezone.now()
+    expired = list(Job.objects.filter(status='done', expires_at__lt=now).exclude(result_file=''))
+    for job in expired:
+        result_path(job).unlink(missing_ok=True)
+    Job.objects.filter(pk__in=[job.pk for job in expired]).update(status='expired', result_file='')
+    return len(expired)
+
+
+class JobWorker:
+    """Выполняет задачи по одной; раз в минуту чистит просроченные результаты"""
+
+    def __init__(self, poll_seconds=None, sleep=time.sleep):
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.JOBS_POLL_SECONDS
+        self.sleep = sleep
+        self.purged_at = 0.0
+
+    def run_once(self):
+        if time.monotonic() - self.purged_at >= 60:
+            self.purged_at = time.monotonic()
+            purge_expired_results()
+        job = claim_job()
+        return run_job(job) if job else None
+
+    def run_forever(self, on_result=None):
+        while True:
+            job = self.run_once()
+            if job is None:
+                self.sleep(self.poll_seconds)
+            elif on_result:
+                on_result(job)
@@ -0,0 +1,174 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .events import overlap_start, record_changes
+from .models import AuditLog, Booking, BookingReportRow, ChangeEvent, Room
+
+
+def active_bookings():
+    return Booking.objects.filter(status='active')
+
+
+def chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def complete_bookings(now, batch_size=500):
+    """Завершает активные бронирования с наступившим выездом; возвращает {id: room_id}"""
+    due = dict(active_bookings().filter(check_out__lte=now).values_list('pk', 'room_id'))
+    for ids in chunks(due, batch_size):
+        # update() мимо сигналов: строки отчёта и аудит обновляем сами, срезы от статуса completed не зависят
+        Booking.objects.filter(pk__in=ids, status='active').update(status='completed')
+        BookingReportRow.objects.filter(booking_id__in=ids).update(status='completed')
+    AuditLog.objects.bulk_create([
+        AuditLog(action='Изменение', object_type='Booking', object_id=pk, details='Бронирование завершено по времени выезда')
+        for pk in due
+    ], batch_size=batch_size)
+    record_changes('Booking', due)
+    return due
+
+
+def refresh_room_statuses(room_ids=None, now=None, batch_size=500):
+    """
+    Room.update_status для многих номеров: три запроса на чтение и bulk_update.
+
+    room_ids=None — все номера. Статус номеров на ремонте не меняется, но поля
+    занятости (текущее проживание, ближайший заезд) пересчитываются и у них.
+    Возвращает списки id номеров, ставших занятыми и свободными.
+    """
+    now = now or timezone.now()
+    rooms = Room.objects.all()
+    bookings = active_bookings()
+    if room_ids is not None:
+        room_ids = list(room_ids)
+        rooms = rooms.filter(pk__in=room_ids)
+        bookings = bookings.filter(room_id__in=room_ids)
+    current = dict(bookings.filter(check_in__lte=now, check_out__gt=now).values_list('room_id', 'pk'))
+    upcoming = dict(
+        bookings.filter(check_in__gt=now).order_by().values('room_id').annotate(first=Min('check_in')).values_list('room_id', 'first')
+    )
+    changed = []
+    to_busy, to_free = [], []
+    for room in rooms.only('pk', 'status', 'current_booking', 'next_check_in', 'free_until'):
+        old_status = room.status
+        if room.apply_occupancy(current.get(room.pk), upcoming.get(room.pk)):
+            changed.append(room)
+            if room.status != old_status:
+                (to_busy if room.status == 'busy' else to_free).append(room.pk)
+    # bulk_update идёт через TimestampedQuerySet.update — updated_at проставляется, сигналы не срабатывают
+    Room.objects.bulk_update(changed, ['status', 'current_booking', 'next_check_in', 'free_until'], batch_size=batch_size)
+    AuditLog.objects.bulk_create([
+        AuditLog(action='Изменение', object_type='Room', object_id=pk, details=f'Статус по расписанию: {new_status}')
+        for new_status, ids in (('busy', to_busy), ('free', to_free))
+        for pk in ids
+    ], batch_size=batch_size)
+    record_changes('Room', [room.pk for room in changed], occupancy_only=True)
+    return to_busy, to_free
+
+
+def apply_transitions(since, now):
+    """
+    Применяет все переходы, наступившие к now.
+
+    Пересчитываются только номера, у которых в (since, now] был заезд или выезд;
+    since=None — первый проход после запуска, пересчитываются все номера.
+    """
+    with transaction.atomic():
+        completed = complete_bookings(now)
+        room_ids = None
+        if since is not None:
+            arrived = active_bookings().filter(check_in__gt=since, check_in__lte=now).values_list('room_id', flat=True)
+            room_ids = set(completed.values()) | set(arrived)
+        to_busy, to_free = refresh_room_statuses(room_ids, now)
+    return {'completed': len(completed), 'busy': len(to_busy), 'free': len(to_free)}
+
+
+class LifecycleScheduler:
+    """
+    Очередь ближайших заездов и выездов (min-heap моментов времени).
+
+    Воркер спит ровно до ближайшего момента, но не дольше LIFECYCLE_POLL_SECONDS:
+    при пробуждении дочитывает новые события Booking из ленты изменений и
+    добавляет их моменты в очередь. Моменты грузятся на LIFECYCLE_HORIZON_HOURS
+    вперёд индексированным запросом по (status, check_in/check_out).
+    """
+
+    def __init__(self, poll_seconds=None, horizon=None, clock=timezone.now, sleep=time.sleep):
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.LIFECYCLE_POLL_SECONDS
+        self.horizon = horizon or timedelta(hours=settings.LIFECYCLE_HORIZON_HOURS)
+        self.clock = clock
+        self.sleep = sleep
+        self.heap = []
+        self.queued = set()
+        self.loaded_until = None
+        self.last_run = None
+        self.last_event_id = None
+
+    def push_bookings(self, bookings, now):
+        # Моменты после прошлого прохода: уже наступившие сработают на ближайшем run_pending
+        after = self.last_run or now
+        until = self.loaded_until
+        window = Q(check_in__gt=after, check_in__lte=until) | Q(check_out__gt=after, check_out__lte=until)
+        for instants in bookings.filter(window).values_list('check_in', 'check_out'):
+            for instant in instants:
+                if after < instant <= until and instant not in self.queued:
+                    self.queued.add(instant)
+                    heapq.heappush(self.heap, instant)
+
+    def load(self, now):
+        """Загружает моменты до now + horizon"""
+        # Курсор ленты берём до чтения бронирований: изменения между запросами прочитаются ещё раз
+        latest = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first()
+        self.last_event_id = latest or 0
+        self.loaded_until = now + self.horizon
+        self.push_bookings(active_bookings(), now)
+
+    def watch_changes(self, now):
+        """
+        Добавляет в очередь моменты бронирований, изменённых с прошлого пробуждения.
+
+        События окна CHANGE_FEED_OVERLAP_SECONDS перечитываются: событие с меньшим id
+        могло зафиксироваться уже после курсора. Повторно добавленные моменты не дублируются.
+        """
+        recent = Q(id__gt=self.last_event_id) | Q(created_at__gte=overlap_start())
+        events = ChangeEvent.objects.filter(recent, model='Booking').order_by('id')
+        changed = list(events.values_list('id', 'object_id'))
+        if not changed:
+            return
+        self.last_event_id = max(self.last_event_id, changed[-1][0])
+        self.push_bookings(active_bookings().filter(pk__in={object_id for _, object_id in changed}), now)
+
+    def run_pending(self):
+        """Применяет наступившие переходы; возвращает итоги или None, если применять нечего"""
+        now = self.clock()
+        if self.loaded_until is None or now >= self.loaded_until:
+            self.load(now)
+        else:
+            self.watch_changes(now)
+        if self.last_run is not None and not (self.heap and self.heap[0] <= now):
+            return None
+        while self.heap and self.heap[0] <= now:
+            self.queued.discard(heapq.heappop(self.heap))
+        result = apply_transitions(self.last_run, now)
+        self.last_run = now
+        return result
+
+    def seconds_until_next(self):
+        now = self.clock()
+        wake_at = min([now + timedelta(seconds=self.poll_seconds), self.loaded_until] + self.heap[:1])
+        return max((wake_at - now).total_seconds(), 0)
+
+    def run_forever(self, on_result=None):
+        while True:
+            result = self.run_pending()
+            if result and on_result:
+                on_result(result)
+            self.sleep(self.seconds_until_next())
@@ -0,0 +1,390 @@
+import asyncio
+import io
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from .models import Booking, Guest, Room, User
+from .slow_queries import percentile
+
+LOADTEST_USER_PREFIX = 'loadtest_'
+DEFAULT_MIX = {'dashboard': 40, 'search': 30, 'create': 20, 'export': 5, 'login': 5}
+
+
+def request_host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+class WSGIDriver:
+    """Вызывает WSGI-приложение прямо в потоке виртуального пользователя (как потоковый сервер)"""
+
+    def __init__(self, application):
+        self.application = application
+        self.host = request_host()
+
+    def request(self, method, path, query='', body=b'', headers=None):
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        status = {}
+
+        def start_response(status_line, response_headers, exc_info=None):
+            status['code'] = int(status_line.split(' ', 1)[0])
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status['code'], content
+
+    def close(self):
+        pass
+
+
+class ASGIDriver:
+    """
+    Все запросы идут в одно ASGI-приложение на одном цикле событий в отдельном потоке —
+    так же, как в одном воркере uvicorn.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.host = request_host()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, query='', body=b'', headers=None):
+        future = asyncio.run_coroutine_threadsafe(self._request(method, path, query, body, headers or {}), self.loop)
+        return future.result()
+
+    async def _request(self, method, path, query, body, headers):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+            'headers': [
+                (b'host', self.host.encode()),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ] + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        }
+        body_sent = False
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Клиент не отключается, пока ответ не отдан целиком
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        status = {}
+        chunks = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            finished.set()
+        return status['code'], b''.join(chunks)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class Recorder:
+    """Задержки и коды ответов по каждому типу запроса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def record(self, name, started, status_code):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][status_code] += 1
+
+    def record_error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+    def summary(self, duration):
+        rows = []
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(name) or [0.0]
+            rows.append({
+                'name': name,
+                'count': len(self.latencies.get(name, [])),
+                'rps': round(len(self.latencies.get(name, [])) / duration, 2) if duration else 0,
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                'max_ms': round(max(latencies) * 1000, 1),
+                'statuses': dict(self.statuses.get(name, {})),
+                'errors': self.errors.get(name, 0),
+            })
+        return rows
+
+
+class LockMonitor:
+    """
+    Раз в interval секунд считает сессии PostgreSQL, ждущие блокировку.
+
+    Плюс прирост deadlocks в pg_stat_database за время прогона.
+    На других СУБД ничего не делает.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.enabled = connection.vendor == 'postgresql'
+        self.samples = []
+        self.deadlocks_before = None
+        self.deadlocks_after = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _deadlocks(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()')
+            return cursor.fetchone()[0]
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def start(self):
+        if self.enabled:
+            self.deadlocks_before = self._deadlocks()
+            self._thread.start()
+
+    def stop(self):
+        if self.enabled:
+            self._stop.set()
+            self._thread.join()
+            self.deadlocks_after = self._deadlocks()
+
+    def summary(self):
+        if not self.enabled:
+            return None
+        waiting = [sample for sample in self.samples if sample]
+        return {
+            'samples': len(self.samples),
+            'samples_with_waits': len(waiting),
+            'max_waiting': max(self.samples, default=0),
+            'avg_waiting': round(sum(self.samples) / len(self.samples), 2) if self.samples else 0,
+            'deadlocks': (self.deadlocks_after or 0) - (self.deadlocks_before or 0),
+        }
+
+
+def ensure_load_users(count, password):
+    """Сотрудники loadtest_N с известным паролем для входа через /api/auth/token/"""
+    usernames = []
+    for index in range(count):
+        username = f'{LOADTEST_USER_PREFIX}{index}'
+        user, created = User.objects.get_or_create(username=username, defaults={'role': 'admin'})
+        if created or not user.check_password(password):
+            user.set_password(password)
+            user.save()
+        usernames.append(username)
+    return usernames
+
+
+def cleanup_load_users():
+    """Удаляет пользователей нагрузочного теста и созданные ими бронирования"""
+    users = User.objects.filter(username__startswith=LOADTEST_USER_PREFIX)
+    bookings_deleted, _ = Booking.objects.filter(created_by__in=users).delete()
+    users_deleted, _ = users.delete()
+    return bookings_deleted, users_deleted
+
+
+class VirtualUser:
+    """Один сотрудник: входит в систему и выполняет действия по заданным весам"""
+
+    def __init__(self, driver, recorder, username, password, fixtures, rng):
+        self.driver = driver
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.fixtures = fixtures
+        self.rng = rng
+        self.token = None
+
+    def call(self, name, method, path, params=None, payload=None):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        body = json.dumps(payload).encode() if payload is not None else b''
+        started = time.perf_counter()
+        try:
+            status_code, content = self.driver.request(method, path, urlencode(params or {}), body, headers)
+        except Exception:
+            self.recorder.record_error(name)
+            return None, b''
+        self.recorder.record(name, started, status_code)
+        return status_code, content
+
+    def login(self):
+        status_code, content = self.call('login', 'POST', '/api/auth/token/',
+                                         payload={'username': self.username, 'password': self.password})
+        self.token = json.loads(content)['access'] if status_code == 200 else None
+
+    def dashboard(self):
+        # Главная страница грузит номера, гостей и бронирования
+        self.call('rooms', 'GET', '/api/rooms/')
+        self.call('guests', 'GET', '/api/guests/')
+        self.call('bookings', 'GET', '/api/bookings/')
+
+    def search(self):
+        prefix = self.rng.choice(self.fixtures['search_terms'])
+        self.call('guest-search', 'GET', '/api/guests/search/', {'q': prefix, 'limit': 10})
+
+    def create(self):
+        # Узкое окно дат, чтобы часть заявок пересекалась и получала отказ
+        check_in = self.fixtures['window_start'] + timedelta(days=self.rng.randint(0, 13))
+        check_out = check_in + timedelta(days=self.rng.choice([1, 2, 3]), hours=-2)
+        self.call('booking-create', 'POST', '/api/bookings/', payload={
+            'guest_id': self.rng.choice(self.fixtures['guest_ids']),
+            'room_id': self.rng.choice(self.fixtures['room_ids']),
+            'check_in': check_in.isoformat(),
+            'check_out': check_out.isoformat(),
+            'people_count': 1,
+        })
+
+    def export(self):
+        date_to = timezone.localdate()
+        self.call('export', 'GET', '/api/reports/export/', {
+            'format': 'csv',
+            'date_from': (date_to - timedelta(days=30)).isoformat(),
+            'date_to': date_to.isoformat(),
+        })
+
+    def run(self, mix, deadline, think_time):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        try:
+            self.login()
+            while time.monotonic() < deadline:
+                action = self.rng.choices(actions, weights)[0]
+                getattr(self, action)()
+                if think_time:
+                    time.sleep(self.rng.uniform(0, think_time * 2))
+        finally:
+            connections.close_all()
+
+
+def load_fixtures(rooms_limit=50):
+    room_ids = list(Room.objects.filter(status__in=['free', 'busy'])
+                    .order_by('?').values_list('pk', flat=True)[:rooms_limit])
+    guest_ids = list(Guest.objects.order_by('?').values_list('pk', flat=True)[:500])
+    names = Guest.objects.values_list('full_name', flat=True)[:200]
+    search_terms = sorted({name[:3] for name in names if len(name) >= 3}) or ['Ив']
+    search_terms += [f'0{digits}' for digits in ('70', '55', '77')]
+    window_start = (timezone.now() + timedelta(days=1)).replace(hour=14, minute=0, second=0, microsecond=0)
+    return {'room_ids': room_ids, 'guest_ids': guest_ids, 'search_terms': search_terms, 'window_start': window_start}
+
+
+def run_load(application, server='wsgi', users=10, duration=60, mix=None, password='loadtest-pass',
+             think_time=0.0, seed=None, rooms_limit=50):
+    """
+    Прогоняет смешанную нагрузку от users виртуальных сотрудников в течение duration секунд.
+
+    Возвращает сводку по запросам, общую пропускную способность и ожидания блокировок.
+    """
+    mix = mix or DEFAULT_MIX
+    usernames = ensure_load_users(users, password)
+    fixtures = load_fixtures(rooms_limit)
+    if not fixtures['room_ids'] or not fixtures['guest_ids']:
+        raise ValueError('Нет номеров или гостей: сначала выполните seed_perf_data')
+    connection.close()
+
+    driver = ASGIDriver(application) if server == 'asgi' else WSGIDriver(application)
+    recorder = Recorder()
+    monitor = LockMonitor()
+    rng = random.Random(seed)
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=VirtualUser(driver, recorder, username, password, fixtures, random.Random(rng.random())).run,
+            args=(mix, deadline, think_time),
+        )
+        for username in usernames
+    ]
+
+    monitor.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+    driver.close()
+
+    rows = recorder.summary(elapsed)
+    total = sum(row['count'] for row in rows)
+    return {
+        'server': server,
+        'users': users,
+        'duration_s': round(elapsed, 2),
+        'requests': total,
+        'rps': round(total / elapsed, 2) if elapsed else 0,
+        'endpoints': rows,
+        'locks': monitor.summary(),
+    }
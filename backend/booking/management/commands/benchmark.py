@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from booking.benchmarks import run_benchmarks
+from booking.models import User
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время и число SQL-запросов всех API-эндпоинтов и основных сериализаторов на текущей БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз вызывать каждый эндпоинт')
+        parser.add_argument('--user', help='Логин пользователя, от имени которого идут запросы (по умолчанию — первый суперпользователь)')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('Пользователь не найден: создайте суперпользователя или укажите --user')
+
+        results = run_benchmarks(user, repeat=options['repeat'])
+        self.stdout.write(f"{'Эндпоинт':<32} {'Код':>4} {'Медиана, мс':>12} {'p95, мс':>10} {'SQL':>5} {'Бюджет':>7}")
+        for result in results:
+            line = (
+                f"{result['name']:<32} {result['status'] or '':>4} {result['median_ms']:>12} "
+                f"{result['p95_ms']:>10} {result['queries']:>5} {result['budget']:>7}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['over_budget'] else line)
+
+        over_budget = [result['name'] for result in results if result['over_budget']]
+        if over_budget:
+            raise CommandError(f"Превышен бюджет SQL-запросов: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS(f'Все {len(results)} замеров в пределах бюджета'))
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from booking.openapi import write_schema
+
+
+class Command(BaseCommand):
+    help = 'Собирает схему OpenAPI в файл, который отдаёт /api/schema/ (выполнять при сборке или деплое)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_PATH, help='Путь к файлу схемы')
+        parser.add_argument('--url', help='Базовый URL API в схеме (по умолчанию — адрес, с которого открыта документация)')
+
+    def handle(self, *args, **options):
+        path = write_schema(options['output'], url=options['url'])
+        self.stdout.write(self.style.SUCCESS(f'Схема OpenAPI записана в {path}'))
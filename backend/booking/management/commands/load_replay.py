@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from booking.loadtest import DEFAULT_MIX, cleanup_load_users, run_load
+
+
+def parse_mix(value):
+    """dashboard=40,search=30,... → {'dashboard': 40, ...}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise CommandError(f'Неверный элемент --mix: {part} (допустимы {", ".join(DEFAULT_MIX)})')
+        mix[name] = int(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон внутри процесса: виртуальные сотрудники параллельно входят, '
+        'открывают главную, ищут гостей, создают бронирования и выгружают отчёты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi', help='Какое приложение нагружать')
+        parser.add_argument('--users', type=int, default=10, help='Количество одновременных виртуальных сотрудников')
+        parser.add_argument('--duration', type=int, default=60, help='Длительность прогона в секундах')
+        parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+                            help='Веса действий, например dashboard=40,search=30,create=20,export=5,login=5')
+        parser.add_argument('--think-ms', type=int, default=0, help='Средняя пауза между действиями, мс')
+        parser.add_argument('--password', default='loadtest-pass', help='Пароль пользователей loadtest_N')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для воспроизводимого прогона')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результат в JSON-файл')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить пользователей loadtest_N и их бронирования и выйти')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            bookings, users = cleanup_load_users()
+            self.stdout.write(self.style.SUCCESS(f'Удалено объектов: бронирования и связанное {bookings}, пользователи {users}'))
+            return
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                'БД не PostgreSQL: блокировки и конкуренция будут не такими, как в продакшене'
+            ))
+        if options['server'] == 'asgi':
+            from femida.asgi import application
+        else:
+            from femida.wsgi import application
+
+        try:
+            result = run_load(
+                application,
+                server=options['server'],
+                users=options['users'],
+                duration=options['duration'],
+                mix=parse_mix(options['mix']),
+                password=options['password'],
+                think_time=options['think_ms'] / 1000,
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'Запрос':<16} {'Кол-во':>7} {'RPS':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  Коды"
+        )
+        for row in result['endpoints']:
+            statuses = ' '.join(f'{code}×{count}' for code, count in sorted(row['statuses'].items()))
+            if row['errors']:
+                statuses += f" ошибок×{row['errors']}"
+            self.stdout.write(
+                f"{row['name']:<16} {row['count']:>7} {row['rps']:>7} {row['p50_ms']:>8} "
+                f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}  {statuses}"
+            )
+        locks = result['locks']
+        if locks:
+            self.stdout.write(
+                f"Ожидания блокировок: в {locks['samples_with_waits']} из {locks['samples']} замеров, "
+                f"максимум {locks['max_waiting']}, в среднем {locks['avg_waiting']}, deadlock: {locks['deadlocks']}"
+            )
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['requests']} запросов за {result['duration_s']} с: {result['rps']} запросов/с "
+            f"({result['users']} пользователей, {result['server'].upper()})"
+        ))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from booking.profiling import profile_imports
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые медленные импорты при холодном старте воркера (python -X importtime)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Сколько модулей показать')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative', help='Сортировать по полному времени импорта или по собственному')
+        parser.add_argument('--module', action='append', help='Модуль, который импортировать после WSGI-приложения (по умолчанию — ROOT_URLCONF)')
+
+    def handle(self, *args, **options):
+        modules = options['module'] or [settings.ROOT_URLCONF]
+        try:
+            imports, startup_ms = profile_imports(modules)
+        except RuntimeError as e:
+            raise CommandError(f'Не удалось замерить импорты: {str(e)}')
+
+        key = f"{options['sort']}_ms"
+        self.stdout.write(f"{'Модуль':<60} {'Своё, мс':>10} {'Всего, мс':>10}")
+        for row in sorted(imports, key=lambda row: row[key], reverse=True)[:options['top']]:
+            self.stdout.write(f"{row['module']:<60} {row['self_ms']:>10.1f} {row['cumulative_ms']:>10.1f}")
+        self.stdout.write(self.style.SUCCESS(f'Холодный старт: {startup_ms:.0f} мс, модулей импортировано: {len(imports)}'))
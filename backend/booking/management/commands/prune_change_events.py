@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from booking.models import ChangeEvent
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые события ленты изменений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGE_EVENT_RETENTION_DAYS, help='Сколько дней хранить события')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = ChangeEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {deleted}'))
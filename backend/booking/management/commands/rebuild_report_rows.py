@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from booking.reports import rebuild_report_rows
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает денормализованную таблицу отчётов по бронированиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки для чтения и вставки')
+
+    def handle(self, *args, **options):
+        created = rebuild_report_rows(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Строк отчёта создано: {created}'))
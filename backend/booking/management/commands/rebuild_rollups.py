@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from booking.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает суточные срезы занятости и выручки по номерам и корпусам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки для чтения и вставки')
+
+    def handle(self, *args, **options):
+        rooms_count, buildings_count = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Срезы пересобраны: номеров×дней {rooms_count}, корпусов×дней {buildings_count}'
+            )
+        )
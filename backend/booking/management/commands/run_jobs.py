@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from booking.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи (экспорт отчётов, пересборка срезов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить одну задачу и выйти')
+        parser.add_argument('--poll', type=float, default=None, help='Пауза при пустой очереди, секунд')
+
+    def handle(self, *args, **options):
+        worker = JobWorker(poll_seconds=options['poll'])
+        if options['once']:
+            job = worker.run_once()
+            if job is None:
+                self.stdout.write('Очередь пуста')
+            else:
+                self.report(job)
+            return
+
+        self.stdout.write(self.style.SUCCESS('Воркер фоновых задач запущен'))
+        try:
+            worker.run_forever(on_result=self.report)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
+
+    def report(self, job):
+        if job.status == 'failed':
+            self.stdout.write(self.style.ERROR(f'Задача #{job.pk} {job.kind}: {job.error}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Задача #{job.pk} {job.kind} выполнена, обработано: {job.processed}'))
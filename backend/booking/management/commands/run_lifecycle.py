@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from booking.lifecycle import LifecycleScheduler, apply_transitions
+
+
+class Command(BaseCommand):
+    help = 'Завершает бронирования при выезде и обновляет статусы номеров при заезде и выезде'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Применить наступившие переходы и выйти (для cron)')
+        parser.add_argument('--poll', type=float, default=None, help='Максимальный сон воркера, секунд')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.report(apply_transitions(None, timezone.now()))
+            return
+
+        scheduler = LifecycleScheduler(poll_seconds=options['poll'])
+        self.stdout.write(self.style.SUCCESS('Планировщик заездов и выездов запущен'))
+        try:
+            scheduler.run_forever(on_result=self.report)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
+
+    def report(self, result):
+        self.stdout.write(self.style.SUCCESS(
+            f"{timezone.localtime():%d.%m.%Y %H:%M:%S} завершено бронирований: {result['completed']}, "
+            f"номеров занято: {result['busy']}, освобождено: {result['free']}"
+        ))
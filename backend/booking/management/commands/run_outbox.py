@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from booking.messaging import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Отправляет исходящие сообщения гостям из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Отправить одну пачку на канал и выйти')
+        parser.add_argument('--batch-size', type=int, default=None, help='Сообщений в пачке')
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(batch_size=options['batch_size'])
+        if options['once']:
+            self.report(worker.run_once() or {'sent': 0, 'retry': 0, 'failed': 0})
+            return
+
+        self.stdout.write(self.style.SUCCESS('Отправка сообщений запущена'))
+        try:
+            worker.run_forever(on_result=self.report)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
+
+    def report(self, result):
+        self.stdout.write(self.style.SUCCESS(
+            f"{timezone.localtime():%d.%m.%Y %H:%M:%S} отправлено: {result['sent']}, "
+            f"к повтору: {result['retry']}, с ошибкой: {result['failed']}"
+        ))
@@ -1,27 +1,23 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from booking.lifecycle import refresh_room_statuses
 from booking.models import Room
 
 
 class Command(BaseCommand):
-    help = 'Обновляет статусы всех номеров на основе активных бронирований'
+    help = 'Обновляет статусы и занятость (текущее проживание, ближайший заезд) всех номеров на основе активных бронирований'
 
     def handle(self, *args, **options):
-        rooms = Room.objects.filter(is_deleted=False)
-        updated_count = 0
-        
-        for room in rooms:
-            old_status = room.status
-            room.update_status()
-            if old_status != room.status:
-                updated_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Номер {room.number}: {old_status} → {room.status}'
-                    )
-                )
-        
+        with transaction.atomic():
+            to_busy, to_free = refresh_room_statuses()
+
+        numbers = dict(Room.objects.filter(pk__in=to_busy + to_free).values_list('pk', 'number'))
+        for new_status, ids in (('busy', to_busy), ('free', to_free)):
+            for pk in ids:
+                self.stdout.write(self.style.SUCCESS(f'Номер {numbers[pk]}: → {new_status}'))
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Обновлено статусов: {updated_count} из {rooms.count()} номеров'
+                f'Обновлено статусов: {len(to_busy) + len(to_free)} из {Room.objects.count()} номеров'
             )
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AuditLog, Guest, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Поле гостя с адресом для каждого канала
+RECIPIENT_FIELDS = {
+    'sms': 'phone',
+    'email': 'email',
+}
+
+
+class BaseBackend:
+    """
+    Бэкенд канала отправки.
+
+    send_messages получает пачку сообщений одного канала и возвращает
+    {id сообщения: текст ошибки} для неотправленных; остальные считаются отправленными.
+    """
+
+    def send_messages(self, messages):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseBackend):
+    """Пишет сообщения в лог — замена провайдера при разработке"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            logger.info(f"{message.channel.upper()} → {message.recipient}: {message.body}")
+        return {}
+
+
+class FileBackend(BaseBackend):
+    """Дописывает сообщения в MESSAGING_FILE_PATH по одному JSON на строку"""
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or settings.MESSAGING_FILE_PATH
+
+    def send_messages(self, messages):
+        lines = ''.join(
+            json.dumps({
+                'id': message.pk,
+                'channel': message.channel,
+                'recipient': message.recipient,
+                'body': message.body,
+            }, ensure_ascii=False) + '\n'
+            for message in messages
+        )
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+        return {}
+
+
+def arriving_guests(day):
+    """Гости с активным бронированием, заезд по которому приходится на day"""
+    return Guest.objects.filter(
+        bookings__status='active',
+        bookings__is_deleted=False,
+        bookings__check_in__date=day,
+    ).distinct()
+
+
+def enqueue_messages(guests, channel, body, user=None):
+    """
+    Ставит сообщение в очередь каждому гостю из queryset одной вставкой.
+
+    Гости без адреса для канала пропускаются. Возвращает созданные сообщения.
+    """
+    field = RECIPIENT_FIELDS[channel]
+    messages = [
+        OutboxMessage(guest_id=guest_id, channel=channel, recipient=recipient, body=body, created_by=user)
+        for guest_id, recipient in guests.exclude(**{field: ''}).order_by('pk').values_list('pk', field)
+    ]
+    return OutboxMessage.objects.bulk_create(messages, batch_size=settings.MESSAGING_BATCH_SIZE)
+
+
+def claim_messages(channel, limit, now):
+    """
+    Берёт до limit готовых к отправке сообщений канала.
+
+    Взятые сообщения сдвигаются на MESSAGING_LEASE_SECONDS вперёд: параллельный
+    воркер их не возьмёт, а если этот упадёт — они отправятся после истечения аренды.
+    """
+    with transaction.atomic():
+        due = OutboxMessage.objects.filter(status='pending', channel=channel, next_attempt_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.order_by('next_attempt_at', 'id').values_list('pk', flat=True)[:limit])
+        OutboxMessage.objects.filter(pk__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.MESSAGING_LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+        )
+    return list(OutboxMessage.objects.filter(pk__in=ids).select_related('guest').order_by('id'))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.MESSAGING_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+def finish_messages(messages, errors, now):
+    """Отмечает результат пачки и пишет аудит отправленных одной вставкой"""
+    sent = [message for message in messages if message.pk not in errors]
+    failed = [message for message in messages if message.pk in errors]
+    OutboxMessage.objects.filter(pk__in=[message.pk for message in sent]).update(status='sent', sent_at=now, last_error='')
+    for message in failed:
+        message.last_error = str(errors[message.pk])
+        if message.attempts >= settings.MESSAGING_MAX_ATTEMPTS:
+            message.status = 'failed'
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+    OutboxMessage.objects.bulk_update(failed, ['status', 'next_attempt_at', 'last_error'])
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user_id=message.created_by_id,
+            action='Отправка сообщения',
+            object_type='Guest',
+            object_id=message.guest_id or 0,
+            details=f'{message.channel.upper()} отправлено гостю {message.guest.full_name if message.guest else message.recipient}: {message.body[:50]}...',
+        )
+        for message in sent
+    ])
+    return {
+        'sent': len(sent),
+        'retry': sum(1 for message in failed if message.status == 'pending'),
+        'failed': sum(1 for message in failed if message.status == 'failed'),
+    }
+
+
+class RateLimiter:
+    """Маркерная корзина: не больше rate_per_minute отправок в минуту"""
+
+    def __init__(self, rate_per_minute, clock=time.monotonic):
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.clock = clock
+        self.updated = clock()
+
+    def available(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        return int(self.tokens)
+
+    def take(self, count):
+        self.tokens -= count
+
+    def seconds_until_available(self):
+        return max(1 - self.tokens, 0) * 60 / self.capacity
+
+
+class OutboxWorker:
+    """Отправляет очередь пачками по каналам с учётом ограничения скорости"""
+
+    def __init__(self, batch_size=None, rate_per_minute=None, backends=None, clock=timezone.now, sleep=time.sleep):
+        self.batch_size = batch_size or settings.MESSAGING_BATCH_SIZE
+        rate_per_minute = rate_per_minute or settings.MESSAGING_RATE_PER_MINUTE
+        backends = backends or settings.MESSAGING_BACKENDS
+        self.backends = {
+            channel: import_string(backend)() if isinstance(backend, str) else backend
+            for channel, backend in backends.items()
+        }
+        self.limits = {channel: RateLimiter(rate_per_minute) for channel in self.backends}
+        self.clock = clock
+        self.sleep = sleep
+
+    def send_channel(self, channel, now):
+        limit = min(self.batch_size, self.limits[channel].available())
+        if limit < 1:
+            return None
+        messages = claim_messages(channel, limit, now)
+        if not messages:
+            return None
+        self.limits[channel].take(len(messages))
+        try:
+            errors = self.backends[channel].send_messages(messages)
+        except Exception as e:
+            logger.error(f"Ошибка бэкенда {channel}: {str(e)}")
+            errors = {message.pk: str(e) for message in messages}
+        return finish_messages(messages, errors, now)
+
+    def run_once(self):
+        """Одна пачка на канал; возвращает итоги или None, если отправлять нечего"""
+        now = self.clock()
+        totals = None
+        for channel in self.backends:
+            result = self.send_channel(channel, now)
+            if result:
+                totals = totals or {'sent': 0, 'retry': 0, 'failed': 0}
+                for key, value in result.items():
+                    totals[key] += value
+        return totals
+
+    def run_forever(self, on_result=None):
+        while True:
+            result = self.run_once()
+            if result:
+                if on_result:
+                    on_result(result)
+                continue
+            waits = [limit.seconds_until_available() for limit in self.limits.values()]
+            self.sleep(max(settings.MESSAGING_POLL_SECONDS, min(waits, default=0)))
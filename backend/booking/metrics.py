@@ -0,0 +1,282 @@
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .permissions import IsSuperAdmin
+from .query_observers import observe_queries
+
+# Границы корзин гистограмм (как le в Prometheus)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class QueryTimer:
+    """Наблюдатель SQL, считающий количество и суммарное время запросов"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestTiming:
+    """
+    Замеры одного запроса.
+
+    serialize — время внутри view без SQL: для API это в основном сериализация,
+    render — рендеринг ответа DRF (JSON), total — весь проход через middleware.
+    Для потоковых ответов total заканчивается на отдаче заголовков.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = QueryTimer()
+        self.view_started = None
+        self.view_db = 0.0
+        self.serialize = 0.0
+        self.render_started = None
+        self.render = 0.0
+        self.total = 0.0
+        self.size = None
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+        self.view_db = self.queries.duration
+
+    def end_view(self):
+        if self.view_started is None:
+            return
+        elapsed = time.perf_counter() - self.view_started
+        self.serialize = max(elapsed - (self.queries.duration - self.view_db), 0.0)
+        self.view_started = None
+
+    def start_render(self):
+        self.end_view()
+        self.render_started = time.perf_counter()
+
+    def end_render(self, response):
+        self.render = time.perf_counter() - self.render_started
+        return response
+
+    def finish(self, response):
+        self.end_view()
+        self.total = time.perf_counter() - self.started
+        if not response.streaming:
+            self.size = len(response.content)
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={self.queries.duration * 1000:.1f};desc="{self.queries.count} queries"',
+            f'serialize;dur={self.serialize * 1000:.1f}',
+            f'render;dur={self.render * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ]
+        if self.size is not None:
+            parts.append(f'size;desc="{self.size}"')
+        return ', '.join(parts)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя корзина — +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class EndpointStats:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+        self.errors = 0
+
+    def observe(self, timing, status_code):
+        self.duration.observe(timing.total)
+        self.queries.observe(timing.queries.count)
+        self.db_seconds += timing.queries.duration
+        self.serialize_seconds += timing.serialize
+        self.render_seconds += timing.render
+        self.response_bytes += timing.size or 0
+        if status_code >= 500:
+            self.errors += 1
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(**labels):
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """
+    Агрегаты по эндпоинтам в памяти процесса.
+
+    Каждый воркер gunicorn/uvicorn держит свои счётчики — Prometheus
+    собирает их по отдельности или суммирует по instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, method, timing, status_code):
+        with self._lock:
+            stats = self._endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, method)] = EndpointStats()
+            stats.observe(timing, status_code)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            lines = []
+            self._render_histogram(lines, items, 'femida_request_duration_seconds',
+                                   'Время обработки запроса', lambda stats: stats.duration)
+            self._render_histogram(lines, items, 'femida_request_queries',
+                                   'Количество SQL-запросов на запрос', lambda stats: stats.queries)
+            counters = (
+                ('femida_request_db_seconds_total', 'Суммарное время SQL', 'db_seconds'),
+                ('femida_request_serialize_seconds_total', 'Суммарное время view и сериализации без SQL', 'serialize_seconds'),
+                ('femida_request_render_seconds_total', 'Суммарное время рендеринга ответа', 'render_seconds'),
+                ('femida_response_bytes_total', 'Суммарный размер ответов', 'response_bytes'),
+                ('femida_request_errors_total', 'Ответы с кодом 5xx', 'errors'),
+            )
+            for name, help_text, attr in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (endpoint, method), stats in items:
+                    labels = format_labels(endpoint=endpoint, method=method)
+                    lines.append(f'{name}{labels} {getattr(stats, attr)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines, items, name, help_text, get_histogram):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (endpoint, method), stats in items:
+            histogram = get_histogram(stats)
+            for bound, count in histogram.cumulative():
+                labels = format_labels(endpoint=endpoint, method=method, le=bound)
+                lines.append(f'{name}_bucket{labels} {count}')
+            labels = format_labels(endpoint=endpoint, method=method)
+            lines.append(f'{name}_sum{labels} {histogram.sum}')
+            lines.append(f'{name}_count{labels} {histogram.count}')
+
+
+registry = MetricsRegistry()
+
+
+def endpoint_label(request):
+    """Имя маршрута вместо пути, чтобы число серий не росло с каждым id"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет SQL, сериализацию, рендеринг и размер ответа, добавляет заголовок
+    Server-Timing и копит гистограммы для /api/metrics/.
+
+    При PERF_METRICS_ENABLED=False Django просто не подключает middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Синхронные хуки Django под ASGI обернул бы в sync_to_async (лишний поток на запрос)
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timing = RequestTiming()
+        request._perf_timing = timing
+        with observe_queries(timing.queries):
+            response = self.get_response(request)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        request._perf_timing = timing
+        with observe_queries(timing.queries):
+            response = await self.get_response(request)
+        return self.finish(request, response, timing)
+
+    def finish(self, request, response, timing):
+        timing.finish(response)
+        response['Server-Timing'] = timing.server_timing()
+        registry.observe(endpoint_label(request), request.method, timing, response.status_code)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._perf_timing.start_view()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request._perf_timing.start_view()
+
+    def process_template_response(self, request, response):
+        return self.track_render(request, response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.track_render(request, response)
+
+    def track_render(self, request, response):
+        # Вызывается прямо перед render(); конец рендеринга ловим колбэком
+        timing = request._perf_timing
+        timing.start_render()
+        response.add_post_render_callback(timing.end_render)
+        return response
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus (только супер-админ)"""
+    permission_classes = [IsSuperAdmin]
+
+    def get(self, request):
+        if not settings.PERF_METRICS_ENABLED:
+            return Response({'error': 'Сбор метрик отключён'}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,3 +1,4 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils import timezone
 from django.http import JsonResponse
 from django.conf import settings
@@ -8,10 +9,18 @@ import traceback
 logger = logging.getLogger(__name__)
 
 class UserActivityMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         # Обновляем last_seen для аутентифицированного пользователя
         if request.user.is_authenticated and hasattr(request.user, 'last_seen'):
             request.user.last_seen = timezone.now()
@@ -20,27 +29,52 @@ class UserActivityMiddleware:
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated and hasattr(user, 'last_seen'):
+            user.last_seen = timezone.now()
+            await user.asave(update_fields=['last_seen'])
+
+        return await self.get_response(request)
+
 class ErrorHandlingMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         try:
             response = self.get_response(request)
             return response
         except Exception as e:
-            logger.error(f"Unhandled exception in {request.path}: {str(e)}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Возвращаем JSON ошибку для API запросов
-            if request.path.startswith('/api/'):
-                return JsonResponse({
-                    'error': 'Internal server error',
-                    'detail': str(e) if settings.DEBUG else 'Something went wrong'
-                }, status=500)
-            
-            # Для обычных запросов возвращаем стандартную ошибку Django
-            raise
+            return self.handle_exception(request, e)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            return self.handle_exception(request, e)
+
+    def handle_exception(self, request, e):
+        logger.error(f"Unhandled exception in {request.path}: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        
+        # Возвращаем JSON ошибку для API запросов
+        if request.path.startswith('/api/'):
+            return JsonResponse({
+                'error': 'Internal server error',
+                'detail': str(e) if settings.DEBUG else 'Something went wrong'
+            }, status=500)
+        
+        # Для обычных запросов возвращаем стандартную ошибку Django
+        raise
 
     def process_exception(self, request, exception):
         logger.error(f"Exception in {request.path}: {str(exception)}")
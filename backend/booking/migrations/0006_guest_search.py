@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:16
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def fill_digits(apps, schema_editor):
+    Guest = apps.get_model('booking', 'Guest')
+    batch = []
+    for guest in Guest.objects.only('id', 'phone', 'inn').iterator(chunk_size=1000):
+        guest.phone_digits = ''.join(filter(str.isdigit, guest.phone or ''))
+        guest.inn_digits = ''.join(filter(str.isdigit, guest.inn or ''))
+        batch.append(guest)
+        if len(batch) == 1000:
+            Guest.objects.bulk_update(batch, ['phone_digits', 'inn_digits'])
+            batch = []
+    Guest.objects.bulk_update(batch, ['phone_digits', 'inn_digits'])
+
+
+def create_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS booking_guest_full_name_trgm '
+        'ON booking_guest USING gin (full_name gin_trgm_ops)'
+    )
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS booking_guest_full_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_building_is_deleted_alter_user_last_seen'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='guest',
+            name='inn_digits',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='ИНН (цифры)'),
+        ),
+        migrations.AddField(
+            model_name='guest',
+            name='phone_digits',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.RunPython(fill_digits, migrations.RunPython.noop),
+        # Поиск идёт по префиксу (LIKE 'xxx%'): обычный B-tree при не-C collation его не обслуживает
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['phone_digits'], name='guest_live_phone_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['inn_digits'], name='guest_live_inn_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
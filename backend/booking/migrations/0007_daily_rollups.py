@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:18
+
+from collections import defaultdict
+from itertools import groupby
+from operator import attrgetter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_rollups(apps, schema_editor):
+    """Срезы для уже существующих бронирований: номер за номером, корпуса — в конце"""
+    from booking.rollups import EXCLUDED_STATUSES, _accumulate
+    Booking = apps.get_model('booking', 'Booking')
+    Room = apps.get_model('booking', 'Room')
+    RoomDailyStat = apps.get_model('booking', 'RoomDailyStat')
+    BuildingDailyStat = apps.get_model('booking', 'BuildingDailyStat')
+    building_by_room = dict(Room.objects.values_list('id', 'building_id'))
+    bookings = Booking.objects.filter(is_deleted=False).exclude(status__in=EXCLUDED_STATUSES).only(
+        'room_id', 'check_in', 'check_out', 'total_amount', 'payment_amount', 'payment_status'
+    ).order_by('room_id', 'check_in').iterator(chunk_size=1000)
+    building_totals = defaultdict(lambda: [0, 0, 0, 0])
+    for _, room_bookings in groupby(bookings, key=attrgetter('room_id')):
+        stats = []
+        for (room_id, day), values in _accumulate(room_bookings).items():
+            building_id = building_by_room[room_id]
+            nights, revenue, paid, unpaid = values
+            stats.append(RoomDailyStat(
+                room_id=room_id, building_id=building_id, date=day,
+                occupied_nights=nights, revenue=revenue, paid_amount=paid, unpaid_amount=unpaid,
+            ))
+            totals = building_totals[(building_id, day)]
+            for index, value in enumerate(values):
+                totals[index] += value
+        RoomDailyStat.objects.bulk_create(stats, batch_size=1000)
+    BuildingDailyStat.objects.bulk_create([
+        BuildingDailyStat(
+            building_id=building_id, date=day,
+            occupied_nights=nights, revenue=revenue, paid_amount=paid, unpaid_amount=unpaid,
+        )
+        for (building_id, day), (nights, revenue, paid, unpaid) in building_totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_guest_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('occupied_nights', models.PositiveIntegerField(default=0, verbose_name='Занято ночей')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Оплачено')),
+                ('unpaid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Не оплачено')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='booking.building', verbose_name='Корпус')),
+            ],
+            options={
+                'verbose_name': 'Суточная статистика корпуса',
+                'verbose_name_plural': 'Суточная статистика корпусов',
+                'indexes': [models.Index(fields=['date'], name='building_stat_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('building', 'date'), name='unique_building_daily_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('occupied_nights', models.PositiveIntegerField(default=0, verbose_name='Занято ночей')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Оплачено')),
+                ('unpaid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Не оплачено')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_daily_stats', to='booking.building', verbose_name='Корпус')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='booking.room', verbose_name='Комната')),
+            ],
+            options={
+                'verbose_name': 'Суточная статистика номера',
+                'verbose_name_plural': 'Суточная статистика номеров',
+                'indexes': [models.Index(fields=['building', 'date'], name='room_stat_building_date_idx'), models.Index(fields=['date'], name='room_stat_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'date'), name='unique_room_daily_stat')],
+            },
+        ),
+        # Отчёт загрузки читает только срезы — заполняем их для существующих бронирований
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
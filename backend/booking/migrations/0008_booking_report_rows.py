@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_report_rows(apps, schema_editor):
+    from booking.reports import rebuild_report_rows
+    rebuild_report_rows(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingReportRow',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='report_row', serialize=False, to='booking.booking', verbose_name='Бронирование')),
+                ('guest_id', models.BigIntegerField(db_index=True, verbose_name='ID гостя')),
+                ('guest_name', models.CharField(max_length=100, verbose_name='ФИО')),
+                ('guest_phone', models.CharField(max_length=20, verbose_name='Телефон')),
+                ('guest_inn', models.CharField(blank=True, max_length=20, verbose_name='ИНН')),
+                ('room_id', models.BigIntegerField(verbose_name='ID комнаты')),
+                ('room_number', models.CharField(max_length=10, verbose_name='Номер комнаты')),
+                ('room_class', models.CharField(max_length=40, verbose_name='Класс комнаты')),
+                ('room_type', models.CharField(max_length=50, verbose_name='Тип комнаты')),
+                ('price_per_night', models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='Цена за сутки')),
+                ('building_id', models.BigIntegerField(verbose_name='ID корпуса')),
+                ('building_name', models.CharField(max_length=100, verbose_name='Корпус')),
+                ('created_by_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID сотрудника')),
+                ('created_by_username', models.CharField(blank=True, max_length=150, verbose_name='Кто создал')),
+                ('check_in', models.DateTimeField(verbose_name='Дата и время заезда')),
+                ('check_out', models.DateTimeField(verbose_name='Дата и время выезда')),
+                ('people_count', models.PositiveIntegerField(verbose_name='Количество гостей')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус')),
+                ('payment_status', models.CharField(max_length=20, verbose_name='Статус оплаты')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Способ оплаты')),
+                ('payment_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма оплаты')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Общая сумма')),
+                ('created_at', models.DateTimeField(verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Строка отчёта',
+                'verbose_name_plural': 'Строки отчёта',
+                'indexes': [models.Index(fields=['check_in'], name='report_row_check_in_idx'), models.Index(fields=['check_out'], name='report_row_check_out_idx'), models.Index(fields=['status', 'check_in'], name='report_row_status_idx'), models.Index(fields=['building_id', 'check_in'], name='report_row_building_idx'), models.Index(fields=['room_id', 'check_in'], name='report_row_room_idx')],
+            },
+        ),
+        # Экспорт отчётов читает только эту таблицу — заполняем её для существующих бронирований
+        migrations.RunPython(fill_report_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_booking_report_rows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('op', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Операция')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'Событие изменения',
+                'verbose_name_plural': 'События изменений',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['model', 'id'], name='change_event_model_idx')],
+            },
+        ),
+    ]
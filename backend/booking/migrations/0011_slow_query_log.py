@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('endpoint', models.CharField(blank=True, max_length=200, verbose_name='Эндпоинт')),
+                ('caller', models.CharField(blank=True, max_length=300, verbose_name='Место вызова')),
+                ('example_sql', models.TextField(verbose_name='Пример запроса')),
+                ('example_params', models.TextField(blank=True, verbose_name='Параметры примера')),
+                ('explain', models.TextField(blank=True, verbose_name='План (EXPLAIN)')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Суммарно, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Максимум, мс')),
+                ('p95_ms', models.FloatField(default=0, verbose_name='p95, мс')),
+                ('samples', models.JSONField(default=list, verbose_name='Последние замеры')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
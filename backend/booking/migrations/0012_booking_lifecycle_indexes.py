@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_slow_query_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'check_in'], name='booking_status_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'check_out'], name='booking_status_check_out_idx'),
+        ),
+    ]
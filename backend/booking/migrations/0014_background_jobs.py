@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0013_outbox_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('report_export', 'Экспорт отчёта'), ('rebuild_rollups', 'Пересборка срезов')], max_length=30, verbose_name='Тип')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка'), ('expired', 'Результат удалён')], default='pending', max_length=10, verbose_name='Статус')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Обработано')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Всего')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Итог')),
+                ('result_file', models.CharField(blank=True, max_length=255, verbose_name='Файл результата')),
+                ('result_name', models.CharField(blank=True, max_length=255, verbose_name='Имя файла')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний признак жизни')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Хранить до')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Кто запустил')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='job_status_idx')],
+            },
+        ),
+    ]
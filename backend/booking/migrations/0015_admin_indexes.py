@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['object_id', 'object_type'], name='audit_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_in'], name='booking_check_in_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_status_check_in_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_status_check_out_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['status', 'check_in'], name='booking_status_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['status', 'check_out'], name='booking_status_check_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['room', 'check_in'], name='booking_live_room_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['building', 'number'], name='room_live_building_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_soft_delete_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='current_booking',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booking.booking', verbose_name='Текущее проживание'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='free_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Свободен до'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='next_check_in',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Ближайший заезд'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0017_room_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changeevent',
+            name='occupancy_only',
+            field=models.BooleanField(default=False, verbose_name='Только занятость'),
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(condition=models.Q(('model__in', ['Room', 'Building']), ('occupancy_only', False)), fields=['id'], name='change_event_catalogue_idx'),
+        ),
+    ]
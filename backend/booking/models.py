@@ -1,10 +1,16 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
+
+def digits_only(value):
+    """Оставляет в строке только цифры (нормализация телефона и ИНН для поиска)"""
+    return ''.join(filter(str.isdigit, value or ''))
+
+
 class User(AbstractUser):
     ROLE_CHOICES = [
         ("superadmin", "Супер Админ"),
@@ -27,24 +33,94 @@ class User(AbstractUser):
         verbose_name = 'Сотрудник'
         verbose_name_plural = 'Сотрудники'
 
-class Building(models.Model):
-    name = models.CharField(max_length=100, verbose_name="Название корпуса")
-    address = models.CharField(max_length=255, verbose_name="Адрес")
-    description = models.TextField(blank=True, verbose_name="Описание")
+class TimestampedQuerySet(models.QuerySet):
+    """QuerySet, который проставляет updated_at и при массовом update()"""
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+class GuestQuerySet(TimestampedQuerySet):
+    def with_paid_total(self):
+        """Аннотирует paid_total — сумму оплаченных бронирований (одним подзапросом вместо запроса на гостя)"""
+        paid = Booking.objects.filter(
+            guest=models.OuterRef('pk'), payment_status='paid',
+        ).order_by().values('guest').annotate(total=models.Sum('total_amount')).values('total')
+        return self.annotate(paid_total=models.Subquery(paid))
+
+class TimestampedModel(models.Model):
+    """Базовая модель с индексированным временем последнего изменения"""
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Изменено")
+
+    objects = TimestampedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # auto_now не сохраняется при save(update_fields=[...]) без явного updated_at
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+        super().save(*args, **kwargs)
+
+class SoftDeleteManager(models.Manager.from_queryset(TimestampedQuerySet)):
+    """
+    Менеджер по признаку is_deleted: deleted=False — только живые строки,
+    True — только удалённые (корзина), None — все строки.
+    """
+
+    def __init__(self, deleted=False):
+        super().__init__()
+        self.deleted = deleted
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.deleted is None:
+            return queryset
+        return queryset.filter(is_deleted=self.deleted)
+
+GuestManager = SoftDeleteManager.from_queryset(GuestQuerySet)
+
+class SoftDeleteModel(TimestampedModel):
+    """
+    Модель с мягким удалением.
+
+    objects (менеджер по умолчанию, в том числе для связанных менеджеров вроде
+    room.bookings) видит только живые строки, deleted — только удалённые,
+    all_objects — все. Переход по ForeignKey (booking.room) идёт через базовый
+    менеджер и находит запись, даже если она удалена.
+    """
     is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
 
-    def __str__(self):
-        return self.name
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteManager(deleted=None)
+    deleted = SoftDeleteManager(deleted=True)
+
+    class Meta:
+        abstract = True
 
     def soft_delete(self):
         self.is_deleted = True
         self.save()
-    
+
     def restore(self):
         self.is_deleted = False
         self.save()
 
-class Room(models.Model):
+# Условие частичных индексов: в PostgreSQL индекс хранит только живые строки
+# и используется запросами менеджера objects (WHERE is_deleted = false)
+LIVE_ROWS = models.Q(is_deleted=False)
+
+class Building(SoftDeleteModel):
+    name = models.CharField(max_length=100, verbose_name="Название корпуса")
+    address = models.CharField(max_length=255, verbose_name="Адрес")
+    description = models.TextField(blank=True, verbose_name="Описание")
+
+    def __str__(self):
+        return self.name
+
+class Room(SoftDeleteModel):
     building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name="rooms", verbose_name="Корпус")
     number = models.CharField(max_length=10, verbose_name="Номер комнаты")
     capacity = models.PositiveIntegerField(verbose_name="Вместимость")
@@ -70,38 +146,64 @@ class Room(models.Model):
     price_per_night = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="Цена за сутки")
     rooms_count = models.PositiveIntegerField(default=1, verbose_name="Количество комнат")
     amenities = models.CharField(max_length=255, blank=True, verbose_name="Удобства (через запятую)")
-    is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
+    # Занятость: поддерживаются update_status и планировщиком run_lifecycle
+    current_booking = models.ForeignKey(
+        'Booking', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='+', verbose_name="Текущее проживание",
+    )
+    next_check_in = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Ближайший заезд")
+    free_until = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Свободен до")
+
+    # Поля, которые пишет update_status (updated_at добавляет TimestampedModel.save)
+    OCCUPANCY_FIELDS = {'status', 'current_booking', 'next_check_in', 'free_until', 'updated_at'}
+
+    class Meta:
+        indexes = [
+            # Номера корпуса (списки, шахматка, отчёт загрузки)
+            models.Index(fields=['building', 'number'], condition=LIVE_ROWS, name='room_live_building_idx'),
+        ]
 
     def __str__(self):
         return f"{self.building.name} - {self.number}"
 
-    def update_status(self):
-        """Автоматически обновляет статус номера на основе активных бронирований"""
-        if self.status == 'repair':
-            return  # Если номер на ремонте, не меняем статус
-        
-        # Проверяем есть ли активные бронирования для этого номера
-        active_bookings = self.bookings.filter(
-            status='active',
-            is_deleted=False
-        )
-        
-        if active_bookings.exists():
-            self.status = 'busy'
-        else:
-            self.status = 'free'
-        
-        self.save(update_fields=['status'])
+    def apply_occupancy(self, current_booking_id, next_check_in):
+        """
+        Проставляет статус и поля занятости по текущему проживанию и ближайшему заезду.
 
-    def soft_delete(self):
-        self.is_deleted = True
-        self.save()
-    
-    def restore(self):
-        self.is_deleted = False
-        self.save()
+        Статус номера на ремонте не меняется. Возвращает имена изменившихся полей.
+        """
+        values = {
+            'current_booking': current_booking_id,
+            'next_check_in': next_check_in,
+            # Свободный номер свободен до ближайшего заезда (None — без ограничений)
+            'free_until': None if current_booking_id else next_check_in,
+        }
+        if self.status != 'repair':
+            values['status'] = 'busy' if current_booking_id else 'free'
+        changed = []
+        for name, value in values.items():
+            attname = self._meta.get_field(name).attname
+            if getattr(self, attname) != value:
+                setattr(self, attname, value)
+                changed.append(name)
+        return changed
 
-class Guest(models.Model):
+    def update_status(self, now=None):
+        """Автоматически обновляет статус номера: занят, пока идёт активное бронирование"""
+        # Переходы по времени делает run_lifecycle
+        now = now or timezone.now()
+        # Экземпляр мог прийти из справочника номеров в памяти — сравниваем с актуальной строкой
+        self.refresh_from_db(fields=['status', 'current_booking', 'next_check_in', 'free_until'])
+        # Пересечений у активных бронирований нет: первое по заезду — текущее (если уже началось) или ближайшее
+        upcoming = list(self.bookings.filter(status='active', check_out__gt=now).order_by('check_in').values_list('pk', 'check_in')[:2])
+        current_booking_id = upcoming[0][0] if upcoming and upcoming[0][1] <= now else None
+        next_check_in = next((check_in for _, check_in in upcoming if check_in > now), None)
+        changed = self.apply_occupancy(current_booking_id, next_check_in)
+        if changed:
+            # Без лишней записи, события в ленте и сброса справочника номеров
+            self.save(update_fields=changed)
+
+class Guest(SoftDeleteModel):
     full_name = models.CharField(max_length=100, verbose_name="ФИО")
     phone = models.CharField(max_length=20, verbose_name="Телефон")
     email = models.EmailField(blank=True, verbose_name="Email")
@@ -109,6 +211,9 @@ class Guest(models.Model):
     people_count = models.PositiveIntegerField(default=1, verbose_name="Количество человек")
     notes = models.TextField(blank=True, verbose_name="Примечания")
     inn = models.CharField(max_length=20, blank=True, verbose_name="ИНН")
+    # Нормализованные копии для индексного поиска (только цифры)
+    phone_digits = models.CharField(max_length=20, blank=True, editable=False, verbose_name="Телефон (цифры)")
+    inn_digits = models.CharField(max_length=20, blank=True, editable=False, verbose_name="ИНН (цифры)")
     registration_date = models.DateField(auto_now_add=True, verbose_name="Дата регистрации")
     total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Общая сумма потраченная")
     visits_count = models.PositiveIntegerField(default=0, verbose_name="Количество посещений")
@@ -123,20 +228,30 @@ class Guest(models.Model):
         default='active',
         verbose_name="Статус"
     )
-    is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
+
+    objects = GuestManager()
+    all_objects = GuestManager(deleted=None)
+    deleted = GuestManager(deleted=True)
+
+    class Meta:
+        indexes = [
+            # Поиск по префиксу телефона/ИНН (LIKE 'xxx%'): varchar_pattern_ops для PostgreSQL
+            models.Index(fields=['phone_digits'], condition=LIVE_ROWS, opclasses=['varchar_pattern_ops'], name='guest_live_phone_idx'),
+            models.Index(fields=['inn_digits'], condition=LIVE_ROWS, opclasses=['varchar_pattern_ops'], name='guest_live_inn_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
 
-    def soft_delete(self):
-        self.is_deleted = True
-        self.save()
-    
-    def restore(self):
-        self.is_deleted = False
-        self.save()
+    def save(self, *args, **kwargs):
+        self.phone_digits = digits_only(self.phone)
+        self.inn_digits = digits_only(self.inn)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'phone', 'inn'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'phone_digits', 'inn_digits'}
+        super().save(*args, **kwargs)
 
-class Booking(models.Model):
+class Booking(SoftDeleteModel):
     guest = models.ForeignKey(Guest, on_delete=models.CASCADE, related_name="bookings", verbose_name="Гость")
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="bookings", verbose_name="Комната")
     check_in = models.DateTimeField(verbose_name="Дата и время заезда")
@@ -175,7 +290,17 @@ class Booking(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Общая сумма")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Кто создал")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
-    is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
+
+    class Meta:
+        indexes = [
+            # Ближайшие заезды и выезды для планировщика run_lifecycle
+            models.Index(fields=['status', 'check_in'], condition=LIVE_ROWS, name='booking_status_check_in_idx'),
+            models.Index(fields=['status', 'check_out'], condition=LIVE_ROWS, name='booking_status_check_out_idx'),
+            # Проверка пересечения бронирований номера и пересчёт его статуса
+            models.Index(fields=['room', 'check_in'], condition=LIVE_ROWS, name='booking_live_room_idx'),
+            # date_hierarchy и фильтры по дате заезда в админке
+            models.Index(fields=['check_in'], name='booking_check_in_idx'),
+        ]
 
     def __str__(self):
         return f"{self.guest.full_name} - {self.room} ({self.check_in} - {self.check_out})"
@@ -187,11 +312,8 @@ class Booking(models.Model):
             days = (self.check_out - self.check_in).days
             self.total_amount = self.room.price_per_night * days
         
-        # Сохраняем бронирование
+        # Сохраняем бронирование; статус номера обновит update_room_status_on_booking_save
         super().save(*args, **kwargs)
-        
-        # Обновляем статус номера
-        self.room.update_status()
 
     @property
     def date_from(self):
@@ -203,31 +325,259 @@ class Booking(models.Model):
         """Совместимость с фронтендом"""
         return self.check_out
 
-    def soft_delete(self):
-        self.is_deleted = True
-        self.save()
-    
-    def restore(self):
-        self.is_deleted = False
-        self.save()
-
 class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Пользователь")
     action = models.CharField(max_length=50, verbose_name="Действие")
     object_type = models.CharField(max_length=50, verbose_name="Тип объекта")
     object_id = models.IntegerField(verbose_name="ID объекта")
     details = models.TextField(verbose_name="Детали")
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Время")
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Время")
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # История объекта в админке (поиск по ID объекта)
+            models.Index(fields=['object_id', 'object_type'], name='audit_object_idx'),
+        ]
+
+class RoomDailyStat(models.Model):
+    """Суточный срез по номеру: занятость и выручка (поддерживается сигналами Booking)"""
+    date = models.DateField(verbose_name="Дата")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="daily_stats", verbose_name="Комната")
+    building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name="room_daily_stats", verbose_name="Корпус")
+    occupied_nights = models.PositiveIntegerField(default=0, verbose_name="Занято ночей")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Оплачено")
+    unpaid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Не оплачено")
+
+    class Meta:
+        verbose_name = 'Суточная статистика номера'
+        verbose_name_plural = 'Суточная статистика номеров'
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name='unique_room_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['building', 'date'], name='room_stat_building_date_idx'),
+            models.Index(fields=['date'], name='room_stat_date_idx'),
+        ]
+
+class BuildingDailyStat(models.Model):
+    """Суточный срез по корпусу — сумма RoomDailyStat за день"""
+    date = models.DateField(verbose_name="Дата")
+    building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name="daily_stats", verbose_name="Корпус")
+    occupied_nights = models.PositiveIntegerField(default=0, verbose_name="Занято ночей")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Оплачено")
+    unpaid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Не оплачено")
+
+    class Meta:
+        verbose_name = 'Суточная статистика корпуса'
+        verbose_name_plural = 'Суточная статистика корпусов'
+        constraints = [
+            models.UniqueConstraint(fields=['building', 'date'], name='unique_building_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='building_stat_date_idx'),
+        ]
+
+class BookingReportRow(models.Model):
+    """
+    Денормализованная строка отчёта: бронирование вместе с гостем, номером и корпусом.
+
+    Поддерживается сигналами Booking/Guest/Room/Building/User, чтобы отчёты читали
+    одну таблицу без соединений с рабочими таблицами. Удалённые бронирования сюда не попадают.
+    """
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, primary_key=True, related_name="report_row", verbose_name="Бронирование")
+    guest_id = models.BigIntegerField(db_index=True, verbose_name="ID гостя")
+    guest_name = models.CharField(max_length=100, verbose_name="ФИО")
+    guest_phone = models.CharField(max_length=20, verbose_name="Телефон")
+    guest_inn = models.CharField(max_length=20, blank=True, verbose_name="ИНН")
+    room_id = models.BigIntegerField(verbose_name="ID комнаты")
+    room_number = models.CharField(max_length=10, verbose_name="Номер комнаты")
+    room_class = models.CharField(max_length=40, verbose_name="Класс комнаты")
+    room_type = models.CharField(max_length=50, verbose_name="Тип комнаты")
+    price_per_night = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="Цена за сутки")
+    building_id = models.BigIntegerField(verbose_name="ID корпуса")
+    building_name = models.CharField(max_length=100, verbose_name="Корпус")
+    created_by_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name="ID сотрудника")
+    created_by_username = models.CharField(max_length=150, blank=True, verbose_name="Кто создал")
+    check_in = models.DateTimeField(verbose_name="Дата и время заезда")
+    check_out = models.DateTimeField(verbose_name="Дата и время выезда")
+    people_count = models.PositiveIntegerField(verbose_name="Количество гостей")
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    payment_status = models.CharField(max_length=20, verbose_name="Статус оплаты")
+    payment_method = models.CharField(max_length=20, verbose_name="Способ оплаты")
+    payment_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Сумма оплаты")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Общая сумма")
+    created_at = models.DateTimeField(verbose_name="Создано")
+
+    class Meta:
+        verbose_name = 'Строка отчёта'
+        verbose_name_plural = 'Строки отчёта'
+        indexes = [
+            models.Index(fields=['check_in'], name='report_row_check_in_idx'),
+            models.Index(fields=['check_out'], name='report_row_check_out_idx'),
+            models.Index(fields=['status', 'check_in'], name='report_row_status_idx'),
+            models.Index(fields=['building_id', 'check_in'], name='report_row_building_idx'),
+            models.Index(fields=['room_id', 'check_in'], name='report_row_room_idx'),
+        ]
+
+class ChangeEvent(models.Model):
+    """Журнал изменений для ленты событий: id записи служит версией"""
+    OP_CHOICES = [
+        ('create', 'Создание'),
+        ('update', 'Изменение'),
+        ('delete', 'Удаление'),
+    ]
+    model = models.CharField(max_length=50, verbose_name="Модель")
+    object_id = models.BigIntegerField(verbose_name="ID объекта")
+    op = models.CharField(max_length=10, choices=OP_CHOICES, verbose_name="Операция")
+    # Изменились только поля занятости номера (Room.OCCUPANCY_FIELDS): версию справочника не меняет
+    occupancy_only = models.BooleanField(default=False, verbose_name="Только занятость")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Время")
+
+    class Meta:
+        verbose_name = 'Событие изменения'
+        verbose_name_plural = 'События изменений'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['model', 'id'], name='change_event_model_idx'),
+            # Версия справочника номеров (catalogue.current_version)
+            models.Index(fields=['id'], condition=models.Q(model__in=['Room', 'Building'], occupancy_only=False),
+                         name='change_event_catalogue_idx'),
+        ]
+
+    def as_message(self):
+        return {'model': self.model, 'id': self.object_id, 'op': self.op, 'version': self.id}
+
+class SlowQuery(models.Model):
+    """Медленные SQL-запросы, сгруппированные по нормализованному тексту"""
+    fingerprint = models.CharField(max_length=40, unique=True, verbose_name="Отпечаток")
+    sql = models.TextField(verbose_name="Нормализованный SQL")
+    endpoint = models.CharField(max_length=200, blank=True, verbose_name="Эндпоинт")
+    caller = models.CharField(max_length=300, blank=True, verbose_name="Место вызова")
+    example_sql = models.TextField(verbose_name="Пример запроса")
+    example_params = models.TextField(blank=True, verbose_name="Параметры примера")
+    explain = models.TextField(blank=True, verbose_name="План (EXPLAIN)")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    total_ms = models.FloatField(default=0, verbose_name="Суммарно, мс")
+    max_ms = models.FloatField(default=0, verbose_name="Максимум, мс")
+    p95_ms = models.FloatField(default=0, verbose_name="p95, мс")
+    # Последние длительности для расчёта p95
+    samples = models.JSONField(default=list, verbose_name="Последние замеры")
+    first_seen = models.DateTimeField(auto_now_add=True, verbose_name="Впервые")
+    last_seen = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Последний раз")
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.caller or self.endpoint or self.fingerprint[:8]}: {self.count} × p95 {self.p95_ms:.0f} мс"
+
+class OutboxMessage(models.Model):
+    """Исходящее сообщение гостю; отправляет воркер run_outbox"""
+    CHANNEL_CHOICES = [
+        ('sms', 'SMS'),
+        ('email', 'Email'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+    guest = models.ForeignKey(Guest, on_delete=models.SET_NULL, null=True, related_name="messages", verbose_name="Гость")
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, verbose_name="Канал")
+    # Адрес на момент постановки в очередь: гость мог сменить телефон до отправки
+    recipient = models.CharField(max_length=254, verbose_name="Получатель")
+    body = models.TextField(verbose_name="Текст")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    # Для pending — когда можно (пере)отправлять; взятое воркером сообщение сдвигается на время аренды
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Кто отправил")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = 'Исходящее сообщение'
+        verbose_name_plural = 'Исходящие сообщения'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'channel', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} → {self.recipient} ({self.get_status_display()})"
+
+class Job(models.Model):
+    """Фоновая задача (экспорт, пересборка срезов); выполняет воркер run_jobs"""
+    KIND_CHOICES = [
+        ('report_export', 'Экспорт отчёта'),
+        ('rebuild_rollups', 'Пересборка срезов'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+        ('expired', 'Результат удалён'),
+    ]
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name="Тип")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Обработано")
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Всего")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    # Итог для задач без файла (например, число пересобранных срезов)
+    result = models.JSONField(null=True, blank=True, verbose_name="Итог")
+    result_file = models.CharField(max_length=255, blank=True, verbose_name="Файл результата")
+    result_name = models.CharField(max_length=255, blank=True, verbose_name="Имя файла")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Кто запустил")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начато")
+    # Обновляется при каждом отчёте о прогрессе; по нему находятся задачи упавшего воркера
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний признак жизни")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершено")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Хранить до")
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_kind_display()} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Процент выполнения или None, если объём заранее неизвестен"""
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return None
+        return min(int(self.processed * 100 / self.total), 100)
+
+def is_occupancy_save(sender, update_fields):
+    """Сохранение номера только с полями занятости (Room.update_status)"""
+    return sender is Room and bool(update_fields) and set(update_fields) <= Room.OCCUPANCY_FIELDS
 
 # Сигналы для автоматического обновления статусов номеров
 @receiver(post_save, sender=Booking)
 def update_room_status_on_booking_save(sender, instance, created, **kwargs):
-    """Обновляет статус номера при сохранении бронирования"""
-    if not instance.is_deleted:
-        instance.room.update_status()
+    """Обновляет статус номера при сохранении бронирования (в том числе мягком удалении)"""
+    instance.room.update_status()
+    # Бронирование перенесли в другой номер — прежний мог освободиться
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous and previous['room_id'] != instance.room_id:
+        room = Room.all_objects.filter(pk=previous['room_id']).first()
+        if room:
+            room.update_status()
 
 @receiver(post_delete, sender=Booking)
 def update_room_status_on_booking_delete(sender, instance, **kwargs):
@@ -276,3 +626,85 @@ def log_room_delete(sender, instance, **kwargs):
         object_id=instance.id,
         details=f'Удалена комната: {instance.building} {instance.number}, вместимость: {instance.capacity}, тип: {instance.room_type}, статус: {instance.status}'
     )
+
+# Инкрементальное обновление суточных срезов занятости и выручки
+@receiver(pre_save, sender=Booking)
+def remember_booking_rollup_range(sender, instance, **kwargs):
+    """Запоминает прежние номер и даты, чтобы пересчитать и старый диапазон"""
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = Booking.all_objects.filter(pk=instance.pk).values(
+            'room_id', 'check_in', 'check_out'
+        ).first()
+
+@receiver(post_save, sender=Booking)
+def update_rollups_on_booking_save(sender, instance, **kwargs):
+    from .rollups import refresh_booking_rollups
+    refresh_booking_rollups(instance, getattr(instance, '_rollup_previous', None))
+
+@receiver(post_delete, sender=Booking)
+def update_rollups_on_booking_delete(sender, instance, **kwargs):
+    from .rollups import refresh_booking_rollups
+    refresh_booking_rollups(instance)
+
+# Поддержка денормализованной таблицы отчётов
+@receiver(post_save, sender=Booking)
+def sync_report_row_on_booking_save(sender, instance, **kwargs):
+    from .reports import sync_report_rows
+    sync_report_rows([instance.pk])
+
+@receiver(post_save, sender=Guest)
+def sync_report_rows_on_guest_save(sender, instance, created, **kwargs):
+    if not created:
+        from .reports import update_guest_report_rows
+        update_guest_report_rows(instance)
+
+@receiver(post_save, sender=Room)
+def sync_report_rows_on_room_save(sender, instance, created, update_fields=None, **kwargs):
+    # Пересчёт статуса и занятости номера (Room.update_status) на отчёт не влияет
+    if not created and not is_occupancy_save(sender, update_fields):
+        from .reports import update_room_report_rows
+        update_room_report_rows(instance)
+
+@receiver(post_save, sender=Building)
+def sync_report_rows_on_building_save(sender, instance, created, **kwargs):
+    if not created:
+        BookingReportRow.objects.filter(building_id=instance.pk).update(building_name=instance.name)
+
+@receiver(post_save, sender=User)
+def sync_report_rows_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'username' in update_fields):
+        BookingReportRow.objects.filter(created_by_id=instance.pk).exclude(
+            created_by_username=instance.username
+        ).update(created_by_username=instance.username)
+
+# Лента изменений для открытых клиентов (SSE)
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Guest)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Building)
+def record_change_on_save(sender, instance, created, update_fields=None, **kwargs):
+    from .events import record_change
+    record_change(instance, 'create' if created else 'update', occupancy_only=is_occupancy_save(sender, update_fields))
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Guest)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Building)
+def record_change_on_delete(sender, instance, **kwargs):
+    from .events import record_change
+    record_change(instance, 'delete')
+
+# Справочник номеров и корпусов в памяти процесса (booking.catalogue)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Building)
+def invalidate_catalogue(sender, update_fields=None, **kwargs):
+    # Поля занятости в снимок не входят: заезд и выезд справочник не сбрасывают
+    if is_occupancy_save(sender, update_fields):
+        return
+    from .catalogue import catalogue
+    catalogue.invalidate()
+    # Ещё раз после коммита: другой поток мог перечитать справочник до него
+    transaction.on_commit(catalogue.invalidate)
@@ -0,0 +1,39 @@
+import os
+from pathlib import Path
+
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework.permissions import AllowAny
+
+# Импортируется только при сборке схемы и по первому запросу /api/docs/ — не при старте воркера
+
+API_INFO = openapi.Info(
+    title="Femida API",
+    default_version='v1',
+    description="Документация API для пансионата Фемида",
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(AllowAny,),
+)
+
+# Страница Swagger UI дешёвая: саму схему она загружает с /api/schema/ (SWAGGER_SETTINGS['SPEC_URL'])
+swagger_ui_view = schema_view.with_ui('swagger', cache_timeout=0)
+
+
+def write_schema(path, url=None):
+    """Генерирует схему по всем URL и записывает JSON в path (через временный файл)"""
+    schema = OpenAPISchemaGenerator(API_INFO, url=url).get_schema(request=None, public=True)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.part')
+    try:
+        partial.write_bytes(OpenAPICodecJson(validators=[]).encode(schema))
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,166 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import record_changes
+from .lifecycle import refresh_room_statuses
+from .models import AuditLog, Booking, Building, Guest, Room, User, digits_only
+from .reports import rebuild_report_rows
+from .rollups import rebuild_rollups
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Асанов', 'Токтогулов', 'Кузнецов', 'Осмонов', 'Абдыкадыров', 'Смирнов', 'Бакиев']
+FIRST_NAMES = ['Алексей', 'Айбек', 'Нурлан', 'Сергей', 'Бакыт', 'Дмитрий', 'Эрлан', 'Марат', 'Азамат', 'Игорь']
+MIDDLE_NAMES = ['Иванович', 'Петрович', 'Асанович', 'Сергеевич', 'Бакытович', 'Маратович']
+ROOM_CLASSES = [('standard', Decimal('2500')), ('semi_lux', Decimal('4000')), ('lux', Decimal('6500'))]
+ROOM_TYPES = ['Одноместный', 'Двухместный', 'Семейный']
+PAYMENT_METHODS = ['cash', 'card', 'transfer', 'online']
+AUDIT_ACTIONS = ['create', 'update', 'delete', 'restore']
+
+
+def bulk_insert(model, objects, batch_size):
+    """bulk_create пачками; возвращает созданные объекты (с pk там, где БД их возвращает)"""
+    created = []
+    for start in range(0, len(objects), batch_size):
+        created.extend(model.objects.bulk_create(objects[start:start + batch_size]))
+    return created
+
+
+def make_guest(rng, index):
+    phone = f'+99670{rng.randint(0, 9999999):07d}'
+    inn = f'{rng.randint(1, 2)}{rng.randint(0, 10 ** 13 - 1):013d}'
+    return Guest(
+        full_name=f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(MIDDLE_NAMES)}',
+        phone=phone,
+        phone_digits=digits_only(phone),
+        inn=inn,
+        inn_digits=inn,
+        email=f'guest{index}@example.com' if rng.random() < 0.4 else '',
+        people_count=rng.randint(1, 4),
+        status=rng.choices(['active', 'vip', 'inactive', 'blacklist'], weights=[85, 8, 6, 1])[0],
+    )
+
+
+def make_room_bookings(rng, room, guest_ids, start, end, now, created_by):
+    """Непересекающиеся бронирования одного номера от start до end"""
+    bookings = []
+    day = start + timedelta(days=rng.randint(0, 5))
+    while day < end:
+        nights = rng.choices([1, 2, 3, 5, 7, 10, 14], weights=[10, 20, 25, 20, 15, 6, 4])[0]
+        check_in = day.replace(hour=14)
+        check_out = (day + timedelta(days=nights)).replace(hour=12)
+        cancelled = rng.random() < 0.05
+        if cancelled:
+            status = 'cancelled'
+        elif check_out < now:
+            status = 'completed'
+        else:
+            status = 'active'
+        total = room.price_per_night * (check_out - check_in).days
+        if status == 'completed':
+            payment_status = 'paid' if rng.random() < 0.92 else 'unpaid'
+        else:
+            payment_status = rng.choice(['pending', 'paid', 'unpaid'])
+        bookings.append(Booking(
+            guest_id=rng.choice(guest_ids),
+            room_id=room.pk,
+            check_in=check_in,
+            check_out=check_out,
+            people_count=rng.randint(1, room.capacity),
+            status=status,
+            payment_status=payment_status,
+            payment_amount=total if payment_status == 'paid' else Decimal('0'),
+            payment_method=rng.choice(PAYMENT_METHODS),
+            total_amount=total,
+            created_by=created_by,
+        ))
+        # Загрузка 60–80%: между заездами несколько свободных дней
+        day += timedelta(days=nights + rng.choice([0, 0, 1, 2, 3, 5]))
+    return bookings
+
+
+def seed_perf_data(buildings=3, rooms_per_building=40, guests=2000, years=3, audit=5000,
+                   seed=None, batch_size=2000, rebuild_derived=True):
+    """
+    Заполняет БД синтетическими данными для замеров производительности.
+
+    Всё пишется через bulk_create, поэтому сигналы не срабатывают: статусы и
+    занятость номеров выставляет refresh_room_statuses, а срезы и таблица отчётов пересобираются
+    в конце (rebuild_derived=False — пропустить).
+    """
+    rng = random.Random(seed)
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=365 * years)
+    end = now + timedelta(days=90)
+    users = list(User.objects.all())
+
+    with transaction.atomic():
+        offset = Building.objects.count()
+        new_buildings = bulk_insert(Building, [
+            Building(name=f'Корпус {offset + i + 1}', address=f'ул. Курортная, {offset + i + 1}')
+            for i in range(buildings)
+        ], batch_size)
+
+        rooms = []
+        for b_index, building in enumerate(new_buildings, start=offset + 1):
+            for r_index in range(rooms_per_building):
+                room_class, price = rng.choice(ROOM_CLASSES)
+                rooms.append(Room(
+                    building=building,
+                    number=f'{b_index}{r_index // 20 + 1}{r_index % 20 + 1:02d}',
+                    capacity=rng.randint(1, 4),
+                    room_type=rng.choice(ROOM_TYPES),
+                    room_class=room_class,
+                    price_per_night=price,
+                ))
+        rooms = bulk_insert(Room, rooms, batch_size)
+
+        guest_ids = [guest.pk for guest in bulk_insert(Guest, [make_guest(rng, i) for i in range(guests)], batch_size)]
+
+        booking_ids = []
+        batch = []
+        for room in rooms:
+            batch.extend(make_room_bookings(rng, room, guest_ids, start, end, now, rng.choice(users) if users else None))
+            if len(batch) >= batch_size:
+                booking_ids.extend(booking.pk for booking in bulk_insert(Booking, batch, batch_size))
+                batch = []
+        if batch:
+            booking_ids.extend(booking.pk for booking in bulk_insert(Booking, batch, batch_size))
+
+        # Как Room.update_status: статус, текущее проживание и ближайший заезд
+        refresh_room_statuses([room.pk for room in rooms], now)
+
+        object_types = [
+            (object_type, ids)
+            for object_type, ids in (('Booking', booking_ids), ('Guest', guest_ids), ('Room', [room.pk for room in rooms]))
+            if ids
+        ]
+        audit_rows = []
+        for _ in range(audit if object_types else 0):
+            object_type, ids = rng.choice(object_types)
+            action = rng.choice(AUDIT_ACTIONS)
+            audit_rows.append(AuditLog(
+                user=rng.choice(users) if users else None,
+                action=action,
+                object_type=object_type,
+                object_id=rng.choice(ids),
+                details=f'{action} {object_type}',
+            ))
+        bulk_insert(AuditLog, audit_rows, batch_size)
+        # Справочник номеров в памяти других процессов узнаёт о новых номерах по ленте изменений
+        record_changes('Building', [building.pk for building in new_buildings], 'create')
+        record_changes('Room', [room.pk for room in rooms], 'create')
+
+    if rebuild_derived:
+        rebuild_rollups(batch_size=batch_size)
+        rebuild_report_rows(batch_size=batch_size)
+
+    return {
+        'buildings': len(new_buildings),
+        'rooms': len(rooms),
+        'guests': len(guest_ids),
+        'bookings': len(booking_ids),
+        'audit': len(audit_rows),
+    }
@@ -0,0 +1,13 @@
+from rest_framework import permissions
+
+
+def is_superadmin(user):
+    return bool(user and user.is_authenticated and (user.is_superuser or getattr(user, 'role', None) == 'superadmin'))
+
+
+class IsSuperAdmin(permissions.BasePermission):
+    """Доступ только для супер-админов (role=superadmin или is_superuser)"""
+    message = 'Доступно только супер-админу'
+
+    def has_permission(self, request, view):
+        return is_superadmin(request.user)
@@ -0,0 +1,301 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .permissions import IsSuperAdmin, is_superadmin
+from .query_observers import observe_queries
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+DUMP_NAME_RE = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+# Строка вывода python -X importtime: «import time: <своё, мкс> | <всего, мкс> | <отступ><модуль>»
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+# cProfile нельзя запускать в нескольких потоках одновременно (в 3.12+ он глобальный)
+_profile_lock = threading.Lock()
+
+
+class QueryRecorder:
+    """Наблюдатель SQL, сохраняющий каждый запрос с параметрами и временем"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': params if not many else None,
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def profile_requested(request):
+    return request.GET.get('_profile') == '1' or request.headers.get(PROFILE_HEADER) == '1'
+
+
+def request_user(request):
+    """
+    Пользователь запроса для middleware: сессия или JWT.
+
+    DRF проверяет JWT только внутри view, поэтому здесь токен разбираем сами.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def explain_query(query):
+    """План запроса без выполнения (EXPLAIN, а не EXPLAIN ANALYZE)"""
+    if query['many'] or not query['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[query['alias']]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query['params'])
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN не выполнен: {e}'
+
+
+def profile_stats_text(profiler, limit=40):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def dump_dir():
+    path = Path(settings.PROFILE_DUMP_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def rotate_dumps(directory):
+    """Оставляет только PROFILE_MAX_DUMPS последних профилей"""
+    dumps = sorted(directory.glob('*.json'), reverse=True)
+    for meta in dumps[settings.PROFILE_MAX_DUMPS:]:
+        meta.with_suffix('.prof').unlink(missing_ok=True)
+        meta.unlink(missing_ok=True)
+
+
+def save_profile(request, response, user, profiler, queries, duration):
+    directory = dump_dir()
+    name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(directory / f'{name}.prof')
+
+    slowest = sorted(range(len(queries)), key=lambda i: queries[i]['duration_ms'], reverse=True)
+    for index in slowest[:settings.PROFILE_EXPLAIN_TOP]:
+        queries[index]['explain'] = explain_query(queries[index])
+
+    match = getattr(request, 'resolver_match', None)
+    meta = {
+        'name': name,
+        'created_at': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else None,
+        'user': user.username,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'query_count': len(queries),
+        'query_time_ms': round(sum(query['duration_ms'] for query in queries), 3),
+        'queries': queries,
+        'stats': profile_stats_text(profiler),
+    }
+    with open(directory / f'{name}.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, default=str, indent=1)
+    rotate_dumps(directory)
+    return name
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование одного запроса по ?_profile=1 или заголовку X-Profile: 1.
+
+    Только для супер-админа. Сохраняет дамп cProfile (.prof, открывается
+    snakeviz/pstats) и JSON со всеми SQL-запросами, их временем и планами
+    самых медленных. Имя дампа возвращается в заголовке X-Profile-Id.
+    Под ASGI cProfile видит только код цикла событий: синхронные view
+    выполняются в других потоках, их время попадает в профиль как ожидание.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not profile_requested(request):
+            return self.get_response(request)
+        user = request_user(request)
+        if not is_superadmin(user):
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            return self.mark_busy(self.get_response(request))
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            with observe_queries(recorder):
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _profile_lock.release()
+        return self.save(request, response, user, profiler, recorder.queries, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not profile_requested(request):
+            return await self.get_response(request)
+        user = await sync_to_async(request_user)(request)
+        if not is_superadmin(user):
+            return await self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            return self.mark_busy(await self.get_response(request))
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            with observe_queries(recorder):
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _profile_lock.release()
+        return await sync_to_async(self.save)(request, response, user, profiler, recorder.queries, time.perf_counter() - started)
+
+    @staticmethod
+    def mark_busy(response):
+        response['X-Profile-Id'] = 'busy'
+        return response
+
+    @staticmethod
+    def save(request, response, user, profiler, queries, duration):
+        try:
+            response['X-Profile-Id'] = save_profile(request, response, user, profiler, queries, duration)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить профиль {request.path}: {str(e)}")
+        return response
+
+
+def read_profile(name):
+    if not DUMP_NAME_RE.match(name):
+        return None
+    path = Path(settings.PROFILE_DUMP_DIR) / f'{name}.json'
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ProfileListView(APIView):
+    """Список сохранённых профилей, новые первыми"""
+    permission_classes = [IsSuperAdmin]
+    summary_fields = ('name', 'created_at', 'method', 'path', 'view', 'user', 'status', 'duration_ms', 'query_count', 'query_time_ms')
+
+    def get(self, request):
+        directory = Path(settings.PROFILE_DUMP_DIR)
+        items = []
+        for meta_path in sorted(directory.glob('*.json'), reverse=True) if directory.exists() else []:
+            meta = read_profile(meta_path.stem)
+            if meta:
+                items.append({field: meta.get(field) for field in self.summary_fields})
+        return Response(items)
+
+
+class ProfileDetailView(APIView):
+    """Профиль целиком (JSON) или дамп pstats при ?download=1"""
+    permission_classes = [IsSuperAdmin]
+
+    def get(self, request, name):
+        meta = read_profile(name)
+        if meta is None:
+            return Response({'error': 'Профиль не найден'}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('download') == '1':
+            path = Path(settings.PROFILE_DUMP_DIR) / f'{name}.prof'
+            if not path.exists():
+                return Response({'error': 'Профиль не найден'}, status=status.HTTP_404_NOT_FOUND)
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.prof')
+        return Response(meta)
+
+
+def parse_import_times(output):
+    """Разбирает вывод -X importtime: [{'module', 'self_ms', 'cumulative_ms', 'depth'}]"""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                'module': module,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+    return imports
+
+
+def profile_imports(modules):
+    """
+    Холодный старт воркера в отдельном интерпретаторе с -X importtime.
+
+    Загружает WSGI-приложение и модули modules (обычно ROOT_URLCONF — его
+    импортирует первый запрос). Возвращает (импорты, время старта в мс).
+    """
+    code = '\n'.join([
+        'import importlib, time',
+        'started = time.perf_counter()',
+        'from django.core.wsgi import get_wsgi_application',
+        'get_wsgi_application()',
+        *(f'importlib.import_module({module!r})' for module in modules),
+        'print((time.perf_counter() - started) * 1000)',
+    ])
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Интерпретатор завершился с ошибкой')
+    return parse_import_times(result.stderr), float(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Наблюдатели SQL текущего запроса (QueryTimer, QueryRecorder, SlowQueryCollector).
+# ContextVar, а не connection.execute_wrapper: под ASGI ORM выполняется в потоке
+# sync_to_async, куда контекст копируется, а соединение там другое.
+_observers = ContextVar('query_observers', default=())
+
+
+def dispatch_execute(execute, sql, params, many, context):
+    """Единственный execute_wrapper соединения: передаёт запрос наблюдателям текущего контекста"""
+    for observer in reversed(_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def observe_queries(*observers):
+    """Подключает наблюдателей ко всем SQL-запросам внутри блока (в том числе из sync_to_async)"""
+    token = _observers.set(_observers.get() + observers)
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+@receiver(connection_created)
+def install_dispatch(sender, connection, **kwargs):
+    if dispatch_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch_execute)
@@ -0,0 +1,190 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Booking, BookingReportRow
+
+# Прогноз загрузки: период по умолчанию и предельный, глубина кривой набора
+FORECAST_DAYS = 90
+FORECAST_MAX_DAYS = 366
+PICKUP_DAYS = 30
+
+
+def parse_report_date(value, end_of_day=False):
+    """Разбирает дату фильтра отчёта (YYYY-MM-DD или ISO datetime)"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Неверная дата: {value}')
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_occupancy_params(params):
+    """Период и корпус отчёта загрузки; по умолчанию — последние 30 дней"""
+    date_from = parse_report_date(params.get('date_from'))
+    date_to = parse_report_date(params.get('date_to'))
+    date_to = timezone.localdate(date_to) if date_to else timezone.localdate()
+    date_from = timezone.localdate(date_from) if date_from else date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise ValueError('date_from должна быть не позже date_to')
+    building = params.get('building')
+    if building and not building.isdigit():
+        raise ValueError('Неверный корпус')
+    return date_from, date_to, int(building) if building else None
+
+
+def _positive_int(params, name, default, maximum):
+    value = params.get(name)
+    if not value:
+        return default
+    if not value.isdigit() or not 1 <= int(value) <= maximum:
+        raise ValueError(f'{name} должно быть числом от 1 до {maximum}')
+    return int(value)
+
+
+def parse_forecast_params(params):
+    """Начало, длина периода, корпус и глубина кривой набора; по умолчанию — 90 дней от сегодня"""
+    date_from = parse_report_date(params.get('date_from'))
+    date_from = timezone.localdate(date_from) if date_from else timezone.localdate()
+    days = _positive_int(params, 'days', FORECAST_DAYS, FORECAST_MAX_DAYS)
+    pickup_days = _positive_int(params, 'pickup_days', PICKUP_DAYS, FORECAST_MAX_DAYS)
+    building = params.get('building')
+    if building and not building.isdigit():
+        raise ValueError('Неверный корпус')
+    return date_from, days, int(building) if building else None, pickup_days
+
+
+def build_report_row(booking, row_model=BookingReportRow):
+    """Строка отчёта из бронирования с подгруженными guest, room__building и created_by"""
+    guest = booking.guest
+    room = booking.room
+    return row_model(
+        booking_id=booking.pk,
+        guest_id=guest.pk,
+        guest_name=guest.full_name,
+        guest_phone=guest.phone,
+        guest_inn=guest.inn or '',
+        room_id=room.pk,
+        room_number=room.number,
+        room_class=room.room_class,
+        room_type=room.room_type,
+        price_per_night=room.price_per_night,
+        building_id=room.building_id,
+        building_name=room.building.name,
+        created_by_id=booking.created_by_id,
+        created_by_username=booking.created_by.username if booking.created_by else '',
+        check_in=booking.check_in,
+        check_out=booking.check_out,
+        people_count=booking.people_count,
+        status=booking.status,
+        payment_status=booking.payment_status,
+        payment_method=booking.payment_method,
+        payment_amount=booking.payment_amount,
+        total_amount=booking.total_amount,
+        created_at=booking.created_at,
+    )
+
+
+def report_source_bookings():
+    return Booking.objects.select_related('guest', 'room__building', 'created_by')
+
+
+def sync_report_rows(booking_ids):
+    """Пересобирает строки отчёта для указанных бронирований"""
+    booking_ids = list(booking_ids)
+    with transaction.atomic():
+        BookingReportRow.objects.filter(booking_id__in=booking_ids).delete()
+        BookingReportRow.objects.bulk_create(
+            build_report_row(booking) for booking in report_source_bookings().filter(pk__in=booking_ids)
+        )
+
+
+def update_guest_report_rows(guest):
+    BookingReportRow.objects.filter(guest_id=guest.pk).update(
+        guest_name=guest.full_name, guest_phone=guest.phone, guest_inn=guest.inn or '',
+    )
+
+
+def update_room_report_rows(room):
+    BookingReportRow.objects.filter(room_id=room.pk).update(
+        room_number=room.number,
+        room_class=room.room_class,
+        room_type=room.room_type,
+        price_per_night=room.price_per_night,
+        building_id=room.building_id,
+        building_name=room.building.name,
+    )
+
+
+def rebuild_report_rows(batch_size=1000, apps=None):
+    """
+    Полная пересборка таблицы отчётов пачками.
+
+    apps — реестр исторических моделей, когда пересборку запускает миграция:
+    у них нет менеджера живых записей, удалённые отсекаются фильтром.
+    """
+    if apps is None:
+        row_model, bookings = BookingReportRow, report_source_bookings()
+    else:
+        row_model = apps.get_model('booking', 'BookingReportRow')
+        bookings = apps.get_model('booking', 'Booking').objects.filter(is_deleted=False).select_related(
+            'guest', 'room__building', 'created_by'
+        )
+    created = 0
+    with transaction.atomic():
+        row_model.objects.all().delete()
+        batch = []
+        for booking in bookings.iterator(chunk_size=batch_size):
+            batch.append(build_report_row(booking, row_model))
+            if len(batch) >= batch_size:
+                row_model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            row_model.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
+
+def filter_report_rows(queryset, params):
+    """
+    Применяет фильтры страницы отчётов к строкам BookingReportRow.
+
+    Поддерживает те же фильтры, что и страница: search, date_from, date_to,
+    room, guest, status, building.
+    """
+    search = (params.get('search') or '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(guest_name__icontains=search)
+            | Q(guest_phone__contains=search)
+            | Q(guest_inn__contains=search)
+        )
+
+    date_from = parse_report_date(params.get('date_from'))
+    if date_from:
+        queryset = queryset.filter(check_in__gte=date_from)
+    date_to = parse_report_date(params.get('date_to'), end_of_day=True)
+    if date_to:
+        queryset = queryset.filter(check_out__lte=date_to)
+
+    for param, lookup in (('room', 'room_id'), ('guest', 'guest_id'), ('building', 'building_id')):
+        value = params.get(param)
+        if value:
+            if not str(value).isdigit():
+                raise ValueError(f'Неверное значение фильтра {param}: {value}')
+            queryset = queryset.filter(**{lookup: int(value)})
+
+    booking_status = params.get('status')
+    if booking_status:
+        queryset = queryset.filter(status=booking_status)
+    return queryset
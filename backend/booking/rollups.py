@@ -0,0 +1,332 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Booking, Building, BuildingDailyStat, Room, RoomDailyStat
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+# Отменённые бронирования в занятость и выручку не входят
+EXCLUDED_STATUSES = ['cancelled']
+
+
+def stay_dates(check_in, check_out):
+    """Ночи проживания: даты от заезда до выезда (не включая день выезда)"""
+    start = timezone.localdate(check_in)
+    end = timezone.localdate(check_out)
+    nights = max((end - start).days, 1)
+    return [start + timedelta(days=i) for i in range(nights)]
+
+
+def split_amount(amount, parts):
+    """Делит сумму на равные доли по копейкам; остаток уходит в последнюю долю"""
+    amount = Decimal(amount or 0)
+    share = (amount / parts).quantize(CENT, rounding=ROUND_HALF_UP)
+    shares = [share] * parts
+    shares[-1] = amount - share * (parts - 1)
+    return shares
+
+
+def booking_nights(booking):
+    """
+    Раскладывает бронирование по ночам: (дата, выручка, оплачено, не оплачено).
+
+    Выручка — total_amount поровну на каждую ночь. Оплаченная часть — вся сумма
+    при payment_status='paid', иначе внесённый payment_amount.
+    """
+    dates = stay_dates(booking.check_in, booking.check_out)
+    total = Decimal(booking.total_amount or 0)
+    paid_total = total if booking.payment_status == 'paid' else min(Decimal(booking.payment_amount or 0), total)
+    revenue = split_amount(total, len(dates))
+    paid = split_amount(paid_total, len(dates))
+    for day, day_revenue, day_paid in zip(dates, revenue, paid):
+        yield day, day_revenue, day_paid, day_revenue - day_paid
+
+
+def counted_bookings():
+    return Booking.objects.exclude(status__in=EXCLUDED_STATUSES)
+
+
+def day_bounds(date_from, date_to):
+    """Границы диапазона дат в виде aware datetime [начало date_from, конец date_to)"""
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def _accumulate(bookings, date_from=None, date_to=None):
+    totals = defaultdict(lambda: [0, ZERO, ZERO, ZERO])
+    for booking in bookings:
+        for day, revenue, paid, unpaid in booking_nights(booking):
+            if (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+            row = totals[(booking.room_id, day)]
+            row[0] += 1
+            row[1] += revenue
+            row[2] += paid
+            row[3] += unpaid
+    return totals
+
+
+def _room_stats(totals, building_by_room):
+    return [
+        RoomDailyStat(
+            room_id=room_id, building_id=building_by_room[room_id], date=day,
+            occupied_nights=nights, revenue=revenue, paid_amount=paid, unpaid_amount=unpaid,
+        )
+        for (room_id, day), (nights, revenue, paid, unpaid) in totals.items()
+        if room_id in building_by_room
+    ]
+
+
+def lock_buildings(building_ids):
+    """
+    SELECT … FOR UPDATE строк корпусов до конца транзакции.
+
+    Срез корпуса собирается из срезов всех его номеров: без блокировки две записи
+    в разные номера одного корпуса не видят незафиксированные строки друг друга
+    и обе вставляют один и тот же (корпус, дата). Корпуса берутся по возрастанию id.
+    """
+    ids = sorted({pk for pk in building_ids if pk is not None})
+    list(Building.all_objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+
+def building_stat_rows(stats):
+    """Суммы RoomDailyStat по (корпус, дата) для BuildingDailyStat"""
+    return stats.values('building_id', 'date').annotate(
+        nights=Sum('occupied_nights'), revenue_sum=Sum('revenue'),
+        paid_sum=Sum('paid_amount'), unpaid_sum=Sum('unpaid_amount'),
+    ).order_by()
+
+
+def building_stat(row):
+    return BuildingDailyStat(
+        building_id=row['building_id'], date=row['date'], occupied_nights=row['nights'],
+        revenue=row['revenue_sum'], paid_amount=row['paid_sum'], unpaid_amount=row['unpaid_sum'],
+    )
+
+
+def refresh_building_rollup(building_ids, date_from, date_to):
+    """Пересобирает BuildingDailyStat из RoomDailyStat за диапазон дат"""
+    with transaction.atomic():
+        # Сумма читается после блокировки — уже с зафиксированными срезами соседних номеров
+        lock_buildings(building_ids)
+        BuildingDailyStat.objects.filter(
+            building_id__in=building_ids, date__gte=date_from, date__lte=date_to
+        ).delete()
+        rows = building_stat_rows(RoomDailyStat.objects.filter(
+            building_id__in=building_ids, date__gte=date_from, date__lte=date_to
+        ))
+        BuildingDailyStat.objects.bulk_create([building_stat(row) for row in rows])
+
+
+def refresh_room_rollup(room_id, date_from, date_to):
+    """
+    Пересчитывает срезы одного номера за диапазон дат по его бронированиям.
+
+    Срез корпуса пересобирается после коммита, в своей короткой транзакции:
+    блокировка корпуса на время всей записи бронирования выстроила бы в очередь
+    записи во все номера корпуса.
+    """
+    start, end = day_bounds(date_from, date_to)
+    # Запас в сутки с каждой стороны — границы ночей считаются в локальных датах
+    bookings = counted_bookings().filter(
+        room_id=room_id,
+        check_in__lt=end + timedelta(days=1),
+        check_out__gt=start - timedelta(days=1),
+    ).only('room_id', 'check_in', 'check_out', 'total_amount', 'payment_amount', 'payment_status')
+    with transaction.atomic():
+        # Строка номера — под блокировкой, как в lock_rooms: срезы номера пишет одна транзакция
+        building_id = Room.all_objects.select_for_update().filter(pk=room_id).values_list('building_id', flat=True).first()
+        stale_buildings = set(RoomDailyStat.objects.filter(
+            room_id=room_id, date__gte=date_from, date__lte=date_to
+        ).values_list('building_id', flat=True).distinct())
+        RoomDailyStat.objects.filter(room_id=room_id, date__gte=date_from, date__lte=date_to).delete()
+        if building_id is not None:
+            RoomDailyStat.objects.bulk_create(
+                _room_stats(_accumulate(bookings, date_from, date_to), {room_id: building_id})
+            )
+            stale_buildings.add(building_id)
+        if stale_buildings:
+            transaction.on_commit(
+                partial(refresh_building_rollup, sorted(stale_buildings), date_from, date_to), robust=True
+            )
+
+
+def refresh_booking_rollups(booking, previous=None):
+    """Обновляет срезы после изменения бронирования: новый и прежний диапазоны"""
+    ranges = {(booking.room_id, booking.check_in, booking.check_out)}
+    if previous:
+        ranges.add((previous['room_id'], previous['check_in'], previous['check_out']))
+    # Номера — по возрастанию id, как в lock_rooms: при смене номера без взаимоблокировки
+    for room_id, check_in, check_out in sorted(ranges, key=lambda item: item[0] or 0):
+        if room_id and check_in and check_out:
+            dates = stay_dates(check_in, check_out)
+            refresh_room_rollup(room_id, dates[0], dates[-1])
+
+
+def _room_batches(bookings, building_by_room, batch_size):
+    """
+    Срезы номеров пачками по batch_size строк.
+
+    Бронирования идут по номерам, поэтому в памяти — итоги одного номера и одна пачка.
+    """
+    batch = []
+    room_id, room_bookings = None, []
+    for booking in bookings:
+        if booking.room_id != room_id:
+            batch.extend(_room_stats(_accumulate(room_bookings), building_by_room))
+            room_id, room_bookings = booking.room_id, []
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        room_bookings.append(booking)
+    batch.extend(_room_stats(_accumulate(room_bookings), building_by_room))
+    if batch:
+        yield batch
+
+
+def rebuild_building_rollups(building_id, batch_size=1000, progress=None):
+    """
+    Пересборка срезов одного корпуса в своей транзакции.
+
+    Номера корпуса и сам корпус блокируются в том же порядке, что при записи
+    бронирования (номера, затем корпус): запись в номер этого корпуса ждёт
+    конца пересборки корпуса, а не всей пересборки.
+    """
+    with transaction.atomic():
+        room_ids = list(Room.all_objects.select_for_update().filter(building_id=building_id).order_by('pk').values_list('pk', flat=True))
+        lock_buildings([building_id])
+        building_by_room = dict.fromkeys(room_ids, building_id)
+        RoomDailyStat.objects.filter(Q(room_id__in=room_ids) | Q(building_id=building_id)).delete()
+        BuildingDailyStat.objects.filter(building_id=building_id).delete()
+        bookings = counted_bookings().filter(room_id__in=room_ids).only(
+            'room_id', 'check_in', 'check_out', 'total_amount', 'payment_amount', 'payment_status'
+        ).order_by('room_id', 'check_in').iterator(chunk_size=batch_size)
+        if progress:
+            bookings = progress.track(bookings)
+        rooms_count = 0
+        for stats in _room_batches(bookings, building_by_room, batch_size):
+            RoomDailyStat.objects.bulk_create(stats, batch_size=batch_size)
+            rooms_count += len(stats)
+        # Дней у корпуса немного — его срезы помещаются в память
+        buildings = [building_stat(row) for row in building_stat_rows(RoomDailyStat.objects.filter(building_id=building_id))]
+        BuildingDailyStat.objects.bulk_create(buildings, batch_size=batch_size)
+    return rooms_count, len(buildings)
+
+
+def rebuild_rollups(batch_size=1000, progress=None):
+    """
+    Полная пересборка всех срезов: по корпусу за транзакцию, бронирования — пачками.
+
+    progress (JobProgress) получает число бронирований и продвигается по каждому.
+    """
+    if progress:
+        progress.set_total(counted_bookings().count())
+    rooms_count = buildings_count = 0
+    for building_id in Building.all_objects.order_by('pk').values_list('pk', flat=True):
+        rooms, buildings = rebuild_building_rollups(building_id, batch_size, progress)
+        rooms_count += rooms
+        buildings_count += buildings
+    return rooms_count, buildings_count
+
+
+def _ratio(numerator, denominator):
+    if not denominator:
+        return ZERO
+    return (Decimal(numerator) / Decimal(denominator)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def occupancy_querysets(date_from, date_to, building_id=None):
+    """Три агрегирующих запроса отчёта загрузки: номера, корпуса и дни"""
+    stats = BuildingDailyStat.objects.filter(date__gte=date_from, date__lte=date_to)
+    rooms = Room.objects.filter(is_active=True, building__is_deleted=False)
+    if building_id:
+        stats = stats.filter(building_id=building_id)
+        rooms = rooms.filter(building_id=building_id)
+    room_counts = rooms.values('building_id', 'building__name').annotate(total=Count('id'))
+    per_building = stats.values('building_id', 'building__name').annotate(
+        nights=Sum('occupied_nights'), revenue_sum=Sum('revenue'),
+        paid_sum=Sum('paid_amount'), unpaid_sum=Sum('unpaid_amount'),
+    )
+    daily = stats.values('date').annotate(
+        nights=Sum('occupied_nights'), revenue_sum=Sum('revenue')
+    ).order_by('date')
+    return room_counts, per_building, daily
+
+
+def occupancy_report(date_from, date_to, building_id=None):
+    """
+    Загрузка, ADR и RevPAR за период по суточным срезам корпусов.
+
+    Читает не больше (дней × корпусов) строк BuildingDailyStat вместо сырых бронирований.
+    Доступные номеро-ночи — число действующих номеров × дни периода.
+    """
+    rows = [list(queryset) for queryset in occupancy_querysets(date_from, date_to, building_id)]
+    return build_occupancy_report(date_from, date_to, *rows)
+
+
+async def aoccupancy_report(date_from, date_to, building_id=None):
+    rows = [[row async for row in queryset] for queryset in occupancy_querysets(date_from, date_to, building_id)]
+    return build_occupancy_report(date_from, date_to, *rows)
+
+
+def build_occupancy_report(date_from, date_to, room_counts, building_rows, daily_rows):
+    """Собирает отчёт загрузки из уже прочитанных строк occupancy_querysets"""
+    days = (date_to - date_from).days + 1
+    rooms_by_building = {row['building_id']: row['total'] for row in room_counts}
+    names = {row['building_id']: row['building__name'] for row in room_counts}
+
+    def summary(nights, revenue, paid, unpaid, available):
+        return {
+            'occupied_nights': nights,
+            'available_nights': available,
+            'revenue': revenue,
+            'paid_amount': paid,
+            'unpaid_amount': unpaid,
+            'occupancy_rate': _ratio(nights * 100, available),
+            'adr': _ratio(revenue, nights),
+            'revpar': _ratio(revenue, available),
+        }
+
+    per_building = {row['building_id']: row for row in building_rows}
+    totals = {'nights': 0, 'revenue': ZERO, 'paid': ZERO, 'unpaid': ZERO}
+    buildings = []
+    for building in sorted(set(per_building) | set(rooms_by_building)):
+        row = per_building.get(building, {})
+        nights = row.get('nights') or 0
+        revenue = row.get('revenue_sum') or ZERO
+        paid = row.get('paid_sum') or ZERO
+        unpaid = row.get('unpaid_sum') or ZERO
+        buildings.append({
+            'building': {'id': building, 'name': row.get('building__name') or names.get(building, '')},
+            **summary(nights, revenue, paid, unpaid, rooms_by_building.get(building, 0) * days),
+        })
+        totals['nights'] += nights
+        totals['revenue'] += revenue
+        totals['paid'] += paid
+        totals['unpaid'] += unpaid
+
+    rooms_total = sum(rooms_by_building.values())
+    daily = [
+        {
+            'date': row['date'],
+            'occupied_nights': row['nights'],
+            'revenue': row['revenue_sum'],
+            'occupancy_rate': _ratio(row['nights'] * 100, rooms_total),
+        }
+        for row in daily_rows
+    ]
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        **summary(totals['nights'], totals['revenue'], totals['paid'], totals['unpaid'], rooms_total * days),
+        'buildings': buildings,
+        'daily': daily,
+    }
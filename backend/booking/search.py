@@ -0,0 +1,60 @@
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .models import Guest, digits_only
+
+# Минимальная длина запроса из цифр, чтобы искать по телефону/ИНН
+MIN_DIGITS = 3
+
+
+def phone_variants(digits):
+    """Варианты номера: местный формат 0XXX… также ищем как 996XXX…"""
+    variants = [digits]
+    if digits.startswith('0') and len(digits) > 1:
+        variants.append('996' + digits[1:])
+    return variants
+
+
+def search_guests_by_digits(queryset, digits):
+    """Поиск по префиксу нормализованных телефона и ИНН (используются B-tree индексы)"""
+    variants = phone_variants(digits)
+    condition = Q(inn_digits__startswith=digits)
+    exact = [When(inn_digits=digits, then=Value(1.0))]
+    for variant in variants:
+        condition |= Q(phone_digits__startswith=variant)
+        exact.append(When(phone_digits=variant, then=Value(1.0)))
+    return queryset.filter(condition).annotate(
+        rank=Case(*exact, default=Value(0.5), output_field=FloatField())
+    ).order_by('-rank', 'full_name')
+
+
+def search_guests_by_name(queryset, query):
+    """Нечёткий поиск по ФИО: триграммы в PostgreSQL, подстрока в остальных СУБД"""
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        return queryset.filter(full_name__trigram_word_similar=query).annotate(
+            rank=TrigramWordSimilarity(query, 'full_name')
+        ).order_by('-rank', 'full_name')
+    return queryset.filter(full_name__icontains=query).annotate(
+        rank=Case(
+            When(full_name__istartswith=query, then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        )
+    ).order_by('-rank', 'full_name')
+
+
+def search_guests(query, limit=10, queryset=None):
+    """Ранжированный поиск гостей для подсказок (typeahead)"""
+    query = (query or '').strip()
+    if not query:
+        return Guest.objects.none()
+    if queryset is None:
+        queryset = Guest.objects.all()
+    digits = digits_only(query)
+    # Запрос из цифр (и разделителей телефона) ищем по телефону/ИНН, иначе по имени
+    if len(digits) >= MIN_DIGITS and not any(ch.isalpha() for ch in query):
+        queryset = search_guests_by_digits(queryset, digits)
+    else:
+        queryset = search_guests_by_name(queryset, query)
+    return queryset[:limit]
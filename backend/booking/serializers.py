@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.db.models import Sum
-from .models import User, Room, Guest, Booking, AuditLog, Building
+from .catalogue import catalogue, room_summary
+from .models import User, Room, Guest, Booking, AuditLog, Building, Job
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +46,7 @@ class RoomSerializer(serializers.ModelSerializer):
     # room_class теперь двустороннее поле (и на чтение, и на запись)
     room_class = serializers.CharField(required=True)
     room_class_display = serializers.SerializerMethodField(read_only=True)
+    current_booking = serializers.SerializerMethodField()
     
     def get_building(self, obj):
         if isinstance(obj, dict):
@@ -52,15 +55,25 @@ class RoomSerializer(serializers.ModelSerializer):
     
     def get_room_class_display(self, obj):
         return {'value': obj.room_class, 'label': obj.get_room_class_display()}
+
+    def get_current_booking(self, obj):
+        """Кто проживает сейчас (RoomViewSet подгружает бронирование с гостем через select_related)"""
+        if isinstance(obj, dict) or not obj.current_booking_id:
+            return None
+        booking = obj.current_booking
+        return {
+            'id': booking.id,
+            'guest': {'id': booking.guest_id, 'full_name': booking.guest.full_name},
+            'check_in': booking.check_in,
+            'check_out': booking.check_out,
+            'people_count': booking.people_count,
+        }
     
     def validate_status(self, value):
         """Валидация статуса номера"""
         if self.instance and value == 'free':
             # Проверяем, есть ли активные бронирования для этого номера
-            active_bookings = self.instance.bookings.filter(
-                status='active',
-                is_deleted=False
-            )
+            active_bookings = self.instance.bookings.filter(status='active')
             if active_bookings.exists():
                 raise serializers.ValidationError(
                     "Номер забронирован. Сначала отмените или завершите бронирование."
@@ -85,25 +98,26 @@ class RoomSerializer(serializers.ModelSerializer):
         model = Room
         fields = [
             'id', 'building', 'building_id', 'number', 'capacity', 'room_type', 'room_class', 'room_class_display', 'status', 'description',
-            'is_active', 'price_per_night', 'rooms_count', 'amenities', 'is_deleted'
+            'is_active', 'price_per_night', 'rooms_count', 'amenities', 'is_deleted', 'updated_at',
+            'current_booking', 'next_check_in', 'free_until',
         ]
-        read_only_fields = ['is_deleted']
+        read_only_fields = ['is_deleted', 'updated_at', 'next_check_in', 'free_until']
 
 class GuestSerializer(serializers.ModelSerializer):
     total_spent = serializers.SerializerMethodField()
     
     class Meta:
         model = Guest
-        fields = '__all__'
+        exclude = ['phone_digits', 'inn_digits']
         read_only_fields = ['is_deleted']
     
     def get_total_spent(self, obj):
         """Вычисляет общую сумму оплаченных бронирований гостя"""
         from decimal import Decimal
-        total = obj.bookings.filter(
-            payment_status='paid',
-            is_deleted=False
-        ).aggregate(
+        if hasattr(obj, 'paid_total'):
+            # Уже посчитано в queryset (Guest.objects.with_paid_total())
+            return str(obj.paid_total or Decimal('0'))
+        total = obj.bookings.filter(payment_status='paid').aggregate(
             total=Sum('total_amount')
         )['total'] or Decimal('0')
         return str(total)
@@ -174,24 +188,59 @@ class GuestSerializer(serializers.ModelSerializer):
             logger.error(f"Error updating guest {instance.id}: {str(e)}")
             raise serializers.ValidationError(f"Ошибка при обновлении гостя: {str(e)}")
 
+class GuestSearchSerializer(serializers.ModelSerializer):
+    """Лёгкое представление гостя для подсказок поиска"""
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Guest
+        fields = ['id', 'full_name', 'phone', 'inn', 'email', 'status', 'rank']
+
+def lock_rooms(room_ids):
+    """
+    SELECT … FOR UPDATE строк номеров до конца транзакции.
+
+    Блокируется только бронируемый номер, поэтому записи в разные номера идут
+    параллельно. Номера берутся по возрастанию id — при смене номера две
+    транзакции не заблокируют друг друга крест-накрест.
+
+    Возвращает цены заблокированных строк {id: price_per_night}: в копии из
+    справочника цена может отставать от других процессов.
+    """
+    ids = sorted({pk for pk in room_ids if pk is not None})
+    return dict(Room.all_objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', 'price_per_night'))
+
+
+class CatalogueRoomField(serializers.PrimaryKeyRelatedField):
+    """room_id: номер берётся из справочника в памяти (копия), без запроса к БД"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        room = catalogue.room(pk)
+        if room is None or room.is_deleted:
+            self.fail('does_not_exist', pk_value=data)
+        return room
+
+
 class BookingSerializer(serializers.ModelSerializer):
     guest = GuestSerializer(read_only=True)
     guest_id = serializers.PrimaryKeyRelatedField(queryset=Guest.objects.all(), source='guest', write_only=True)
     room = serializers.SerializerMethodField()
-    room_id = serializers.PrimaryKeyRelatedField(queryset=Room.objects.all(), source='room', write_only=True)
+    room_id = CatalogueRoomField(queryset=Room.objects.all(), source='room', write_only=True)
     
     def get_room(self, obj):
-        r = obj.room
-        return {
-            'id': r.id,
-            'number': r.number,
-            'building': {'id': r.building.id, 'name': r.building.name},
-            'room_class': {'value': r.room_class, 'label': r.get_room_class_display()},
-            'capacity': r.capacity,
-            'room_type': r.room_type,
-            'status': r.status,
-            'price_per_night': r.price_per_night,
-        }
+        # async view передаёт снимок справочника в контексте: в нём обращаться к БД нельзя,
+        # поэтому номера бронирований попадают в снимок ещё до сериализации (catalogue.acovering)
+        snapshot = self.context.get('catalogue')
+        summary = catalogue.room_summary(obj.room_id, snapshot)
+        if summary is None and snapshot is None:
+            summary = room_summary(obj.room)
+        return summary
     
     def validate(self, data):
         """Валидация данных бронирования"""
@@ -230,22 +279,46 @@ class BookingSerializer(serializers.ModelSerializer):
                     "Количество гостей должно быть больше 0"
                 )
         
-        # Проверка доступности номера
+        # Проверка доступности номера (окончательная — под блокировкой в create/update)
         if check_in and check_out and room:
-            conflicting_bookings = Booking.objects.filter(
-                room=room,
-                status='active',
-                is_deleted=False
-            ).exclude(id=self.instance.id if self.instance else None)
-            
-            # Проверяем пересечение дат
-            for booking in conflicting_bookings:
-                if (check_in < booking.check_out and check_out > booking.check_in):
-                    raise serializers.ValidationError(
-                        f"Номер уже забронирован на эти даты (бронирование #{booking.id})"
-                    )
+            self.check_availability(room, check_in, check_out)
         
         return data
+
+    def check_availability(self, room, check_in, check_out):
+        conflict = Booking.objects.filter(
+            room=room,
+            status='active',
+            check_in__lt=check_out,
+            check_out__gt=check_in,
+        ).exclude(id=self.instance.id if self.instance else None).only('id').first()
+        if conflict:
+            raise serializers.ValidationError(
+                f"Номер уже забронирован на эти даты (бронирование #{conflict.id})"
+            )
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            # Между validate() и вставкой номер мог забронировать другой запрос — проверяем ещё раз под блокировкой
+            room = validated_data['room']
+            room.price_per_night = lock_rooms([room.pk])[room.pk]
+            self.check_availability(room, validated_data['check_in'], validated_data['check_out'])
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            room = validated_data.get('room', instance.room)
+            # Booking.save считает сумму по цене номера — берём её из заблокированной строки
+            room.price_per_night = lock_rooms([instance.room_id, room.pk])[room.pk]
+            # Повторная активация отменённой брони занимает номер так же, как перенос дат
+            rebooked = any(field in validated_data for field in ('room', 'check_in', 'check_out', 'status'))
+            if rebooked and validated_data.get('status', instance.status) == 'active':
+                self.check_availability(
+                    room,
+                    validated_data.get('check_in', instance.check_in),
+                    validated_data.get('check_out', instance.check_out),
+                )
+            return super().update(instance, validated_data)
     
     class Meta:
         model = Booking
@@ -253,11 +326,47 @@ class BookingSerializer(serializers.ModelSerializer):
             'id', 'guest', 'guest_id', 'room', 'room_id',
             'check_in', 'check_out', 'people_count', 'status', 
             'payment_status', 'payment_amount', 'payment_method', 'comments', 'total_amount',
-            'created_by', 'created_at', 'is_deleted'
+            'created_by', 'created_at', 'is_deleted', 'updated_at'
         ]
-        read_only_fields = ['created_by', 'created_at', 'is_deleted']
+        read_only_fields = ['created_by', 'created_at', 'is_deleted', 'updated_at']
 
 class AuditLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = AuditLog
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+class JobSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'processed', 'total', 'error', 'result',
+            'result_name', 'created_at', 'started_at', 'finished_at', 'expires_at',
+        ]
+        read_only_fields = [
+            'status', 'processed', 'total', 'error', 'result', 'result_name',
+            'created_at', 'started_at', 'finished_at', 'expires_at',
+        ]
+
+    def validate(self, data):
+        from .exports import EXPORT_WRITERS
+        from .jobs import report_export_queryset
+        from .permissions import is_superadmin
+
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': 'Ожидается объект'})
+        if data['kind'] == 'report_export':
+            if params.get('format', 'csv') not in EXPORT_WRITERS:
+                raise serializers.ValidationError({'params': 'format должен быть csv или xlsx'})
+            if not isinstance(params.get('filters') or {}, dict):
+                raise serializers.ValidationError({'params': 'filters должен быть объектом'})
+            try:
+                report_export_queryset(params)
+            except ValueError as e:
+                raise serializers.ValidationError({'params': str(e)})
+        elif data['kind'] == 'rebuild_rollups' and not is_superadmin(self.context['request'].user):
+            raise serializers.ValidationError({'kind': 'Пересборка срезов доступна только супер-админу'})
+        data['params'] = params
+        return data
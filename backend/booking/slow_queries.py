@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import math
+import re
+import sys
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+
+from . import metrics, profiling, query_observers
+from .models import SlowQuery
+from .profiling import explain_query
+from .query_observers import observe_queries
+
+logger = logging.getLogger(__name__)
+
+# Модули с наблюдателями SQL — их кадры не считаются местом вызова
+WRAPPER_FILES = {str(Path(module.__file__).resolve()) for module in (metrics, profiling, query_observers)} | {str(Path(__file__).resolve())}
+
+_IN_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL без конкретных значений: литералы → ?, списки IN (%s, %s, ...) → (...)"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode('utf-8')).hexdigest()
+
+
+def find_caller():
+    """
+    Ближайший к запросу кадр из кода проекта, например
+    ``GuestSerializer.get_total_spent (booking/serializers.py:42)``.
+    """
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and filename not in WRAPPER_FILES:
+            code = frame.f_code
+            name = getattr(code, 'co_qualname', code.co_name)
+            return f'{name} ({Path(filename).relative_to(base_dir)}:{frame.f_lineno})'
+        frame = frame.f_back
+    return ''
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class SlowQueryCollector:
+    """Наблюдатель SQL, откладывающий запросы дольше SLOW_QUERY_THRESHOLD_MS до конца запроса"""
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+        self.captured = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.captured.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'params': params if not many else None,
+                    'many': many,
+                    'duration_ms': round(duration_ms, 3),
+                    'caller': find_caller(),
+                })
+
+
+def record_slow_queries(captured, endpoint=''):
+    """Складывает пойманные запросы в SlowQuery; EXPLAIN снимается при первой встрече"""
+    max_samples = settings.SLOW_QUERY_SAMPLES
+    for query in captured:
+        normalized = normalize_sql(query['sql'])
+        with transaction.atomic():
+            entry, created = SlowQuery.objects.select_for_update().get_or_create(
+                fingerprint=fingerprint(normalized),
+                defaults={
+                    'sql': normalized,
+                    'endpoint': endpoint,
+                    'caller': query['caller'][:300],
+                    'example_sql': query['sql'],
+                    'example_params': repr(query['params'])[:2000],
+                },
+            )
+            if not entry.explain:
+                entry.explain = explain_query(query) or ''
+            entry.count += 1
+            entry.total_ms += query['duration_ms']
+            entry.max_ms = max(entry.max_ms, query['duration_ms'])
+            entry.samples = (entry.samples + [query['duration_ms']])[-max_samples:]
+            entry.p95_ms = percentile(entry.samples, 0.95)
+            if endpoint and not entry.endpoint:
+                entry.endpoint = endpoint
+            entry.save()
+
+
+# Конец потока ответа (next() без исключения StopIteration)
+_END = object()
+
+
+def observe_stream(chunks, collector):
+    """Части потокового ответа: SQL, выполненный при вычислении каждой, видит collector"""
+    chunks = iter(chunks)
+    while True:
+        with observe_queries(collector):
+            chunk = next(chunks, _END)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+async def aobserve_stream(chunks, collector):
+    chunks = aiter(chunks)
+    while True:
+        with observe_queries(collector):
+            chunk = await anext(chunks, _END)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+class SlowQueryLogMiddleware:
+    """
+    Журнал медленных SQL-запросов из реального трафика.
+
+    Потоковые ответы наблюдаются, пока сервер читает их тело. Запись в БД идёт
+    при закрытии ответа — вне транзакций запроса и вне замеров PerformanceMiddleware,
+    чтобы откат не терял записи, а сама запись и EXPLAIN не попадали ни в журнал,
+    ни в Server-Timing и метрики запроса. Отключается пустым SLOW_QUERY_THRESHOLD_MS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD_MS is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        collector = SlowQueryCollector(settings.SLOW_QUERY_THRESHOLD_MS)
+        with observe_queries(collector):
+            response = self.get_response(request)
+        return self.record_on_close(request, response, collector)
+
+    async def __acall__(self, request):
+        collector = SlowQueryCollector(settings.SLOW_QUERY_THRESHOLD_MS)
+        with observe_queries(collector):
+            response = await self.get_response(request)
+        return self.record_on_close(request, response, collector)
+
+    def record_on_close(self, request, response, collector):
+        if response.streaming:
+            observe = aobserve_stream if response.is_async else observe_stream
+            response.streaming_content = observe(response.streaming_content, collector)
+        close = response.close
+
+        def close_and_record():
+            # Сервер закрывает ответ в синхронном коде (под ASGI — через sync_to_async)
+            try:
+                if collector.captured:
+                    self.record(request, collector.captured)
+            finally:
+                close()
+
+        response.close = close_and_record
+        return response
+
+    @staticmethod
+    def record(request, captured):
+        try:
+            record_slow_queries(captured, metrics.endpoint_label(request))
+        except Exception as e:
+            logger.error(f"Не удалось записать медленные запросы {request.path}: {str(e)}")
@@ -0,0 +1,152 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Рендерер NDJSON: один JSON-объект на строку"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, list):
+            return ''.join(encode_line(item) for item in data).encode(self.charset)
+        return encode_line(data).encode(self.charset)
+
+
+def encode_item(item):
+    """Кодирует один объект так же, как JSONRenderer"""
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_line(item):
+    return encode_item(item) + '\n'
+
+
+def iter_representations(queryset, serializer, chunk_size=None):
+    """Итерирует queryset порциями, не загружая его целиком в память"""
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(obj)
+
+
+def stream_json_array(items, chunk_size):
+    """Отдаёт JSON-массив кусками, накапливая не больше chunk_size объектов"""
+    yield '['
+    buffer = []
+    first = True
+    for item in items:
+        buffer.append(encode_item(item))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']'
+
+
+def stream_ndjson(items, chunk_size):
+    """Отдаёт NDJSON кусками по chunk_size строк"""
+    buffer = []
+    for item in items:
+        buffer.append(encode_line(item))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def aiter_representations(queryset, serializer, chunk_size=None, prepare=None):
+    """
+    Асинхронный вариант iter_representations для async view.
+
+    prepare(objects, context) — корутина, которую ждут перед сериализацией
+    каждой порции: например, чтобы дочитать данные, нужные to_representation.
+    """
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    chunk = []
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            if prepare:
+                await prepare(chunk, serializer.context)
+            for item in chunk:
+                yield serializer.to_representation(item)
+            chunk = []
+    if prepare and chunk:
+        await prepare(chunk, serializer.context)
+    for item in chunk:
+        yield serializer.to_representation(item)
+
+
+async def astream_json_array(items, chunk_size):
+    yield '['
+    buffer = []
+    first = True
+    async for item in items:
+        buffer.append(encode_item(item))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']'
+
+
+async def astream_ndjson(items, chunk_size):
+    buffer = []
+    async for item in items:
+        buffer.append(encode_line(item))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+class StreamingListMixin:
+    """
+    Потоковая выдача списков для ModelViewSet.
+
+    Включается заголовком ``Accept: application/x-ndjson`` (или ``?format=ndjson``)
+    либо параметром ``?stream=1`` — тогда отдаётся обычный JSON-массив, но по частям.
+    """
+
+    def get_renderers(self):
+        return super().get_renderers() + [NDJSONRenderer()]
+
+    def wants_stream(self, request):
+        if getattr(request, 'accepted_renderer', None) and request.accepted_renderer.format == 'ndjson':
+            return True
+        return request.query_params.get('stream') in ('1', 'true')
+
+    def list(self, request, *args, **kwargs):
+        if not self.wants_stream(request):
+            return super().list(request, *args, **kwargs)
+        return self.streaming_list_response(self.filter_queryset(self.get_queryset()))
+
+    def streaming_list_response(self, queryset):
+        chunk_size = settings.STREAMING_CHUNK_SIZE
+        # БД выбираем сейчас: поток читается уже после выхода из view и сброса маршрутизации
+        queryset = queryset.using(queryset.db)
+        # Один сериализатор на весь поток вместо нового объекта на каждую строку
+        serializer = self.get_serializer()
+        items = iter_representations(queryset, serializer, chunk_size)
+        if self.request.accepted_renderer.format == 'ndjson':
+            return StreamingHttpResponse(
+                stream_ndjson(items, chunk_size),
+                content_type='application/x-ndjson; charset=utf-8',
+            )
+        return StreamingHttpResponse(
+            stream_json_array(items, chunk_size),
+            content_type='application/json; charset=utf-8',
+        )
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ChangeEvent
+
+
+class DeltaSyncMixin:
+    """
+    Дельта-синхронизация списков: ?updated_since=<cursor>.
+
+    Возвращает только строки, изменённые после курсора, id удалённых записей
+    (мягко удалённых и жёстко удалённых — по надгробиям ChangeEvent) и новый курсор.
+    Курсор отстаёт от текущего времени на CHANGE_FEED_OVERLAP_SECONDS: строка могла
+    получить updated_at раньше, а зафиксироваться позже чтения. Поэтому часть строк
+    приходит повторно — клиент просто перезаписывает их. Без параметра список отдаётся как обычно.
+    """
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('updated_since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        cursor = parse_datetime(since)
+        if cursor is None:
+            return Response({'error': 'Неверный курсор updated_since'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(cursor):
+            cursor = timezone.make_aware(cursor)
+        # Курсор фиксируем до чтения и с запасом на ещё не зафиксированные транзакции
+        now = timezone.now()
+        next_cursor = now - timedelta(seconds=settings.CHANGE_FEED_OVERLAP_SECONDS)
+        if cursor < now - timedelta(days=settings.CHANGE_EVENT_RETENTION_DAYS):
+            # Надгробия старше срока хранения уже удалены — нужна полная синхронизация
+            return Response({'error': 'Курсор устарел, загрузите список целиком'}, status=status.HTTP_410_GONE)
+
+        model = self.get_queryset().model
+        changed = self.filter_queryset(self.get_queryset()).filter(updated_at__gt=cursor)
+        soft_deleted = model.deleted.filter(updated_at__gt=cursor).values_list('pk', flat=True)
+        hard_deleted = ChangeEvent.objects.filter(
+            model=model.__name__, op='delete', created_at__gt=cursor
+        ).values_list('object_id', flat=True)
+
+        return Response({
+            'results': self.get_serializer(changed, many=True).data,
+            'deleted': sorted(set(soft_deleted) | set(hard_deleted)),
+            'cursor': next_cursor.isoformat(),
+        })
@@ -1,8 +1,54 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Guest
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import AuditLog, Building, BuildingDailyStat, Booking, BookingReportRow, ChangeEvent, Guest, Job, OutboxMessage, Room, RoomDailyStat, SlowQuery, User
+from .reports import rebuild_report_rows
+from . import rollups
+from .rollups import occupancy_report, rebuild_rollups
+from .db_routing import ReplicaRouter, _read_from_replica, _wrote, recently_wrote
+from . import query_observers
+from .metrics import registry
+from .slow_queries import normalize_sql
+from .perfdata import seed_perf_data
+from .benchmarks import ENDPOINTS, SERIALIZERS, UNBUDGETED, api_url_names, benchmark_endpoint, benchmark_serializer, endpoint_name
+from .serializers import BookingSerializer, GuestSerializer
+from .loadtest import LOADTEST_USER_PREFIX, Recorder, VirtualUser, WSGIDriver, ensure_load_users
+from .middleware import ErrorHandlingMiddleware
+from .lifecycle import LifecycleScheduler
+from .messaging import FileBackend, OutboxWorker
+from .jobs import JobProgress, JobWorker, purge_expired_results
+from .catalogue import Catalogue, Snapshot, catalogue, current_version
+from .events import fetch_events
+from .exports import CSVRenderer, XLSXRenderer
+from .profiling import parse_import_times
+from .views import GuestViewSet, UserViewSet
 
 # Create your tests here.
 
@@ -15,3 +61,1351 @@ class GuestApiTest(APITestCase):
         url = reverse('guest-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class StreamingListTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Guest.objects.create(full_name=f'Гость {i}', phone=f'+99670000000{i}')
+
+    def read_stream(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_stream(self):
+        response = self.client.get(reverse('guest-list'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = self.read_stream(response).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['full_name'], 'Гость 0')
+
+    def test_json_stream_matches_regular_list(self):
+        regular = self.client.get(reverse('guest-list')).json()
+        response = self.client.get(reverse('guest-list'), {'stream': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(self.read_stream(response)), regular)
+
+
+class ReportExportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=1000)
+        now = timezone.now()
+        for i, booking_status in enumerate(['active', 'cancelled']):
+            guest = Guest.objects.create(full_name=f'Гость {i}', phone=f'+99670000000{i}', inn=f'1234567890123{i}')
+            Booking.objects.create(
+                guest=guest, room=room, people_count=1, status=booking_status,
+                check_in=now + timedelta(days=10 * i + 1), check_out=now + timedelta(days=10 * i + 3),
+            )
+
+    def test_csv_export_with_filters(self):
+        response = self.client.get(reverse('report-export'), {'format': 'csv', 'status': 'active'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['ID', 'Номер', 'Здание'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][5], 'Гость 0')
+        self.assertEqual(rows[1][4], 'Активный')
+
+    def test_xlsx_export_is_valid_zip(self):
+        response = self.client.get(reverse('report-export'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Гость 1', sheet)
+
+    def test_invalid_filter_returns_json_error(self):
+        response = self.client.get(reverse('report-export'), {'format': 'csv', 'date_from': 'вчера'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+    def test_renderers_render_plain_responses(self):
+        body = CSVRenderer().render({'error': 'Неверная дата'}).decode('utf-8-sig')
+        self.assertEqual(list(csv.reader(io.StringIO(body))), [['Поле', 'Значение'], ['error', 'Неверная дата']])
+        archive = zipfile.ZipFile(io.BytesIO(XLSXRenderer().render([{'id': 1, 'name': 'А'}, {'id': 2, 'name': None}])))
+        self.assertEqual(archive.read('xl/worksheets/sheet1.xml').decode('utf-8').count('<row>'), 3)
+
+
+class GuestSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        self.ivanov = Guest.objects.create(full_name='Иванов Иван', phone='+996 (700) 12-34-56', inn='12345678901234')
+        self.petrov = Guest.objects.create(full_name='Петров Пётр', phone='+996555987654', inn='98765432109876')
+        Guest.objects.create(full_name='Иванова Анна', phone='+996700000001', is_deleted=True)
+
+    def search(self, q):
+        response = self.client.get(reverse('guest-search'), {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()]
+
+    def test_digits_are_normalised_on_save(self):
+        self.ivanov.refresh_from_db()
+        self.assertEqual(self.ivanov.phone_digits, '996700123456')
+        self.assertEqual(self.ivanov.inn_digits, '12345678901234')
+
+    def test_search_by_phone_in_local_format(self):
+        self.assertEqual(self.search('0700 12'), [self.ivanov.id])
+
+    def test_search_by_inn_prefix(self):
+        self.assertEqual(self.search('98765'), [self.petrov.id])
+
+    def test_search_by_name_skips_deleted(self):
+        self.assertEqual(self.search('Иванов'), [self.ivanov.id])
+
+
+class RollupTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        self.building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=self.building, number='101', capacity=2, room_type='Двухместный', price_per_night=1000)
+        Room.objects.create(building=self.building, number='102', capacity=2, room_type='Двухместный', price_per_night=1000)
+        self.guest = Guest.objects.create(full_name='Гость', phone='+996700000000')
+        self.start = timezone.localdate() + timedelta(days=5)
+        # Срез корпуса пересобирается после коммита бронирования
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = Booking.objects.create(
+                guest=self.guest, room=self.room, people_count=1, payment_status='paid',
+                check_in=self.at(self.start), check_out=self.at(self.start + timedelta(days=3)),
+            )
+
+    def at(self, day):
+        return timezone.make_aware(datetime.combine(day, time(12)))
+
+    def test_booking_save_updates_rollups(self):
+        stats = RoomDailyStat.objects.filter(room=self.room).order_by('date')
+        self.assertEqual([s.date for s in stats], [self.start + timedelta(days=i) for i in range(3)])
+        self.assertEqual(sum(s.revenue for s in stats), Decimal('3000'))
+        self.assertEqual(BuildingDailyStat.objects.get(date=self.start).paid_amount, Decimal('1000'))
+
+        # Перенос брони убирает старые ночи и добавляет новые
+        self.booking.check_in = self.at(self.start + timedelta(days=10))
+        self.booking.check_out = self.at(self.start + timedelta(days=11))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.save()
+        self.assertEqual(list(stats.values_list('date', flat=True)), [self.start + timedelta(days=10)])
+        self.assertFalse(BuildingDailyStat.objects.filter(date=self.start).exists())
+
+    def test_rebuild_matches_incremental(self):
+        incremental = list(RoomDailyStat.objects.order_by('date').values_list('date', 'revenue', 'paid_amount'))
+        rebuild_rollups()
+        self.assertEqual(list(RoomDailyStat.objects.order_by('date').values_list('date', 'revenue', 'paid_amount')), incremental)
+
+    def test_occupancy_report(self):
+        response = self.client.get(reverse('report-occupancy'), {
+            'date_from': self.start.isoformat(),
+            'date_to': (self.start + timedelta(days=4)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['occupied_nights'], 3)
+        self.assertEqual(data['available_nights'], 10)
+        self.assertEqual(Decimal(data['occupancy_rate']), Decimal('30.00'))
+        self.assertEqual(Decimal(data['adr']), Decimal('1000.00'))
+        self.assertEqual(Decimal(data['revpar']), Decimal('300.00'))
+
+
+class BookingReportRowTest(APITestCase):
+    def setUp(self):
+        self.building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=self.building, number='101', capacity=2, room_type='Двухместный', price_per_night=1000)
+        self.guest = Guest.objects.create(full_name='Гость', phone='+996700000000')
+        now = timezone.now()
+        self.booking = Booking.objects.create(
+            guest=self.guest, room=self.room, people_count=1,
+            check_in=now + timedelta(days=1), check_out=now + timedelta(days=3),
+        )
+
+    def test_row_follows_related_changes(self):
+        row = BookingReportRow.objects.get(booking=self.booking)
+        self.assertEqual((row.guest_name, row.room_number, row.building_name), ('Гость', '101', 'Корпус А'))
+        self.assertEqual(row.total_amount, Decimal('2000'))
+
+        self.guest.full_name = 'Новое Имя'
+        self.guest.save()
+        self.building.name = 'Корпус Б'
+        self.building.save()
+        row.refresh_from_db()
+        self.assertEqual((row.guest_name, row.building_name), ('Новое Имя', 'Корпус Б'))
+
+    def test_soft_deleted_booking_is_removed(self):
+        self.booking.soft_delete()
+        self.assertFalse(BookingReportRow.objects.exists())
+        self.assertEqual(rebuild_report_rows(), 0)
+
+    def test_rebuild_with_migration_models(self):
+        # Так таблицу заполняет миграция 0008: модели без менеджера живых записей
+        Booking.objects.create(guest=self.guest, room=self.room, people_count=1, is_deleted=True,
+                               check_in=timezone.now() + timedelta(days=5), check_out=timezone.now() + timedelta(days=6))
+        BookingReportRow.objects.all().delete()
+        self.assertEqual(rebuild_report_rows(apps=django_apps), 1)
+        self.assertEqual(BookingReportRow.objects.get().booking_id, self.booking.pk)
+        self.booking.restore()
+        self.assertEqual(BookingReportRow.objects.count(), 1)
+
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+
+    def test_signals_record_change_events(self):
+        self.building.name = 'Корпус Б'
+        self.building.save()
+        events = [e.as_message() for e in ChangeEvent.objects.filter(model='Building')]
+        self.assertEqual([e['op'] for e in events], ['create', 'update'])
+        self.assertEqual(events[-1]['id'], self.building.id)
+
+    async def test_stream_replays_from_version(self):
+        response = await self.async_client.get(reverse('change-feed'), {'token': self.token, 'since': 0, 'models': 'Building'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        payload = (await anext(chunks)).decode()
+        await chunks.aclose()
+        self.assertIn('event: change', payload)
+        data = json.loads(payload.split('data: ')[1])
+        self.assertEqual((data['model'], data['op'], data['id']), ('Building', 'create', self.building.id))
+
+    async def test_late_committed_event_is_delivered_once(self):
+        first = await ChangeEvent.objects.acreate(model='Booking', object_id=1, op='create')
+        second = await ChangeEvent.objects.acreate(model='Booking', object_id=2, op='create')
+        # Курсор уже прошёл second, а first зафиксировался позже
+        late, fresh = await fetch_events(second.id, ['Booking'], 10, {second.id: second.created_at})
+        self.assertEqual(([e.id for e in late], fresh), ([first.id], []))
+        late, fresh = await fetch_events(second.id, ['Booking'], 10, {first.id: first.created_at, second.id: second.created_at})
+        self.assertEqual((late, fresh), ([], []))
+        with override_settings(CHANGE_FEED_OVERLAP_SECONDS=0):
+            self.assertEqual(await fetch_events(second.id, ['Booking'], 10), ([], []))
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get(reverse('change-feed'))
+        self.assertEqual(response.status_code, 401)
+
+
+class DeltaSyncTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.old = Guest.objects.create(full_name='Старый', phone='+996700000001')
+        self.removed = Guest.objects.create(full_name='Удалённый', phone='+996700000002')
+        self.purged = Guest.objects.create(full_name='Стёртый', phone='+996700000003')
+        self.cursor = timezone.now()
+        Guest.objects.filter(pk=self.old.pk).update(updated_at=self.cursor - timedelta(minutes=1))
+
+    def test_set_based_update_touches_updated_at(self):
+        Guest.objects.filter(pk=self.old.pk).update(status='vip')
+        self.old.refresh_from_db()
+        self.assertGreater(self.old.updated_at, self.cursor)
+
+    def test_updated_since_returns_changes_and_tombstones(self):
+        Guest.objects.filter(pk__in=[self.removed.pk, self.purged.pk]).update(updated_at=self.cursor - timedelta(minutes=1))
+        fresh = Guest.objects.create(full_name='Новый', phone='+996700000004')
+        self.removed.soft_delete()
+        response = self.client.post(f'/api/trash/delete/guests/{self.purged.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('guest-list'), {'updated_since': self.cursor.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([g['id'] for g in data['results']], [fresh.id])
+        self.assertEqual(data['deleted'], sorted([self.removed.id, self.purged.id]))
+        self.assertLess(parse_datetime(data['cursor']), timezone.now() - timedelta(seconds=settings.CHANGE_FEED_OVERLAP_SECONDS - 1))
+
+    def test_cursor_overlaps_late_commits(self):
+        requested_at = timezone.now()
+        cursor = self.client.get(reverse('guest-list'), {'updated_since': self.cursor.isoformat()}).json()['cursor']
+        # Строка получила updated_at до первого ответа, а зафиксировалась после него
+        Guest.objects.filter(pk=self.old.pk).update(updated_at=requested_at - timedelta(seconds=1))
+        data = self.client.get(reverse('guest-list'), {'updated_since': cursor}).json()
+        self.assertIn(self.old.id, [g['id'] for g in data['results']])
+
+    def test_expired_cursor(self):
+        response = self.client.get(reverse('guest-list'), {'updated_since': (self.cursor - timedelta(days=365)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class BatchRequestTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        self.guest = Guest.objects.create(full_name='Гость', phone='+996700000000')
+
+    def test_batch_runs_subrequests(self):
+        response = self.client.post(reverse('batch'), {'requests': [
+            {'id': 'guests', 'url': '/api/guests/'},
+            {'id': 'guest', 'url': f'/api/guests/{self.guest.id}/'},
+            {'id': 'search', 'url': '/api/guests/search/?q=Гость'},
+            {'id': 'missing', 'url': '/api/nowhere/'},
+            {'id': 'stream', 'url': '/api/guests/?stream=1'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['responses']
+        self.assertEqual(results['guests']['status'], 200)
+        self.assertEqual(results['guests']['body'][0]['full_name'], 'Гость')
+        self.assertEqual(results['guest']['body']['id'], self.guest.id)
+        self.assertEqual(results['search']['body'][0]['id'], self.guest.id)
+        self.assertEqual(results['missing']['status'], 404)
+        self.assertEqual(results['stream']['status'], 400)
+
+    def test_replica_reads_do_not_leak_between_subrequests(self):
+        seen = {}
+
+        def spy(name, original):
+            def action(view, request, *args, **kwargs):
+                seen[name] = _read_from_replica.get()
+                return original(view, request, *args, **kwargs)
+            return action
+
+        with mock.patch.object(GuestViewSet, 'list', spy('guests', GuestViewSet.list)), \
+                mock.patch.object(UserViewSet, 'me', spy('me', UserViewSet.me)):
+            response = self.client.post(reverse('batch'), {'requests': [
+                {'id': 'guests', 'url': '/api/guests/'},
+                {'id': 'me', 'url': '/api/users/me/'},
+            ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(seen, {'guests': True, 'me': False})
+
+    def test_batch_limit(self):
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            response = self.client.post(reverse('batch'), {'requests': ['/api/guests/'] * 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_requires_auth(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('batch'), {'requests': ['/api/guests/']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ReplicaRoutingTest(APITestCase):
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        self.router = ReplicaRouter()
+        cache.clear()
+
+    def route(self, allow_replica, wrote=False):
+        read_token = _read_from_replica.set(allow_replica)
+        wrote_token = _wrote.set(wrote)
+        try:
+            return self.router.db_for_read(Guest)
+        finally:
+            _read_from_replica.reset(read_token)
+            _wrote.reset(wrote_token)
+
+    def test_router_uses_replica_only_when_allowed(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertEqual(self.route(True), 'replica')
+            self.assertEqual(self.route(False), 'default')
+            # После записи в том же запросе чтения идут на основную БД
+            self.assertEqual(self.route(True, wrote=True), 'default')
+            self.assertFalse(self.router.allow_migrate('replica', 'booking'))
+        if 'replica' not in settings.DATABASES:
+            self.assertEqual(self.route(True), 'default')
+
+    def test_recent_writer_stays_on_primary(self):
+        self.assertFalse(recently_wrote(self.user))
+        self.client.post(reverse('guest-list'), {'full_name': 'Гость', 'phone': '+996700000000'})
+        self.assertTrue(recently_wrote(self.user))
+
+    @skipUnless('replica' in settings.DATABASES, 'Реплика не настроена')
+    def test_list_reads_from_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(reverse('guest-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(replica_queries.captured_queries)
+
+    @skipUnless('replica' in settings.DATABASES, 'Реплика не настроена')
+    def test_streamed_list_reads_from_replica(self):
+        response = self.client.get(reverse('guest-list'), {'stream': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Поток читается уже после выхода из view — маршрутизация к этому моменту сброшена
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            b''.join(response.streaming_content)
+        self.assertTrue(replica_queries.captured_queries)
+
+
+class PerformanceMetricsTest(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.superadmin = User.objects.create_user(username='root', password='pass', role='superadmin')
+        Guest.objects.create(full_name='Гость', phone='+996700000000')
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('guest-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'serialize;dur=', 'render;dur=', 'total;dur=', 'size;desc='):
+            self.assertIn(metric, header)
+
+    def test_metrics_superadmin_only(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse('guest-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.superadmin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('femida_request_duration_seconds_bucket{endpoint="guest-list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('femida_request_queries_count{endpoint="guest-list",method="GET"} 1', body)
+
+
+class RequestProfilerTest(APITestCase):
+    def setUp(self):
+        self.dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dump_dir, ignore_errors=True)
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.superadmin = User.objects.create_user(username='root', password='pass', role='superadmin')
+        Guest.objects.create(full_name='Гость', phone='+996700000000')
+
+    def auth(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_superadmin_profile_is_saved_and_listed(self):
+        self.auth(self.superadmin)
+        with self.settings(PROFILE_DUMP_DIR=self.dump_dir, PROFILE_MAX_DUMPS=2):
+            names = [self.client.get(reverse('guest-list'), {'_profile': '1'})['X-Profile-Id'] for _ in range(3)]
+            listing = self.client.get(reverse('profile-list')).json()
+            detail = self.client.get(reverse('profile-detail', args=[names[-1]])).json()
+
+        self.assertEqual(len(listing), 2)
+        self.assertNotIn(names[0], [item['name'] for item in listing])
+        self.assertEqual(detail['view'], 'guest-list')
+        self.assertTrue(detail['queries'])
+        self.assertTrue(any(query.get('explain') for query in detail['queries']))
+        self.assertIn('cumulative', detail['stats'])
+
+    def test_profile_ignored_for_admin(self):
+        self.auth(self.admin)
+        with self.settings(PROFILE_DUMP_DIR=self.dump_dir):
+            response = self.client.get(reverse('guest-list'), HTTP_X_PROFILE='1')
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertEqual(self.client.get(reverse('profile-list')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SlowQueryLogTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        Guest.objects.create(full_name='Гость', phone='+996700000000')
+
+    def test_normalize_sql_groups_in_lists(self):
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 10'),
+            normalize_sql('SELECT *  FROM t WHERE id IN (%s, %s) AND x = 7'),
+        )
+
+    def test_slow_queries_aggregated_by_fingerprint(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0):
+            self.client.get(reverse('guest-list'))
+            self.client.get(reverse('guest-list'))
+
+        entry = SlowQuery.objects.get(sql__contains='FROM "booking_guest"', endpoint='guest-list')
+        self.assertEqual(entry.count, 2)
+        self.assertEqual(len(entry.samples), 2)
+        self.assertGreaterEqual(entry.max_ms, entry.p95_ms)
+        self.assertTrue(entry.explain)
+        self.assertTrue(entry.caller)
+
+    def test_streamed_queries_are_logged_after_the_body(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0):
+            response = self.client.get(reverse('guest-list'), {'stream': '1'})
+            self.assertFalse(SlowQuery.objects.filter(sql__contains='FROM "booking_guest"').exists())
+            # Список читается из БД, пока сервер отдаёт тело ответа
+            b''.join(response.streaming_content)
+        self.assertTrue(SlowQuery.objects.filter(sql__contains='FROM "booking_guest"', endpoint='guest-list').exists())
+
+    def test_recording_is_outside_request_metrics(self):
+        observers = []
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0), \
+                mock.patch('booking.slow_queries.record_slow_queries', side_effect=lambda *args: observers.append(query_observers._observers.get())):
+            self.client.get(reverse('guest-list'))
+        self.assertEqual(observers, [()])
+
+
+class PerfDataAndQueryBudgetTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='root', password='pass', email='root@example.com')
+        cls.counts = seed_perf_data(buildings=1, rooms_per_building=4, guests=15, years=1, audit=20, seed=7)
+        # Корзина, готовая задача и лента событий — чтобы N+1 было видно и в этих эндпоинтах
+        now = timezone.now()
+        buildings = Building.all_objects.bulk_create(
+            Building(name=f'Снесён {i}', address='ул. Старая', is_deleted=True) for i in range(2))
+        rooms = Room.all_objects.bulk_create(
+            Room(building=building, number=f'90{i}', capacity=2, price_per_night=1000, is_deleted=True)
+            for i, building in enumerate(buildings))
+        guests = Guest.all_objects.bulk_create(
+            Guest(full_name=f'Удалён {i}', phone=f'+99670000009{i}', is_deleted=True) for i in range(2))
+        Booking.all_objects.bulk_create(
+            Booking(guest=guest, room=room, people_count=1, is_deleted=True,
+                    check_in=now - timedelta(days=3), check_out=now - timedelta(days=1))
+            for guest, room in zip(guests, rooms))
+        Job.objects.create(kind='report_export', status='done', created_by=cls.user,
+                           result_file='bench.csv', result_name='report.csv')
+        ChangeEvent.objects.bulk_create(ChangeEvent(model='Guest', object_id=pk, op='update')
+                                        for pk in Guest.objects.values_list('pk', flat=True)[:3])
+
+    def setUp(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        with open(os.path.join(tempdir, 'bench.csv'), 'w') as result:
+            result.write('id\n')
+        settings_override = self.settings(JOBS_RESULT_DIR=tempdir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_seed_creates_consistent_data(self):
+        self.assertEqual(Room.objects.count(), 4)
+        self.assertEqual(Booking.objects.count(), self.counts['bookings'])
+        self.assertEqual(BookingReportRow.objects.count(), self.counts['bookings'])
+        for room in Room.objects.all():
+            previous_check_out = None
+            for booking in room.bookings.order_by('check_in'):
+                if previous_check_out:
+                    self.assertGreaterEqual(booking.check_in, previous_check_out)
+                previous_check_out = booking.check_out
+
+    def test_endpoint_query_budgets(self):
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=endpoint_name(endpoint)):
+                result = benchmark_endpoint(endpoint, self.user, repeat=1)
+                self.assertEqual(result['status'], status.HTTP_200_OK)
+                self.assertLessEqual(result['queries'], endpoint.budget)
+
+    def test_every_api_endpoint_has_budget(self):
+        budgeted = {endpoint.url_name for endpoint in ENDPOINTS}
+        self.assertEqual(api_url_names() - budgeted - UNBUDGETED, set())
+
+    def test_serializer_query_budgets(self):
+        for case in SERIALIZERS:
+            with self.subTest(serializer=case.name):
+                result = benchmark_serializer(case, repeat=1)
+                self.assertLessEqual(result['queries'], case.budget)
+
+    def test_total_spent_matches_unannotated_guest(self):
+        guest = Guest.objects.filter(bookings__payment_status='paid').first()
+        annotated = Guest.objects.with_paid_total().get(pk=guest.pk)
+        self.assertEqual(GuestSerializer(annotated).data['total_spent'], GuestSerializer(guest).data['total_spent'])
+
+
+class LoadReplayDriverTest(TestCase):
+    def setUp(self):
+        # Как тестовый клиент Django: иначе обработчик WSGI закроет соединение с транзакцией теста
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def test_wsgi_driver_logs_in_and_searches(self):
+        ensure_load_users(1, 'secret-pass')
+        Guest.objects.create(full_name='Иванов Иван', phone='+996700000000')
+        driver = WSGIDriver(get_wsgi_application())
+        recorder = Recorder()
+        fixtures = {'search_terms': ['Ива']}
+        user = VirtualUser(driver, recorder, f'{LOADTEST_USER_PREFIX}0', 'secret-pass', fixtures, random.Random(1))
+
+        user.login()
+        self.assertTrue(user.token)
+        user.search()
+        rows = {row['name']: row for row in recorder.summary(1.0)}
+        self.assertEqual(rows['login']['statuses'], {200: 1})
+        self.assertEqual(rows['guest-search']['statuses'], {200: 1})
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = Booking.objects.create(
+                guest=self.guest, room=self.room, people_count=1, payment_status='paid',
+                check_in=now - timedelta(days=1), check_out=now + timedelta(days=2),
+            )
+
+    async def read(self, response):
+        return b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8-sig')
+
+    async def test_requires_token(self):
+        response = await self.async_client.get(reverse('async-dashboard'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_resource_list_streams_like_sync_api(self):
+        response = await self.async_client.get(reverse('async-resource-list', args=['bookings']), {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(await self.read(response))
+        self.assertEqual([b['id'] for b in data], [self.booking.id])
+        self.assertEqual(data[0]['room']['building']['name'], 'Корпус А')
+        self.assertEqual(data[0]['guest']['full_name'], 'Асанов Айбек')
+
+        response = await self.async_client.get(reverse('async-resource-list', args=['guests']), {'token': self.token, 'format': 'ndjson'})
+        lines = (await self.read(response)).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.guest.id])
+
+        response = await self.async_client.get(reverse('async-resource-list', args=['users']), {'token': self.token})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_room_missing_from_snapshot_is_read_before_serialization(self):
+        # Снимок старше номера: сериализатор не должен лениво идти в БД из async-кода
+        stale = Snapshot(None, {}, {})
+        with mock.patch.object(catalogue, 'asnapshot', mock.AsyncMock(return_value=stale)):
+            response = await self.async_client.get(reverse('async-resource-list', args=['bookings']), {'token': self.token})
+            data = json.loads(await self.read(response))
+            self.assertEqual(data[0]['room']['number'], '101')
+            response = await self.async_client.get(reverse('async-dashboard'), {'token': self.token})
+            self.assertEqual(response.json()['recent_bookings'][0]['room']['building']['name'], 'Корпус А')
+
+    async def test_dashboard(self):
+        response = await self.async_client.get(reverse('async-dashboard'), {'token': self.token})
+        data = response.json()
+        self.assertEqual(data['rooms']['busy'], 1)
+        self.assertEqual(data['total_rooms'], 1)
+        self.assertEqual((data['total_bookings'], data['pending_payments'], data['total_guests']), (1, 0, 1))
+        self.assertEqual([b['id'] for b in data['recent_bookings']], [self.booking.id])
+
+    async def test_calendar_and_reports(self):
+        response = await self.async_client.get(reverse('async-calendar'), {'token': self.token})
+        data = response.json()
+        self.assertEqual([b['id'] for b in data['bookings']], [self.booking.id])
+        self.assertEqual([r['id'] for r in data['rooms']], [self.room.id])
+
+        response = await self.async_client.get(reverse('async-report-occupancy'), {'token': self.token})
+        today = timezone.localdate()
+        expected = await sync_to_async(occupancy_report)(today - timedelta(days=29), today)
+        self.assertEqual(response.json()['occupied_nights'], expected['occupied_nights'])
+        self.assertGreater(expected['occupied_nights'], 0)
+
+        response = await self.async_client.get(reverse('async-report-export'), {'token': self.token, 'search': 'Асанов'})
+        rows = list(csv.reader(io.StringIO(await self.read(response))))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.booking.id)])
+
+    async def test_error_middleware_in_async_mode(self):
+        async def failing(request):
+            raise RuntimeError('boom')
+
+        middleware = ErrorHandlingMiddleware(failing)
+        response = await middleware(RequestFactory().get('/api/rooms/'))
+        self.assertEqual(response.status_code, 500)
+        with self.assertRaises(RuntimeError):
+            await middleware(RequestFactory().get('/admin/'))
+
+
+def booking_payload(guest, room, days=1):
+    start = timezone.now() + timedelta(days=days)
+    return {
+        'guest_id': guest.pk, 'room_id': room.pk, 'people_count': 1,
+        'check_in': start.isoformat(), 'check_out': (start + timedelta(days=2)).isoformat(),
+    }
+
+
+class BookingRoomLockTest(TestCase):
+    def setUp(self):
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+
+    def test_conflict_after_validation_is_rejected(self):
+        serializer = BookingSerializer(data=booking_payload(self.guest, self.room))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Другой запрос успел забронировать номер между validate() и save()
+        data = serializer.validated_data
+        Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                               check_in=data['check_in'], check_out=data['check_out'])
+        with self.assertRaisesMessage(Exception, 'Номер уже забронирован'):
+            serializer.save()
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_update_without_moving_skips_recheck(self):
+        booking = Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                                         check_in=timezone.now() + timedelta(days=1), check_out=timezone.now() + timedelta(days=3))
+        serializer = BookingSerializer(booking, data={'payment_status': 'paid'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().payment_status, 'paid')
+
+    def test_reactivating_cancelled_booking_is_rechecked(self):
+        check_in, check_out = timezone.now() + timedelta(days=1), timezone.now() + timedelta(days=3)
+        cancelled = Booking.objects.create(guest=self.guest, room=self.room, people_count=1, status='cancelled',
+                                           check_in=check_in, check_out=check_out)
+        Booking.objects.create(guest=self.guest, room=self.room, people_count=1, check_in=check_in, check_out=check_out)
+        serializer = BookingSerializer(cancelled, data={'status': 'active'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaisesMessage(ValidationError, 'Номер уже забронирован'):
+            serializer.save()
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+
+@skipUnlessDBFeature('has_select_for_update', 'has_select_for_update_nowait')
+class BookingConcurrencyTest(TransactionTestCase):
+    """Настоящие параллельные транзакции: нужна БД со SELECT … FOR UPDATE (PostgreSQL)"""
+
+    def setUp(self):
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.rooms = [
+            Room.objects.create(building=building, number=str(100 + i), capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+            for i in range(2)
+        ]
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+
+    def run_threads(self, target, count):
+        errors = []
+
+        def worker(index):
+            try:
+                target(index)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_same_room_is_booked_once(self):
+        barrier = threading.Barrier(6)
+
+        def create(index):
+            serializer = BookingSerializer(data=booking_payload(self.guest, self.rooms[0]))
+            serializer.is_valid(raise_exception=True)
+            barrier.wait()
+            serializer.save()
+
+        errors = self.run_threads(create, 6)
+        self.assertEqual(Booking.objects.filter(room=self.rooms[0]).count(), 1)
+        self.assertEqual(len(errors), 5)
+        for error in errors:
+            self.assertIsInstance(error, ValidationError)
+            self.assertIn('Номер уже забронирован', str(error.detail))
+
+    def test_other_rooms_book_concurrently(self):
+        # Разные номера одного корпуса на одни и те же ночи: все брони проходят,
+        # а срез корпуса собирается из обоих номеров
+        for attempt in range(3):
+            barrier = threading.Barrier(len(self.rooms))
+
+            def create(index):
+                serializer = BookingSerializer(data=booking_payload(self.guest, self.rooms[index], days=1 + 5 * attempt))
+                serializer.is_valid(raise_exception=True)
+                barrier.wait()
+                serializer.save()
+
+            self.assertEqual(self.run_threads(create, len(self.rooms)), [])
+        self.assertEqual(Booking.objects.count(), 3 * len(self.rooms))
+        nights = BuildingDailyStat.objects.values_list('occupied_nights', flat=True)
+        self.assertEqual(len(nights), 3 * 2)
+        self.assertEqual(set(nights), {len(self.rooms)})
+
+    def test_other_rooms_are_not_blocked(self):
+        # Бронь номера A держит транзакцию открытой — бронь номера B того же корпуса не ждёт её
+        saved = threading.Event()
+        release = threading.Event()
+        done = threading.Event()
+
+        def hold_booking(index):
+            serializer = BookingSerializer(data=booking_payload(self.guest, self.rooms[0]))
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                serializer.save()
+                saved.set()
+                release.wait(10)
+
+        def book_other_room(index):
+            serializer = BookingSerializer(data=booking_payload(self.guest, self.rooms[1]))
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            done.set()
+
+        errors = []
+        holder = threading.Thread(target=lambda: errors.extend(self.run_threads(hold_booking, 1)))
+        other = threading.Thread(target=lambda: errors.extend(self.run_threads(book_other_room, 1)))
+        holder.start()
+        try:
+            self.assertTrue(saved.wait(10))
+            other.start()
+            self.assertTrue(done.wait(5))
+        finally:
+            release.set()
+            holder.join()
+            if other.is_alive() or done.is_set():
+                other.join()
+        self.assertEqual(errors, [])
+        nights = BuildingDailyStat.objects.values_list('occupied_nights', flat=True)
+        self.assertEqual(list(nights), [len(self.rooms)] * 2)
+
+    def test_booking_saved_during_rebuild(self):
+        booking = BookingSerializer(data=booking_payload(self.guest, self.rooms[0]))
+        booking.is_valid(raise_exception=True)
+        booking = booking.save()
+        first_night = timezone.localdate(booking.check_in)
+        rebuilding = threading.Event()
+        release = threading.Event()
+        room_batches = rollups._room_batches
+
+        def slow_batches(*args):
+            rebuilding.set()
+            release.wait(10)
+            yield from room_batches(*args)
+
+        def move_booking(index):
+            # Сдвиг на сутки: пересчитываются и старые ночи, которые пересобирает rebuild
+            serializer = BookingSerializer(booking, data={
+                'check_in': (booking.check_in + timedelta(days=1)).isoformat(),
+                'check_out': (booking.check_out + timedelta(days=1)).isoformat(),
+            }, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        errors = []
+        with mock.patch('booking.rollups._room_batches', slow_batches):
+            rebuild = threading.Thread(target=lambda: errors.extend(self.run_threads(lambda index: rebuild_rollups(), 1)))
+            rebuild.start()
+            self.assertTrue(rebuilding.wait(10))
+            writer = threading.Thread(target=lambda: errors.extend(self.run_threads(move_booking, 1)))
+            writer.start()
+            # Запись ждёт пересборку корпуса
+            writer.join(0.5)
+            self.assertTrue(writer.is_alive())
+            release.set()
+            rebuild.join()
+            writer.join()
+        self.assertEqual(errors, [])
+        expected = [first_night + timedelta(days=1 + i) for i in range(2)]
+        self.assertEqual(list(RoomDailyStat.objects.order_by('date').values_list('date', flat=True)), expected)
+        self.assertEqual(list(BuildingDailyStat.objects.order_by('date').values_list('date', 'occupied_nights')),
+                         [(day, 1) for day in expected])
+
+
+class LifecycleSchedulerTest(TestCase):
+    def setUp(self):
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        self.now = timezone.now().replace(microsecond=0)
+        self.booking = Booking.objects.create(
+            guest=self.guest, room=self.room, people_count=1,
+            check_in=self.now + timedelta(hours=1), check_out=self.now + timedelta(hours=3),
+        )
+        self.scheduler = LifecycleScheduler(poll_seconds=86400, clock=lambda: self.now)
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+        return self.scheduler.run_pending()
+
+    def test_wakes_at_check_in_and_check_out(self):
+        self.assertEqual(self.scheduler.run_pending(), {'completed': 0, 'busy': 0, 'free': 0})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'free')
+        self.assertEqual(self.scheduler.seconds_until_next(), 3600)
+        self.assertIsNone(self.advance(minutes=30))
+
+        self.assertEqual(self.advance(minutes=30), {'completed': 0, 'busy': 1, 'free': 0})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'busy')
+
+        self.assertEqual(self.advance(hours=2), {'completed': 1, 'busy': 0, 'free': 1})
+        self.booking.refresh_from_db()
+        self.room.refresh_from_db()
+        self.assertEqual((self.booking.status, self.room.status), ('completed', 'free'))
+        self.assertEqual(BookingReportRow.objects.get(booking_id=self.booking.pk).status, 'completed')
+        self.assertTrue(ChangeEvent.objects.filter(model='Booking', object_id=self.booking.pk, op='update').exists())
+        self.assertEqual(self.scheduler.heap, [])
+
+    def test_new_bookings_are_picked_up_from_change_feed(self):
+        self.scheduler.run_pending()
+        late = Booking.objects.create(
+            guest=self.guest, room=self.room, people_count=1,
+            check_in=self.now + timedelta(hours=5), check_out=self.now + timedelta(hours=6),
+        )
+        self.assertIsNone(self.advance(minutes=1))
+        self.assertIn(late.check_in, self.scheduler.heap)
+
+    def test_late_committed_change_is_not_skipped(self):
+        self.scheduler.run_pending()
+        late = Booking.objects.create(
+            guest=self.guest, room=self.room, people_count=1,
+            check_in=self.now + timedelta(hours=5), check_out=self.now + timedelta(hours=6),
+        )
+        # Курсор уже дальше события этой брони: её транзакция зафиксировалась позже
+        self.scheduler.last_event_id = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() + 10
+        self.assertIsNone(self.advance(minutes=1))
+        self.assertIn(late.check_in, self.scheduler.heap)
+
+
+class FailingBackend:
+    def send_messages(self, messages):
+        return {message.pk: 'провайдер недоступен' for message in messages}
+
+
+class OutboxMessagingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.arriving = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001', email='a@example.com')
+        self.other = Guest.objects.create(full_name='Петров Игорь', phone='+996700000002')
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        check_in = timezone.make_aware(datetime.combine(tomorrow, time(14)))
+        Booking.objects.create(guest=self.arriving, room=room, people_count=1, check_in=check_in, check_out=check_in + timedelta(days=2))
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_send_message_only_enqueues(self):
+        response = self.client.post(reverse('guest-send-message'), {'guest_id': self.other.pk, 'type': 'sms', 'message': 'Добро пожаловать'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.recipient, message.created_by), ('pending', '+996700000002', self.user))
+        self.assertFalse(AuditLog.objects.filter(action='Отправка сообщения').exists())
+
+        response = self.client.post(reverse('guest-send-message'), {'guest_id': self.other.pk, 'type': 'email', 'message': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_send_to_guests_arriving_tomorrow(self):
+        response = self.client.post(reverse('guest-send-bulk'), {'type': 'email', 'message': 'Ждём вас завтра', 'arriving': 'tomorrow'}, format='json')
+        self.assertEqual(response.json()['queued'], 1)
+        self.assertEqual(list(OutboxMessage.objects.values_list('recipient', flat=True)), ['a@example.com'])
+
+        response = self.client.post(reverse('guest-send-bulk'), {'type': 'sms', 'message': 'Всем'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_worker_sends_in_batches_and_audits(self):
+        path = f'{self.tempdir}/outbox.log'
+        self.client.post(reverse('guest-send-bulk'), {'type': 'sms', 'message': 'Акция', 'ids': [self.arriving.pk, self.other.pk]}, format='json')
+        worker = OutboxWorker(rate_per_minute=1, backends={'sms': FileBackend(path)})
+        self.assertEqual(worker.run_once(), {'sent': 1, 'retry': 0, 'failed': 0})
+        # Ограничение скорости: вторая пачка ждёт маркер
+        self.assertIsNone(worker.run_once())
+
+        worker = OutboxWorker(backends={'sms': FileBackend(path)})
+        self.assertEqual(worker.run_once(), {'sent': 1, 'retry': 0, 'failed': 0})
+        with open(path, encoding='utf-8') as f:
+            sent = [json.loads(line) for line in f]
+        self.assertEqual(sorted(item['recipient'] for item in sent), ['+996700000001', '+996700000002'])
+        self.assertEqual(OutboxMessage.objects.filter(status='sent').count(), 2)
+        self.assertEqual(AuditLog.objects.filter(action='Отправка сообщения', user=self.user).count(), 2)
+
+    @override_settings(MESSAGING_MAX_ATTEMPTS=2)
+    def test_failed_sends_are_retried_then_given_up(self):
+        self.client.post(reverse('guest-send-message'), {'guest_id': self.other.pk, 'type': 'sms', 'message': 'x'}, format='json')
+        now = timezone.now()
+        worker = OutboxWorker(backends={'sms': FailingBackend()}, clock=lambda: now)
+        self.assertEqual(worker.run_once(), {'sent': 0, 'retry': 1, 'failed': 0})
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.last_error), ('pending', 'провайдер недоступен'))
+        self.assertIsNone(worker.run_once())
+
+        now = message.next_attempt_at
+        self.assertEqual(worker.run_once(), {'sent': 0, 'retry': 0, 'failed': 1})
+        self.assertEqual(OutboxMessage.objects.get().status, 'failed')
+
+
+class JobQueueTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        now = timezone.now()
+        self.booking = Booking.objects.create(guest=guest, room=room, people_count=1,
+                                              check_in=now + timedelta(days=1), check_out=now + timedelta(days=3))
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        settings_override = self.settings(JOBS_RESULT_DIR=tempdir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.worker = JobWorker(poll_seconds=0)
+
+    def submit(self, kind, params=None):
+        return self.client.post(reverse('job-list'), {'kind': kind, 'params': params or {}}, format='json')
+
+    def test_export_job_lifecycle(self):
+        response = self.submit('report_export', {'format': 'csv', 'filters': {'search': 'Асанов'}})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.json()['id']
+        self.assertEqual(self.client.get(reverse('job-download', args=[job_id])).status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(self.worker.run_once().status, 'done')
+        self.assertIsNone(self.worker.run_once())
+        data = self.client.get(reverse('job-detail', args=[job_id])).json()
+        self.assertEqual((data['status'], data['progress'], data['processed'], data['total']), ('done', 100, 1, 1))
+
+        response = self.client.get(reverse('job-download', args=[job_id]))
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual([row[0] for row in csv.reader(io.StringIO(content))][1:], [str(self.booking.id)])
+
+        other = User.objects.create_user(username='other', password='pass', role='admin')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(reverse('job-detail', args=[job_id])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_results_are_removed(self):
+        job_id = self.submit('report_export', {'format': 'xlsx'}).json()['id']
+        job = self.worker.run_once()
+        Job.objects.filter(pk=job_id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(purge_expired_results(), 1)
+        self.assertFalse(os.path.exists(os.path.join(settings.JOBS_RESULT_DIR, job.result_file)))
+        self.assertEqual(self.client.get(reverse('job-download', args=[job_id])).status_code, status.HTTP_410_GONE)
+
+    def test_validation_and_rollup_permissions(self):
+        self.assertEqual(self.submit('report_export', {'filters': {'room': 'abc'}}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit('rebuild_rollups').status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.role = 'superadmin'
+        self.user.save()
+        self.assertEqual(self.submit('rebuild_rollups').status_code, status.HTTP_202_ACCEPTED)
+        job = self.worker.run_once()
+        self.assertEqual(job.status, 'done')
+        self.assertGreater(job.result['room_days'], 0)
+
+    def test_failed_job_records_error(self):
+        self.submit('report_export')
+        with mock.patch('booking.jobs.iter_report_rows', side_effect=RuntimeError('диск заполнен')):
+            job = self.worker.run_once()
+        self.assertEqual((job.status, job.error), ('failed', 'диск заполнен'))
+        self.assertEqual(os.listdir(settings.JOBS_RESULT_DIR), [])
+
+    def test_heartbeat_is_written_from_own_thread(self):
+        # Пересборка держит транзакцию: прогресс и признак жизни пишет отдельный поток
+        self.user.role = 'superadmin'
+        self.user.save()
+        self.submit('rebuild_rollups')
+        beats = []
+        beaten = threading.Event()
+
+        def beat(progress):
+            beats.append((threading.current_thread() is not threading.main_thread(), progress.processed, progress.job.total))
+            beaten.set()
+
+        def rebuild(progress):
+            progress.set_total(5)
+            progress.advance(3)
+            self.assertTrue(beaten.wait(5))
+            return 0, 0
+
+        with mock.patch.object(JobProgress, 'beat', beat), mock.patch('booking.jobs.rebuild_rollups', side_effect=rebuild):
+            job = self.worker.run_once()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(beats[0], (True, 3, 5))
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='root', password='pass', email='root@example.com')
+        self.client.force_login(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+
+    def add_booking(self, days_from_now):
+        start = timezone.now() + timedelta(days=days_from_now)
+        return Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                                      check_in=start, check_out=start + timedelta(days=1))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_booking_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:booking_booking_changelist')
+        self.add_booking(-1)
+        # Первый запрос процесса ещё и прогревает справочник номеров
+        self.client.get(url)
+        single = self.changelist_queries(url)
+        for day in range(2, 12):
+            self.add_booking(day * 2)
+        self.assertEqual(self.changelist_queries(url), single)
+
+    def test_status_colored_uses_current_stay(self):
+        response = self.client.get(reverse('admin:booking_booking_changelist'))
+        self.assertNotContains(response, 'Занято')
+        booking = self.add_booking(0)
+        Booking.objects.filter(pk=booking.pk).update(check_in=timezone.now() - timedelta(hours=1))
+        response = self.client.get(reverse('admin:booking_booking_changelist'))
+        self.assertContains(response, '<span style="color: red;">Занято</span>', html=True)
+
+    def test_search_by_phone_and_booking_id(self):
+        booking = self.add_booking(3)
+        url = reverse('admin:booking_booking_changelist')
+        change_url = reverse('admin:booking_booking_change', args=[booking.pk])
+        self.assertContains(self.client.get(url, {'q': '0700000001'}), change_url)
+        self.assertContains(self.client.get(url, {'q': str(booking.pk)}), change_url)
+        self.assertNotContains(self.client.get(url, {'q': 'Петров'}), change_url)
+
+
+class SoftDeleteManagerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin', is_staff=True)
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        start = timezone.now() + timedelta(days=1)
+        self.booking = Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                                              check_in=start, check_out=start + timedelta(days=2))
+
+    def test_managers_split_live_and_deleted_rows(self):
+        self.booking.soft_delete()
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(list(Booking.deleted.all()), [self.booking])
+        self.assertEqual(Booking.all_objects.count(), 1)
+        # Связанные менеджеры тоже видят только живые строки, а ForeignKey находит удалённую запись
+        self.assertFalse(self.room.bookings.exists())
+        self.room.soft_delete()
+        self.assertEqual(Booking.all_objects.get().room, self.room)
+
+    def test_restore_finds_deleted_row(self):
+        self.room.soft_delete()
+        self.assertEqual(self.client.get(reverse('room-detail', args=[self.room.pk])).status_code, 404)
+        response = self.client.post(reverse('room-restore', args=[self.room.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Room.objects.filter(pk=self.room.pk).exists())
+
+    def test_trash_lists_and_restores(self):
+        self.guest.soft_delete()
+        response = self.client.get('/api/trash/guests/')
+        self.assertEqual([item['id'] for item in response.json()], [self.guest.pk])
+        response = self.client.post(f'/api/trash/restore/guests/{self.guest.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Guest.deleted.exists())
+
+    def test_overlap_check_ignores_deleted_bookings(self):
+        self.booking.soft_delete()
+        serializer = BookingSerializer(data={
+            'guest_id': self.guest.pk, 'room_id': self.room.pk, 'people_count': 1,
+            'check_in': self.booking.check_in, 'check_out': self.booking.check_out,
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class RoomCatalogueTest(TestCase):
+    def setUp(self):
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        start = timezone.now() + timedelta(days=1)
+        self.booking = Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                                              check_in=start, check_out=start + timedelta(days=2))
+
+    def test_booking_room_is_served_from_memory(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        catalogue.snapshot()
+        with self.assertNumQueries(0):
+            room = BookingSerializer(booking).fields['room'].to_representation(booking)
+        self.assertEqual(room['building'], {'id': self.room.building_id, 'name': 'Корпус А'})
+
+    def test_room_save_invalidates_catalogue(self):
+        catalogue.snapshot()
+        self.room.price_per_night = Decimal('3500')
+        self.room.save()
+        self.assertEqual(catalogue.room_summary(self.room.pk)['price_per_night'], Decimal('3500'))
+
+    def test_occupancy_changes_keep_catalogue(self):
+        snapshot = catalogue.snapshot()
+        version = current_version()
+        # Заселение сейчас: номер становится занятым, но справочник не сбрасывается
+        Booking.objects.create(guest=self.guest, room=self.room, people_count=1,
+                               check_in=timezone.now() - timedelta(hours=1), check_out=timezone.now() + timedelta(hours=1))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'busy')
+        self.assertEqual(current_version(), version)
+        self.assertIs(catalogue.snapshot(check=True), snapshot)
+        self.assertTrue(ChangeEvent.objects.filter(model='Room', object_id=self.room.pk, occupancy_only=True).exists())
+
+    def test_booking_is_priced_from_locked_room(self):
+        catalogue.snapshot()
+        # Цену изменил другой процесс — копия в справочнике этого процесса ещё старая
+        Room.objects.filter(pk=self.room.pk).update(price_per_night=Decimal('4000'))
+        serializer = BookingSerializer(data=booking_payload(self.guest, self.room, days=10))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().total_amount, Decimal('8000'))
+
+    def test_version_check_sees_changes_from_other_processes(self):
+        now = 0
+        local = Catalogue(check_seconds=60, clock=lambda: now)
+        self.assertEqual(local.room_summary(self.room.pk)['number'], '101')
+        # Другой процесс: запись мимо сигналов этого процесса, но с событием в ленте
+        Room.objects.filter(pk=self.room.pk).update(number='102')
+        ChangeEvent.objects.create(model='Room', object_id=self.room.pk, op='update')
+        self.assertEqual(local.room_summary(self.room.pk)['number'], '101')
+        now = 61
+        self.assertEqual(local.room_summary(self.room.pk)['number'], '102')
+
+    def test_room_id_rejects_deleted_room(self):
+        self.room.soft_delete()
+        serializer = BookingSerializer(data=booking_payload(self.guest, self.room))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('room_id', serializer.errors)
+
+
+class RoomOccupancyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        self.room = Room.objects.create(building=building, number='101', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.other_room = Room.objects.create(building=building, number='102', capacity=2, room_type='Двухместный', price_per_night=Decimal('3000'))
+        self.guest = Guest.objects.create(full_name='Асанов Айбек', phone='+996700000001')
+        self.now = timezone.now().replace(microsecond=0)
+
+    def book(self, start_hours, end_hours, room=None):
+        return Booking.objects.create(guest=self.guest, room=room or self.room, people_count=1,
+                                      check_in=self.now + timedelta(hours=start_hours),
+                                      check_out=self.now + timedelta(hours=end_hours))
+
+    def test_free_room_is_free_until_next_check_in(self):
+        booking = self.book(24, 48)
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.status, self.room.current_booking_id), ('free', None))
+        self.assertEqual((self.room.next_check_in, self.room.free_until), (booking.check_in, booking.check_in))
+
+    def test_room_list_shows_current_stay(self):
+        current = self.book(-1, 24)
+        upcoming = self.book(48, 72)
+        response = self.client.get(reverse('room-detail', args=[self.room.pk]))
+        self.assertEqual(response.data['status'], 'busy')
+        self.assertEqual(response.data['current_booking']['id'], current.pk)
+        self.assertEqual(response.data['current_booking']['guest']['full_name'], 'Асанов Айбек')
+        self.assertEqual(parse_datetime(response.data['next_check_in']), upcoming.check_in)
+        self.assertIsNone(response.data['free_until'])
+
+    def test_moving_booking_frees_previous_room(self):
+        booking = self.book(-1, 24)
+        booking.room = self.other_room
+        booking.save()
+        self.room.refresh_from_db()
+        self.other_room.refresh_from_db()
+        self.assertEqual((self.room.status, self.room.current_booking_id), ('free', None))
+        self.assertEqual((self.other_room.status, self.other_room.current_booking_id), ('busy', booking.pk))
+
+    def test_booking_save_updates_room_status_once(self):
+        booking = self.book(-1, 24)
+        with mock.patch.object(Room, 'update_status', autospec=True) as update_status:
+            booking.save()
+        update_status.assert_called_once()
+
+    def test_soft_deleted_booking_frees_room(self):
+        self.book(-1, 24).soft_delete()
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.status, self.room.current_booking_id), ('free', None))
+
+    def test_scheduler_moves_next_check_in_to_current_stay(self):
+        booking = self.book(1, 3)
+        following = self.book(5, 6)
+        scheduler = LifecycleScheduler(poll_seconds=86400, clock=lambda: self.now)
+        scheduler.run_pending()
+        self.now += timedelta(hours=1)
+        scheduler.run_pending()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.current_booking_id, booking.pk)
+        self.assertEqual((self.room.next_check_in, self.room.free_until), (following.check_in, None))
+        self.now += timedelta(hours=2)
+        scheduler.run_pending()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.current_booking_id, None)
+        self.assertEqual(self.room.free_until, following.check_in)
+
+
+class ForecastReportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.user)
+        building = Building.objects.create(name='Корпус А', address='Чолпон-Ата')
+        rooms = [
+            Room.objects.create(building=building, number=number, capacity=2, room_type='Двухместный', price_per_night=1000)
+            for number in ('101', '102')
+        ]
+        guest = Guest.objects.create(full_name='Гость', phone='+996700000000')
+        self.today = timezone.localdate()
+        self.start = self.today + timedelta(days=5)
+        last_year = self.start - timedelta(weeks=52)
+        # Прошлый год: 3 ночи забронированы за 10 дней до STLY, 1 ночь — после
+        for room, offset, nights, created in (
+            (rooms[0], 0, 3, self.today - timedelta(weeks=52, days=10)),
+            (rooms[1], 1, 1, self.today - timedelta(weeks=52) + timedelta(days=2)),
+            (rooms[0], 52 * 7, 2, self.today),
+        ):
+            day = last_year + timedelta(days=offset)
+            booking = Booking.objects.create(
+                guest=guest, room=room, people_count=1,
+                check_in=self.at(day), check_out=self.at(day + timedelta(days=nights)),
+            )
+            Booking.objects.filter(pk=booking.pk).update(created_at=self.at(created))
+
+    def at(self, day):
+        return timezone.make_aware(datetime.combine(day, time(12)))
+
+    def test_pace_and_forecast(self):
+        response = self.client.get(reverse('report-forecast'), {'date_from': self.start.isoformat(), 'days': 5, 'pickup_days': 12})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['on_the_books']['nights'], 2)
+        self.assertEqual(data['stly']['nights'], 3)
+        self.assertEqual(data['ly_actual']['nights'], 4)
+        # Добор прошлого года (1 ночь на второй день) добавляется к текущим бронированиям
+        self.assertEqual([day['forecast'] for day in data['daily']], [1, 2, 0, 0, 0])
+        self.assertEqual(Decimal(data['forecast']['occupancy_rate']), Decimal('30.00'))
+        self.assertEqual(data['buildings'][0]['rooms'], 2)
+        pickup = data['pickup']
+        self.assertEqual([pickup[k]['on_the_books'] for k in (0, 1)], [2, 0])
+        self.assertEqual([pickup[k]['stly'] for k in (0, 10, 11)], [3, 3, 0])
+
+    def test_invalid_params(self):
+        for params in ({'days': '0'}, {'days': '1000'}, {'building': 'x'}, {'date_from': 'вчера'}):
+            response = self.client.get(reverse('report-forecast'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class OpenAPISchemaTest(APITestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'openapi.json')
+
+    def test_schema_built_once_and_served_from_disk(self):
+        with override_settings(OPENAPI_SCHEMA_PATH=self.path):
+            response = self.client.get(reverse('openapi-schema'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            schema = json.loads(b''.join(response.streaming_content))
+            self.assertIn('/reports/forecast/', schema['paths'])
+            with mock.patch('booking.openapi.write_schema') as write_schema:
+                response = self.client.get(reverse('openapi-schema'))
+            write_schema.assert_not_called()
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), schema)
+
+    def test_missing_schema_without_docs(self):
+        with override_settings(OPENAPI_SCHEMA_PATH=self.path, API_DOCS_ENABLED=False):
+            response = self.client.get(reverse('openapi-schema'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_parse_import_times(self):
+        imports = parse_import_times(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       150 |        150 |     numpy._utils\n'
+            'import time:      1653 |      67777 |   numpy\n'
+        )
+        self.assertEqual([row['module'] for row in imports], ['numpy._utils', 'numpy'])
+        self.assertEqual(imports[1]['cumulative_ms'], 67.777)
+        self.assertEqual(imports[0]['depth'], 2)
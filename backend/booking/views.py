@@ -1,14 +1,26 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions
-from .models import Building, Room, Guest, Booking, AuditLog, User
-from .serializers import BuildingSerializer, RoomSerializer, GuestSerializer, BookingSerializer, AuditLogSerializer, UserSerializer
+from rest_framework import mixins, viewsets, permissions
+from .models import Building, Room, Guest, Booking, AuditLog, User, BookingReportRow, Job
+from .serializers import BuildingSerializer, RoomSerializer, GuestSerializer, GuestSearchSerializer, BookingSerializer, AuditLogSerializer, UserSerializer, JobSerializer
+from .streaming import StreamingListMixin
+from .sync import DeltaSyncMixin
+from .db_routing import ReplicaReadMixin
+from .reports import filter_report_rows, parse_forecast_params, parse_occupancy_params
+from .rollups import occupancy_report
+from .search import search_guests
+from .messaging import RECIPIENT_FIELDS, arriving_guests, enqueue_messages
+from .jobs import result_path
+from .permissions import is_superadmin
+from .exports import CSVRenderer, XLSXRenderer, EXPORT_WRITERS, iter_report_rows
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 import logging
 from django.db.models.signals import post_save, post_delete
+from django.db.models import Prefetch
 from django.dispatch import receiver
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
@@ -17,6 +29,11 @@ from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import check_password
 from django.utils import timezone
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from datetime import timedelta
+from pathlib import Path
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -103,7 +120,7 @@ class UserViewSet(viewsets.ModelViewSet):
             logger.error(f"Error in UserViewSet.me: {str(e)}")
             return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class BuildingViewSet(viewsets.ModelViewSet):
+class BuildingViewSet(ReplicaReadMixin, DeltaSyncMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Building.objects.all()
     serializer_class = BuildingSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -114,12 +131,13 @@ class BuildingViewSet(viewsets.ModelViewSet):
         return Response({'success': True})
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
-        instance = self.get_object()
+        # Удалённой записи нет в queryset ViewSet — ищем в корзине
+        instance = get_object_or_404(self.get_queryset().model.deleted, pk=pk)
         instance.restore()
         return Response({'success': True})
 
-class RoomViewSet(viewsets.ModelViewSet):
-    queryset = Room.objects.filter(is_deleted=False)
+class RoomViewSet(ReplicaReadMixin, DeltaSyncMixin, StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Room.objects.select_related('building', 'current_booking__guest')
     serializer_class = RoomSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -144,14 +162,16 @@ class RoomViewSet(viewsets.ModelViewSet):
         return Response({'success': True})
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
-        instance = self.get_object()
+        # Удалённой записи нет в queryset ViewSet — ищем в корзине
+        instance = get_object_or_404(self.get_queryset().model.deleted, pk=pk)
         instance.restore()
         return Response({'success': True})
 
-class GuestViewSet(viewsets.ModelViewSet):
-    queryset = Guest.objects.filter(is_deleted=False)
+class GuestViewSet(ReplicaReadMixin, DeltaSyncMixin, StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Guest.objects.with_paid_total()
     serializer_class = GuestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'retrieve', 'search')
 
     def list(self, request, *args, **kwargs):
         try:
@@ -192,7 +212,8 @@ class GuestViewSet(viewsets.ModelViewSet):
         return Response({'success': True})
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
-        instance = self.get_object()
+        # Удалённой записи нет в queryset ViewSet — ищем в корзине
+        instance = get_object_or_404(self.get_queryset().model.deleted, pk=pk)
         instance.restore()
         return Response({'success': True})
 
@@ -213,9 +234,20 @@ class GuestViewSet(viewsets.ModelViewSet):
         logger.info(f"Удален гость: {guest_name}")
         # Здесь можно добавить уведомление об удалении
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Быстрый поиск гостей для подсказок: /api/guests/search/?q=&limit="""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+        # Не self.get_queryset(): подсказкам не нужна сумма оплат (with_paid_total) — только живые гости
+        guests = search_guests(request.query_params.get('q'), limit=max(limit, 1), queryset=Guest.objects.all())
+        return Response(GuestSearchSerializer(guests, many=True).data)
+
     @action(detail=False, methods=['post'])
     def send_message(self, request):
-        """Отправка сообщения гостю (SMS или email)"""
+        """Постановка сообщения гостю (SMS или email) в очередь отправки"""
         try:
             guest_id = request.data.get('guest_id')
             message_type = request.data.get('type')  # 'sms' или 'email'
@@ -226,6 +258,11 @@ class GuestViewSet(viewsets.ModelViewSet):
                     {'error': 'Необходимы guest_id, type и message'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            if message_type not in RECIPIENT_FIELDS:
+                return Response(
+                    {'error': 'Неверный тип сообщения. Используйте "sms" или "email"'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
             try:
                 guest = Guest.objects.get(id=guest_id)
@@ -235,42 +272,20 @@ class GuestViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            if message_type == 'sms':
-                # Здесь должна быть интеграция с SMS-сервисом
-                # Пока просто логируем
-                logger.info(f"SMS отправлено гостю {guest.full_name} ({guest.phone}): {message}")
-                success_message = f"SMS отправлено на номер {guest.phone}"
-                
-            elif message_type == 'email':
-                if not guest.email:
-                    return Response(
-                        {'error': 'У гостя не указан email'}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                # Здесь должна быть интеграция с email-сервисом
-                # Пока просто логируем
-                logger.info(f"Email отправлен гостю {guest.full_name} ({guest.email}): {message}")
-                success_message = f"Email отправлен на {guest.email}"
-                
-            else:
+            if message_type == 'email' and not guest.email:
                 return Response(
-                    {'error': 'Неверный тип сообщения. Используйте "sms" или "email"'}, 
+                    {'error': 'У гостя не указан email'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Создаем запись в логе
-            AuditLog.objects.create(
-                user=request.user,
-                action='Отправка сообщения',
-                object_type='Guest',
-                object_id=guest.id,
-                details=f'{message_type.upper()} отправлено гостю {guest.full_name}: {message[:50]}...'
-            )
-            
+            # Отправляет воркер run_outbox; он же пишет запись в аудит
+            queued = enqueue_messages(Guest.objects.filter(pk=guest.pk), message_type, message, request.user)
+            recipient = guest.phone if message_type == 'sms' else guest.email
             return Response({
                 'success': True,
-                'message': success_message
-            })
+                'message': f"{'SMS' if message_type == 'sms' else 'Email'} поставлено в очередь на {recipient}",
+                'ids': [item.pk for item in queued],
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             logger.error(f"Ошибка отправки сообщения: {str(e)}")
@@ -279,8 +294,46 @@ class GuestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.filter(is_deleted=False)
+    @action(detail=False, methods=['post'])
+    def send_bulk(self, request):
+        """
+        Массовая рассылка: {type, message} и отбор гостей —
+        arriving (today | tomorrow | YYYY-MM-DD), status, ids.
+        """
+        message_type = request.data.get('type')
+        message = request.data.get('message')
+        if message_type not in RECIPIENT_FIELDS or not message:
+            return Response({'error': 'Необходимы type (sms или email) и message'}, status=status.HTTP_400_BAD_REQUEST)
+
+        guests = Guest.objects.all()
+        arriving = request.data.get('arriving')
+        if arriving:
+            today = timezone.localdate()
+            try:
+                day = {'today': today, 'tomorrow': today + timedelta(days=1)}.get(arriving) or parse_date(str(arriving))
+            except ValueError:
+                day = None
+            if day is None:
+                return Response({'error': 'Неверная дата заезда'}, status=status.HTTP_400_BAD_REQUEST)
+            guests = arriving_guests(day)
+        guest_status = request.data.get('status')
+        if guest_status:
+            guests = guests.filter(status=guest_status)
+        ids = request.data.get('ids')
+        if ids:
+            if not isinstance(ids, list) or not all(str(pk).isdigit() for pk in ids):
+                return Response({'error': 'ids должен быть списком id'}, status=status.HTTP_400_BAD_REQUEST)
+            guests = guests.filter(pk__in=ids)
+        if not (arriving or guest_status or ids):
+            return Response({'error': 'Укажите отбор гостей: arriving, status или ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queued = enqueue_messages(guests, message_type, message, request.user)
+        return Response({'success': True, 'queued': len(queued)}, status=status.HTTP_202_ACCEPTED)
+
+class BookingViewSet(ReplicaReadMixin, DeltaSyncMixin, StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Booking.objects.prefetch_related(
+        Prefetch('guest', queryset=Guest.objects.with_paid_total())
+    )
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -310,11 +363,12 @@ class BookingViewSet(viewsets.ModelViewSet):
         return Response({'success': True})
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
-        instance = self.get_object()
+        # Удалённой записи нет в queryset ViewSet — ищем в корзине
+        instance = get_object_or_404(self.get_queryset().model.deleted, pk=pk)
         instance.restore()
         return Response({'success': True})
 
-class AuditLogViewSet(viewsets.ModelViewSet):
+class AuditLogViewSet(ReplicaReadMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = AuditLog.objects.all().order_by('-timestamp')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -324,19 +378,20 @@ class TrashViewSet(APIView):
 
     def get(self, request, obj_type):
         if obj_type == 'guests':
-            data = Guest.objects.filter(is_deleted=True)
+            data = Guest.deleted.with_paid_total()
             serializer = GuestSerializer(data, many=True)
             return Response(serializer.data)
         elif obj_type == 'rooms':
-            data = Room.objects.filter(is_deleted=True)
+            data = Room.deleted.select_related('building', 'current_booking__guest')
             serializer = RoomSerializer(data, many=True)
             return Response(serializer.data)
         elif obj_type == 'bookings':
-            data = Booking.objects.filter(is_deleted=True)
+            # Гость удалённого бронирования тоже может быть в корзине
+            data = Booking.deleted.prefetch_related(Prefetch('guest', queryset=Guest.all_objects.with_paid_total()))
             serializer = BookingSerializer(data, many=True)
             return Response(serializer.data)
         elif obj_type == 'buildings':
-            data = Building.objects.filter(is_deleted=True)
+            data = Building.deleted.all()
             serializer = BuildingSerializer(data, many=True)
             return Response(serializer.data)
         return Response({'error': 'Invalid type'}, status=400)
@@ -351,7 +406,7 @@ class TrashViewSet(APIView):
         model = model_map.get(obj_type)
         if not model:
             return Response({'error': 'Invalid type'}, status=400)
-        instance = get_object_or_404(model, id=obj_id)
+        instance = get_object_or_404(model.all_objects, id=obj_id)
         if action == 'restore':
             instance.restore()
             return Response({'success': True})
@@ -359,3 +414,121 @@ class TrashViewSet(APIView):
             instance.delete()
             return Response({'success': True})
         return Response({'error': 'Invalid action'}, status=400)
+
+class ReportExportView(ReplicaReadMixin, APIView):
+    """Потоковый экспорт отчёта по бронированиям в CSV/XLSX (?format=csv|xlsx + фильтры отчёта)"""
+    permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('get',)
+    renderer_classes = [CSVRenderer, XLSXRenderer, JSONRenderer]
+
+    def get(self, request):
+        export_format = request.accepted_renderer.format
+        if export_format not in EXPORT_WRITERS:
+            export_format = 'csv'
+        # Читаем денормализованную таблицу отчётов — без соединений с рабочими таблицами
+        queryset = BookingReportRow.objects.order_by('booking_id')
+        try:
+            queryset = filter_report_rows(queryset, request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        writer, content_type = EXPORT_WRITERS[export_format]
+        # БД выбираем сейчас: поток читается уже после выхода из view
+        queryset = queryset.using(queryset.db)
+        response = StreamingHttpResponse(writer(iter_report_rows(queryset)), content_type=content_type)
+        filename = f"report_{timezone.localdate().isoformat()}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Ошибки всегда отдаём в JSON, даже если запрошен CSV/XLSX
+        if isinstance(response, Response):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class OccupancyReportView(ReplicaReadMixin, APIView):
+    """Загрузка, ADR и RevPAR за период по суточным срезам (?date_from=&date_to=&building=)"""
+    permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('get',)
+
+    def get(self, request):
+        try:
+            date_from, date_to, building = parse_occupancy_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(occupancy_report(date_from, date_to, building))
+
+class ForecastReportView(ReplicaReadMixin, APIView):
+    """Темп продаж и прогноз загрузки вперёд против прошлого года (?date_from=&days=&building=&pickup_days=)"""
+    permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('get',)
+
+    def get(self, request):
+        try:
+            date_from, days, building, pickup_days = parse_forecast_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # NumPy импортируется по первому запросу отчёта, а не при старте каждого воркера
+        from .forecast import forecast_report
+        return Response(forecast_report(date_from, days, building, lookback=pickup_days))
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Фоновые задачи: POST {kind, params} ставит в очередь, GET — прогресс,
+    /api/jobs/<id>/download/ — файл результата. Выполняет воркер run_jobs.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Сборка схемы OpenAPI идёт без пользователя
+            return Job.objects.none()
+        queryset = Job.objects.all()
+        if not is_superadmin(self.request.user):
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        job = serializer.save(created_by=self.request.user)
+        logger.info(f"Поставлена задача #{job.pk} {job.kind}")
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status == 'expired':
+            return Response({'error': 'Срок хранения результата истёк'}, status=status.HTTP_410_GONE)
+        if job.status != 'done' or not job.result_file:
+            return Response({'error': 'Результат ещё не готов'}, status=status.HTTP_409_CONFLICT)
+        try:
+            return FileResponse(open(result_path(job), 'rb'), as_attachment=True, filename=job.result_name)
+        except FileNotFoundError:
+            return Response({'error': 'Файл результата не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+class OpenAPISchemaView(APIView):
+    """Схема OpenAPI из файла, собранного при деплое (manage.py build_openapi_schema)"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    swagger_schema = None
+
+    def get(self, request):
+        path = Path(settings.OPENAPI_SCHEMA_PATH)
+        if not path.exists() and settings.API_DOCS_ENABLED:
+            # Схему ещё не собирали (локальная разработка) — собираем один раз, дальше отдаём файл
+            from .openapi import write_schema
+            write_schema(path)
+        try:
+            return FileResponse(open(path, 'rb'), content_type='application/json')
+        except FileNotFoundError:
+            return Response({'error': 'Схема API не собрана: выполните manage.py build_openapi_schema'}, status=status.HTTP_404_NOT_FOUND)
+
+def api_docs(request, *args, **kwargs):
+    """Swagger UI; drf_yasg импортируется по первому запросу, а не при старте воркера"""
+    from .openapi import swagger_ui_view
+    return swagger_ui_view(request, *args, **kwargs)
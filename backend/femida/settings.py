@@ -28,21 +28,40 @@ DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',')
 
 INSTALLED_APPS = [
-    'jazzmin',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'booking',
     'phonenumber_field',
     'rest_framework',
     'corsheaders',
-    'drf_yasg',
 ]
 
+# Необязательные приложения: тема админки и Swagger UI (/api/docs/). Выключенные не
+# импортируются при старте воркера; схема OpenAPI в любом случае отдаётся из файла
+ADMIN_THEME_ENABLED = os.environ.get('ADMIN_THEME_ENABLED', 'True').lower() == 'true'
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', 'True').lower() == 'true'
+if ADMIN_THEME_ENABLED:
+    # jazzmin должен стоять перед django.contrib.admin, чтобы переопределить его шаблоны
+    INSTALLED_APPS.insert(0, 'jazzmin')
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
+# Схема OpenAPI собирается при деплое (manage.py build_openapi_schema) и отдаётся
+# с диска на /api/schema/; Swagger UI читает её оттуда, а не генерирует на каждый запрос
+OPENAPI_SCHEMA_PATH = os.environ.get('OPENAPI_SCHEMA_PATH', str(BASE_DIR / 'openapi.json'))
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'openapi-schema',
+}
+
 MIDDLEWARE = [
+    'booking.metrics.PerformanceMiddleware',
+    'booking.profiling.ProfilingMiddleware',
+    'booking.slow_queries.SlowQueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +71,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'booking.middleware.UserActivityMiddleware',
+    'booking.db_routing.ReplicaRoutingMiddleware',
     'booking.middleware.ErrorHandlingMiddleware',
 ]
 
@@ -86,6 +106,24 @@ DATABASES = {
     }
 }
 
+# Необязательная реплика только для чтения: списки, отчёты и экспорт читают с неё
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['booking.db_routing.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# Сколько секунд после записи пользователь читает только с основной БД (отставание реплики).
+# При нескольких воркерах нужен общий кэш (CACHES), иначе окно действует в пределах процесса
+REPLICA_LAG_SECONDS = int(os.environ.get('REPLICA_LAG_SECONDS', '5'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -137,6 +175,75 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Размер порции при потоковой выдаче списков (?stream=1 / application/x-ndjson)
+STREAMING_CHUNK_SIZE = int(os.environ.get('STREAMING_CHUNK_SIZE', '500'))
+
+# Максимум подзапросов в одном пакетном запросе /api/batch/
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+
+# Лента изменений (SSE, /api/events/, только под ASGI)
+# Интервал опроса БД — запасной путь для событий из других воркеров
+CHANGE_FEED_POLL_SECONDS = float(os.environ.get('CHANGE_FEED_POLL_SECONDS', '15'))
+# Максимальная длительность одного соединения; браузер переподключится с Last-Event-ID
+CHANGE_FEED_MAX_SECONDS = int(os.environ.get('CHANGE_FEED_MAX_SECONDS', '300'))
+CHANGE_FEED_BATCH_SIZE = 500
+# Окно перечитывания ленты изменений и дельта-синхронизации: запись с меньшим id или
+# updated_at может зафиксироваться позже (долгая транзакция), поэтому последние секунды перечитываются
+CHANGE_FEED_OVERLAP_SECONDS = int(os.environ.get('CHANGE_FEED_OVERLAP_SECONDS', '60'))
+CHANGE_EVENT_RETENTION_DAYS = int(os.environ.get('CHANGE_EVENT_RETENTION_DAYS', '30'))
+
+# Справочник номеров и корпусов в памяти процесса: как часто сверять его версию
+# с лентой изменений, чтобы увидеть правки из других процессов
+CATALOGUE_CHECK_SECONDS = float(os.environ.get('CATALOGUE_CHECK_SECONDS', '2'))
+
+# Замеры запросов: заголовок Server-Timing и метрики Prometheus на /api/metrics/
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS_ENABLED', 'True').lower() == 'true'
+
+# Профилирование запроса супер-админом (?_profile=1 или X-Profile: 1)
+PROFILE_DUMP_DIR = os.environ.get('PROFILE_DUMP_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_DUMPS = int(os.environ.get('PROFILE_MAX_DUMPS', '50'))
+# Для скольких самых медленных SQL-запросов сохранять EXPLAIN
+PROFILE_EXPLAIN_TOP = 5
+
+# Журнал медленных SQL-запросов (админка → «Медленные запросы»); пустое значение отключает
+_slow_query_threshold = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200')
+SLOW_QUERY_THRESHOLD_MS = float(_slow_query_threshold) if _slow_query_threshold else None
+# Сколько последних замеров хранить для расчёта p95
+SLOW_QUERY_SAMPLES = 200
+
+# Планировщик заездов/выездов (manage.py run_lifecycle)
+# Дольше этого воркер не спит: подхватывает новые бронирования из ленты изменений
+LIFECYCLE_POLL_SECONDS = float(os.environ.get('LIFECYCLE_POLL_SECONDS', '60'))
+# На сколько часов вперёд загружать моменты заезда и выезда в очередь
+LIFECYCLE_HORIZON_HOURS = int(os.environ.get('LIFECYCLE_HORIZON_HOURS', '24'))
+
+# Исходящие сообщения гостям (manage.py run_outbox)
+# Бэкенд на канал; пока нет провайдера — консоль (лог) или файл MESSAGING_FILE_PATH
+MESSAGING_BACKENDS = {
+    'sms': os.environ.get('MESSAGING_SMS_BACKEND', 'booking.messaging.ConsoleBackend'),
+    'email': os.environ.get('MESSAGING_EMAIL_BACKEND', 'booking.messaging.ConsoleBackend'),
+}
+MESSAGING_FILE_PATH = os.environ.get('MESSAGING_FILE_PATH', str(BASE_DIR / 'outbox.log'))
+# Не больше стольких сообщений в минуту на канал (ограничения провайдера)
+MESSAGING_RATE_PER_MINUTE = int(os.environ.get('MESSAGING_RATE_PER_MINUTE', '60'))
+MESSAGING_BATCH_SIZE = 100
+MESSAGING_MAX_ATTEMPTS = 5
+# Пауза перед повтором: 30 с, 60 с, 120 с, ...
+MESSAGING_RETRY_BASE_SECONDS = 30
+# Сколько взятое воркером сообщение недоступно другим (если воркер упал — отправится снова)
+MESSAGING_LEASE_SECONDS = 300
+MESSAGING_POLL_SECONDS = float(os.environ.get('MESSAGING_POLL_SECONDS', '5'))
+
+# Фоновые задачи (manage.py run_jobs): результаты на локальном диске
+JOBS_RESULT_DIR = os.environ.get('JOBS_RESULT_DIR', str(BASE_DIR / 'job_results'))
+JOBS_RESULT_TTL_HOURS = int(os.environ.get('JOBS_RESULT_TTL_HOURS', '24'))
+JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', '2'))
+# Задача без признаков жизни дольше этого считается брошенной и берётся снова
+JOBS_STALE_SECONDS = 600
+
+# С какого числа строк админка показывает оценку из статистики PostgreSQL вместо COUNT(*)
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=2),
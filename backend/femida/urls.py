@@ -17,24 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
-from booking.views import UserViewSet, RoomViewSet, GuestViewSet, BookingViewSet, BuildingViewSet, AuditLogViewSet, TrashViewSet, CustomTokenObtainPairView
+from booking.views import UserViewSet, RoomViewSet, GuestViewSet, BookingViewSet, BuildingViewSet, AuditLogViewSet, TrashViewSet, CustomTokenObtainPairView, ReportExportView, OccupancyReportView, ForecastReportView, JobViewSet, OpenAPISchemaView, api_docs
 from rest_framework_simplejwt.views import TokenRefreshView
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework.permissions import AllowAny
+from booking.events import change_feed
+from booking import async_views
+from booking.batch import BatchView
+from booking.metrics import MetricsView
+from booking.profiling import ProfileDetailView, ProfileListView
 from django.conf import settings
 from django.conf.urls.static import static
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Femida API",
-        default_version='v1',
-        description="Документация API для пансионата Фемида",
-    ),
-    public=True,
-    permission_classes=(AllowAny,),
-)
-
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'rooms', RoomViewSet)
@@ -42,16 +34,33 @@ router.register(r'guests', GuestViewSet)
 router.register(r'bookings', BookingViewSet)
 router.register(r'buildings', BuildingViewSet)
 router.register(r'auditlog', AuditLogViewSet)
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/auth/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('api/trash/<str:obj_type>/', TrashViewSet.as_view()),
-    path('api/trash/<str:action>/<str:obj_type>/<int:obj_id>/', TrashViewSet.as_view()),
+    path('api/schema/', OpenAPISchemaView.as_view(), name='openapi-schema'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiles/<str:name>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('api/events/', change_feed, name='change-feed'),
+    path('api/async/dashboard/', async_views.dashboard, name='async-dashboard'),
+    path('api/async/calendar/', async_views.calendar, name='async-calendar'),
+    path('api/async/reports/occupancy/', async_views.occupancy, name='async-report-occupancy'),
+    path('api/async/reports/export/', async_views.report_export, name='async-report-export'),
+    path('api/async/<str:resource>/', async_views.resource_list, name='async-resource-list'),
+    path('api/reports/export/', ReportExportView.as_view(), name='report-export'),
+    path('api/reports/occupancy/', OccupancyReportView.as_view(), name='report-occupancy'),
+    path('api/reports/forecast/', ForecastReportView.as_view(), name='report-forecast'),
+    path('api/trash/<str:obj_type>/', TrashViewSet.as_view(), name='trash-list'),
+    path('api/trash/<str:action>/<str:obj_type>/<int:obj_id>/', TrashViewSet.as_view(), name='trash-action'),
 ]
 
+if settings.API_DOCS_ENABLED:
+    urlpatterns.append(path('api/docs/', api_docs, name='schema-swagger-ui'))
+
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
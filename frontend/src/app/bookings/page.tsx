@@ -635,11 +635,22 @@ export default function BookingsPage() {
   // Загрузка данных через Redux
   const fetchAll = async () => {
     dispatch(setBookingsLoading(true));
-    const [bookingsData, guestsData, roomsData] = await Promise.all([
-      handleApiRequestWithAuth(`${API_URL}/api/bookings/`),
-      handleApiRequestWithAuth(`${API_URL}/api/guests/`),
-      handleApiRequestWithAuth(`${API_URL}/api/rooms/`),
-    ]);
+    // Один пакетный запрос вместо трёх отдельных
+    const batch = await handleApiRequestWithAuth(`${API_URL}/api/batch/`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        requests: [
+          { id: 'bookings', url: '/api/bookings/' },
+          { id: 'guests', url: '/api/guests/' },
+          { id: 'rooms', url: '/api/rooms/' },
+        ],
+      }),
+    });
+    const responses = batch?.responses || {};
+    const bookingsData = responses.bookings?.body;
+    const guestsData = responses.guests?.body;
+    const roomsData = responses.rooms?.body;
     dispatch(setBookings(Array.isArray(bookingsData) ? bookingsData : []));
     dispatch(setGuests(Array.isArray(guestsData) ? guestsData : []));
     dispatch(setRooms(Array.isArray(roomsData) ? roomsData : []));
@@ -187,15 +187,35 @@ export default function CalendarPage() {
 
   useEffect(() => {
     if (!access) return;
-    Promise.all([
-      fetch(`${API_URL}/api/bookings/`, { headers: { Authorization: `Bearer ${access}` } }).then(res => res.json()),
-      fetch(`${API_URL}/api/rooms/`, { headers: { Authorization: `Bearer ${access}` } }).then(res => res.json()),
-      fetch(`${API_URL}/api/buildings/`, { headers: { Authorization: `Bearer ${access}` } }).then(res => res.json()),
-    ]).then(([bookingsData, roomsData, buildingsData]) => {
-      setBookings(bookingsData);
-      setRooms(roomsData);
-      setBuildings(buildingsData);
-    });
+    // Один пакетный запрос вместо трёх отдельных
+    fetch(`${API_URL}/api/batch/`, {
+      method: 'POST',
+      headers: { Authorization: `Bearer ${access}`, 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        requests: [
+          { id: 'bookings', url: '/api/bookings/' },
+          { id: 'rooms', url: '/api/rooms/' },
+          { id: 'buildings', url: '/api/buildings/' },
+        ],
+      }),
+    })
+      .then(res => (res.ok ? res.json() : null))
+      .then(batch => {
+        // Подзапрос с ошибкой не должен оставлять календарь пустым целиком
+        const responses = batch?.responses || {};
+        const bodyOf = (id: string) => {
+          const result = responses[id];
+          return result?.status === 200 && Array.isArray(result.body) ? result.body : [];
+        };
+        setBookings(bodyOf('bookings'));
+        setRooms(bodyOf('rooms'));
+        setBuildings(bodyOf('buildings'));
+      })
+      .catch(() => {
+        setBookings([]);
+        setRooms([]);
+        setBuildings([]);
+      });
   }, [access]);
 
   const events = useMemo<any[]>(() => {
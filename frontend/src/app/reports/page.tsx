@@ -181,34 +181,27 @@ export default function ReportsPage() {
     currentPage * reportsPerPage
   );
 
-  const exportToCSV = () => {
-    const header = 'ID,Комната,Корпус,Класс,Тип,Статус,Гость,Телефон,ИНН,Дата заезда,Дата выезда,Кол-во гостей,Цена за ночь';
-    const rows = filtered.map((b) => {
-      const room = (rooms as any[]).find((r) => r.id === b.room.id);
-      let buildingName = '-';
-      if (room) {
-        buildingName = typeof room.building === 'object' ? room.building.name : room.building;
-      }
-      
-      return [
-        b.id,
-        room ? room.number : '-',
-        buildingName,
-        room ? (typeof room.room_class === 'object' && room.room_class !== null ? room.room_class.label : ROOM_CLASS_LABELS[room.room_class as string] || room.room_class || '-') : '-',
-        room ? room.room_type || '-' : '-',
-        b.status,
-        b.guest?.full_name || '-',
-        b.guest?.phone || '-',
-        b.guest?.inn || '-',
-        b.check_in,
-        b.check_out,
-        b.people_count,
-        room ? room.price_per_night || 0 : '-'
-      ].join(',');
+  // Экспорт формируется на сервере потоком по тем же фильтрам, что и таблица
+  const exportReport = async (format: 'csv' | 'xlsx') => {
+    const params = new URLSearchParams({ format });
+    const filterParams: Record<string, string> = {
+      search: filters.search,
+      date_from: filters.dateFrom,
+      date_to: filters.dateTo,
+      room: filters.room,
+      guest: filters.guest,
+      status: filters.status,
+      building: filters.building,
+    };
+    Object.entries(filterParams).forEach(([key, value]) => {
+      if (value) params.append(key, value);
+    });
+    const response = await fetchWithAuth(`${API_URL}/api/reports/export/?${params.toString()}`, {
+      headers: { Authorization: `Bearer ${access}` },
     });
-    const csv = [header, ...rows].join('\n');
-    const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-    saveAs(blob, `report_${new Date().toISOString().split('T')[0]}.csv`);
+    if (!response.ok) return;
+    const blob = await response.blob();
+    saveAs(blob, `report_${new Date().toISOString().split('T')[0]}.${format}`);
   };
 
   function formatDate(dateStr: string) {
@@ -329,12 +322,21 @@ export default function ReportsPage() {
             
             <Button
               variant="success"
-              onClick={exportToCSV}
+              onClick={() => exportReport('csv')}
               icon={<FaDownload />}
               className="shadow-lg hover:shadow-xl"
             >
               Экспорт CSV
             </Button>
+
+            <Button
+              variant="success"
+              onClick={() => exportReport('xlsx')}
+              icon={<FaDownload />}
+              className="shadow-lg hover:shadow-xl"
+            >
+              Экспорт XLSX
+            </Button>
           </div>
         </div>
       </div>